@@ -0,0 +1,177 @@
+#----------------------------------------------------------------------------#
+# JSON API.
+#
+# A versioned, read-only view of venues, artists, shows and search under
+# /api/v1, built on the same query layer as the HTML pages. Responses are
+# compact JSON with field selection (?fields=id,name) and cursor pagination
+# (?after= / ?before= / ?limit=).
+#
+# Every response carries a strong ETag, the hash of its body. The body and
+# its ETag are kept in the response cache under the request URL and the
+# version tokens of the tags it depends on, so a conditional request for
+# an unchanged resource is answered 304 from the cache without touching the
+# database or serializing anything.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, Response, current_app, jsonify, request
+from extensions import limiter
+from routing import replica_reads
+from queries import venue_page, artist_page, show_page, venue_detail, artist_detail, \
+  find_venues, find_artists, genre_listing
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def http_error(error):
+  return jsonify(error=error.name, status=error.code), error.code
+
+
+def _default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(repr(value))
+
+
+def _select(payload):
+  """Apply ?fields= to a resource, or to each item of a listing."""
+  fields = request.args.get('fields')
+  if not fields:
+    return payload
+  fields = set(field.strip() for field in fields.split(',') if field.strip())
+
+  def pick(item):
+    return dict((key, value) for key, value in item.items() if key in fields)
+
+  if isinstance(payload.get('data'), list):
+    return dict(payload, data=[pick(item) for item in payload['data']])
+  return pick(payload)
+
+
+def resource(*tags):
+  """Serve a view's dict as JSON with a strong ETag, cached under `tags`."""
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      cache = current_app.extensions['cache']
+      key = hit = None
+      if cache.backend is not None:
+        key = 'api:%s:%s' % (request.full_path, ':'.join(cache.tag_versions(tags)))
+        hit = cache.backend.get_many([key])[0]
+      if hit is None:
+        body = json.dumps(_select(view(*args, **kwargs)), separators=(',', ':'),
+                          default=_default).encode()
+        hit = (hashlib.sha1(body).hexdigest(), body)
+        if key is not None:
+          cache.backend.set(key, hit, cache.default_ttl)
+
+      etag, body = hit
+      if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+      else:
+        response = Response(body, mimetype='application/json')
+      response.set_etag(etag)
+      response.headers['Cache-Control'] = 'no-cache'
+      return response
+    return wrapper
+  return decorator
+
+
+def _per_page():
+  limit = request.args.get('limit', type=int)
+  return max(1, min(limit or current_app.config['PAGE_SIZE'],
+                    current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def _listing(page, serialize=lambda row: row._asdict()):
+  return {"data": [serialize(row) for row in page.items],
+          "next": page.next_cursor,
+          "prev": page.prev_cursor}
+
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@api.route('/venues')
+@replica_reads
+@resource('venues', 'shows')
+def venues():
+  return _listing(venue_page(request.args.get('after'), request.args.get('before'), _per_page()))
+
+
+@api.route('/venues/<int:venue_id>')
+@replica_reads
+@resource('venues', 'artists', 'shows')
+def venue(venue_id):
+  return venue_detail(venue_id)
+
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@api.route('/artists')
+@replica_reads
+@resource('artists', 'shows')
+def artists():
+  return _listing(artist_page(request.args.get('after'), request.args.get('before'), _per_page()))
+
+
+@api.route('/artists/<int:artist_id>')
+@replica_reads
+@resource('venues', 'artists', 'shows')
+def artist(artist_id):
+  return artist_detail(artist_id)
+
+
+#  Shows
+#  ----------------------------------------------------------------
+
+def _show(row):
+  return {"id": row.id,
+          "start_time": row.time,
+          "end_time": row.end_time,
+          "venue_id": row.venue_id,
+          "venue_name": row.venue_name,
+          "artist_id": row.artist_id,
+          "artist_name": row.artist_name,
+          "artist_image_link": row.artist_image_link}
+
+
+@api.route('/shows')
+@replica_reads
+@resource('venues', 'artists', 'shows')
+def shows():
+  return _listing(show_page(request.args.get('after'), request.args.get('before'), _per_page()), _show)
+
+
+#  Search and genres
+#  ----------------------------------------------------------------
+
+@api.route('/search/venues')
+@limiter.limit('api_search')
+@replica_reads
+@resource('venues', 'shows')
+def search_venues():
+  return find_venues(request.args.get('q', ''), limit=request.args.get('limit', type=int),
+                     offset=request.args.get('offset', 0, type=int))
+
+
+@api.route('/search/artists')
+@limiter.limit('api_search')
+@replica_reads
+@resource('artists', 'shows')
+def search_artists():
+  return find_artists(request.args.get('q', ''), limit=request.args.get('limit', type=int),
+                      offset=request.args.get('offset', 0, type=int))
+
+
+@api.route('/genres/<name>')
+@replica_reads
+@resource('venues', 'artists')
+def genre(name):
+  return genre_listing(name)
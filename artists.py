@@ -0,0 +1,143 @@
+#----------------------------------------------------------------------------#
+# Artist pages.
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, Response, abort, render_template, request, flash, redirect, url_for
+from extensions import db, cache, limiter
+import deletion
+import editing
+from models import Artist, Genre
+from routing import replica_reads
+from bookings import availability_view
+from geo import near_view
+from queries import artist_page, artist_rows, artist_detail, find_artists
+from templating import stream_template
+
+artist_pages = Blueprint('artists', __name__)
+
+
+@artist_pages.route('/artists')
+@replica_reads
+@cache.cached('artists')
+def artists():
+  if request.args.get('all'):
+    # Every artist, streamed as it is read; see templating.stream_template.
+    data = ({"id": item.id, "name": item.name, "version": item.version} for item in artist_rows())
+    return Response(stream_template('pages/artists.html', artists=data, page=None))
+  page = artist_page(after=request.args.get('after'), before=request.args.get('before'))
+  data = [{"id": item.id, "name": item.name, "version": item.version} for item in page.items]
+  return render_template('pages/artists.html', artists=data, page=page)
+
+@artist_pages.route('/artists/search', methods=['POST'])
+@limiter.limit('search')
+@replica_reads
+def search_artists():
+  term = request.form.get('search_term', '')
+  response = find_artists(term,
+                         limit=request.form.get('limit', type=int),
+                         offset=request.form.get('offset', 0, type=int))
+  return render_template('pages/search_artists.html', results=response, search_term=term,
+                         offset=request.form.get('offset', 0, type=int))
+
+@artist_pages.route('/artists/near')
+@replica_reads
+def artists_near():
+  return near_view('artist')
+
+@artist_pages.route('/artists/<int:artist_id>')
+@replica_reads
+def show_artist(artist_id):
+  return render_template('pages/show_artist.html', artist=artist_detail(artist_id))
+
+@artist_pages.route('/artists/<int:artist_id>/availability')
+@replica_reads
+def artist_availability(artist_id):
+  return availability_view('artist', artist_id)
+
+#  Update
+#  ----------------------------------------------------------------
+
+@artist_pages.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  return _edit_page(artist_id)
+
+def _edit_page(artist_id, status=200):
+  """The edit form filled in with the artist as they are now."""
+  from forms import ArtistForm
+  targeted_artist = Artist.query.filter_by(id=artist_id, deleted_at=None).first_or_404()
+  artist={
+    "id": artist_id,
+    "version": targeted_artist.version,
+    "name": targeted_artist.name,
+    "genres": [genre.name for genre in targeted_artist.genres],
+    "city": targeted_artist.city,
+    "state": targeted_artist.state,
+    "phone": targeted_artist.phone,
+    "website": targeted_artist.website,
+    "facebook_link": targeted_artist.facebook_link,
+    "seeking_venue": targeted_artist.seeking_venue,
+    "seeking_description": targeted_artist.seeking_description,
+    "image_link": targeted_artist.image_link,
+  }
+  form = ArtistForm(formdata=None, data=artist)
+  return render_template('forms/edit_artist.html', form=form, artist=artist), status
+
+@artist_pages.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  version = request.form.get("version", type=int)
+  if version is None:
+    abort(400)
+  values, genres = editing.changes('artist', request.form)
+  try:
+    editing.update('artist', artist_id, version, values, genres)
+  except editing.Conflict:
+    db.session.rollback()
+    flash('This artist was changed by someone else while you were editing them. '
+          'Their changes are shown below; make yours again to save them.')
+    return _edit_page(artist_id, 409)
+  db.session.commit()
+  return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@artist_pages.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  from forms import ArtistForm
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@artist_pages.route('/artists/create', methods=['POST'])
+@limiter.limit('create')
+def create_artist_submission():
+  name = request.form.get("name", "")
+  city = request.form.get("city", "")
+  state = request.form.get("state", "")
+  address = request.form.get("address", "")
+  phone = request.form.get("phone", "")
+  genres = request.form.getlist("genres")
+  facebook_link = request.form.get("facebook_link", "")
+  artist = Artist(
+            name =  name,
+            city =  city,
+            state = state,
+            genres = Genre.named(genres),
+            phone = phone,
+            facebook_link = facebook_link,
+            )
+  try:
+    db.session.add(artist)
+    cache.invalidate_after_commit('artists')
+    db.session.commit()
+    flash('Artist ' + request.form['name'] + ' was successfully listed!')
+  except:
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+  return render_template('pages/home.html')
+
+@artist_pages.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  # Hides the artist at once; their shows follow in a background job.
+  if not deletion.delete('artist', artist_id):
+    abort(404)
+  db.session.commit()
+  return redirect(url_for("artists.artists"))
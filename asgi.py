@@ -0,0 +1,118 @@
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+#   uvicorn asgi:application --workers 2
+#
+# Serves the same Flask app from an ASGI server. The event loop owns the
+# sockets, so slow clients and idle keep-alive connections cost a coroutine
+# instead of a worker, while each request runs start to finish on one
+# thread of a pool of ASGI_THREADS. Keeping a request on a single thread
+# matters: Flask's request context and stream_with_context are thread-local.
+# Response chunks are handed back to the loop one at a time, so a streamed
+# response is never buffered in full.
+#----------------------------------------------------------------------------#
+
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from app import create_app
+from routing import check_pool
+
+# Request bodies larger than this are spooled to disk before dispatch.
+MAX_MEMORY_BODY = 1024 * 1024
+
+
+def _environ(scope, body):
+  server_name, server_port = scope.get('server') or ('localhost', 80)
+  environ = {
+    'REQUEST_METHOD': scope['method'],
+    'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+    'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+    'QUERY_STRING': scope['query_string'].decode('latin-1'),
+    'SERVER_NAME': server_name,
+    'SERVER_PORT': str(server_port),
+    'SERVER_PROTOCOL': 'HTTP/%s' % scope['http_version'],
+    'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+    'wsgi.version': (1, 0),
+    'wsgi.url_scheme': scope.get('scheme', 'http'),
+    'wsgi.input': body,
+    'wsgi.errors': sys.stderr,
+    'wsgi.multithread': True,
+    'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+  }
+  for name, value in scope['headers']:
+    name = name.decode('latin-1').upper().replace('-', '_')
+    value = value.decode('latin-1')
+    if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+      name = 'HTTP_' + name
+    environ[name] = environ[name] + ',' + value if name in environ else value
+  return environ
+
+
+class ASGIBridge(object):
+
+  def __init__(self, wsgi_app, threads):
+    self.wsgi_app = wsgi_app
+    self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asgi')
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+          await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+          self.executor.shutdown(wait=False)
+          await send({'type': 'lifespan.shutdown.complete'})
+          return
+    if scope['type'] != 'http':
+      raise ValueError('Unsupported ASGI scope type: %s' % scope['type'])
+
+    body = SpooledTemporaryFile(max_size=MAX_MEMORY_BODY)
+    more_body = True
+    while more_body:
+      message = await receive()
+      body.write(message.get('body', b''))
+      more_body = message.get('more_body', False)
+    body.seek(0)
+
+    loop = asyncio.get_running_loop()
+    try:
+      await loop.run_in_executor(self.executor, self._run, _environ(scope, body), send, loop)
+    finally:
+      body.close()
+
+  def _run(self, environ, send, loop):
+    """Run one request on a pool thread, passing messages back to the loop."""
+    def emit(message):
+      asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+      started[:] = [int(status.split(' ', 1)[0]),
+                    [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]]
+
+    iterable = self.wsgi_app(environ, start_response)
+    try:
+      head_sent = False
+      for chunk in iterable:
+        if not chunk:
+          continue
+        if not head_sent:
+          emit({'type': 'http.response.start', 'status': started[0], 'headers': started[1]})
+          head_sent = True
+        emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+      if not head_sent:
+        emit({'type': 'http.response.start', 'status': started[0], 'headers': started[1]})
+      emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+      if hasattr(iterable, 'close'):
+        iterable.close()
+
+
+app = create_app()
+check_pool(app, app.config['ASGI_THREADS'])
+application = ASGIBridge(app, app.config['ASGI_THREADS'])
@@ -0,0 +1,245 @@
+#----------------------------------------------------------------------------#
+# Static assets.
+#
+# `flask build-assets` writes a build of static/ into static/dist/: every
+# file copied under a name carrying a hash of its content, the stylesheets
+# and scripts of each of ASSET_BUNDLES concatenated and minified into one
+# file, and gzip (and, with the brotli package, brotli) variants of the
+# text files. static/dist/manifest.json maps the original names to the
+# built ones.
+#
+# With a build present, url_for('static', filename=...) points at the
+# fingerprinted copy and `bundle_urls(name)` at the bundle; without one
+# they fall back to the source files, so development needs no build.
+# Built files never change under a name, so they are served with a
+# year-long immutable Cache-Control, precompressed when the client accepts
+# it. Workers read the manifest when they start.
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+from flask import Blueprint, current_app, request, safe_join, send_from_directory, url_for
+
+assets = Blueprint('assets', __name__)
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.eot', '.ttf', '.otf')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_COMMENT = re.compile(r'/\*(?!!).*?\*/', re.S)
+_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _fingerprint(path, data):
+  stem, extension = posixpath.splitext(path)
+  return '%s.%s%s' % (stem, hashlib.sha256(data).hexdigest()[:12], extension)
+
+
+def minify_css(text):
+  """Drop comments (but /*! licences) and the whitespace CSS ignores,
+  leaving strings alone."""
+  text = _COMMENT.sub('', text)
+  parts = _STRING.split(text)
+  for i in range(0, len(parts), 2):
+    part = re.sub(r'\s+', ' ', parts[i])
+    part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+    parts[i] = re.sub(r':\s+', ':', part).replace(';}', '}')
+  return ''.join(parts).strip()
+
+
+def minify_js(text, name):
+  """Minify with rjsmin when it is installed; .min.js files and everything
+  else otherwise are left as they are."""
+  if name.endswith('.min.js'):
+    return text
+  try:
+    import rjsmin
+  except ImportError:
+    return text
+  return rjsmin.jsmin(text)
+
+
+def _rewrite_urls(text, source, output, built):
+  """Point the relative url()s of stylesheet `source` (a path under
+  static/) at the built files, from where it is written to (`output`)."""
+  def replace(match):
+    url = match.group(2).strip()
+    if url.startswith(('data:', '/', '#')) or '://' in url:
+      return match.group(0)
+    path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+    target = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+    target = posixpath.join(DIST, built[target]) if target in built else target
+    return 'url("%s%s")' % (posixpath.relpath(target, posixpath.dirname(output)), suffix)
+  return _URL.sub(replace, text)
+
+
+class Build(object):
+  """Writes one build of the static folder `root` into root/dist."""
+
+  def __init__(self, root):
+    self.root = root
+    self.files = {}
+    self.bundles = {}
+    self.written = set()
+
+  def _read(self, path):
+    with open(os.path.join(self.root, path), 'rb') as handle:
+      return handle.read()
+
+  def _write(self, path, data):
+    """Write dist/`path` and its compressed variants, unless a previous
+    build already did (the name is the content's hash)."""
+    target = os.path.join(self.root, DIST, path)
+    self.written.add(path)
+    variants = [(target, data)]
+    if path.endswith(COMPRESSIBLE):
+      variants.append((target + '.gz', gzip.compress(data, 9, mtime=0)))
+      try:
+        import brotli
+        variants.append((target + '.br', brotli.compress(data)))
+      except ImportError:
+        pass
+    for variant, content in variants:
+      if variant != target:
+        if len(content) >= len(data):
+          continue
+        self.written.add(path + variant[len(target):])
+      if not os.path.exists(variant):
+        os.makedirs(os.path.dirname(variant), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(variant))
+        with os.fdopen(handle, 'wb') as out:
+          out.write(content)
+        os.replace(temporary, variant)
+
+  def sources(self):
+    for directory, subdirectories, names in os.walk(self.root):
+      relative = os.path.relpath(directory, self.root).replace(os.sep, '/')
+      if relative == DIST:
+        subdirectories[:] = []
+        continue
+      for name in names:
+        yield posixpath.normpath(posixpath.join(relative, name))
+
+  def copy(self):
+    """Fingerprint every source file, stylesheets last so their url()s can
+    point at the fingerprinted fonts and images."""
+    sources = sorted(self.sources(), key=lambda path: (path.endswith('.css'), path))
+    for path in sources:
+      data = self._read(path)
+      if path.endswith('.css'):
+        data = _rewrite_urls(data.decode('utf-8'), path, posixpath.join(DIST, path),
+                             self.files).encode('utf-8')
+      self.files[path] = _fingerprint(path, data)
+      self._write(self.files[path], data)
+
+  def bundle(self, name, members):
+    """Concatenate and minify `members` (paths under static/) into bundle
+    `name`, a .css or .js file."""
+    texts = []
+    for member in members:
+      text = self._read(member).decode('utf-8')
+      if name.endswith('.css'):
+        texts.append(minify_css(_rewrite_urls(text, member, posixpath.join(DIST, name), self.files)))
+      else:
+        text = re.sub(r'^//[#@] sourceMappingURL=.*$', '', text, flags=re.M)
+        texts.append(minify_js(text, member))
+    data = (('\n' if name.endswith('.css') else '\n;\n').join(texts) + '\n').encode('utf-8')
+    self.bundles[name] = _fingerprint(name, data)
+    self._write(self.bundles[name], data)
+    return sum(len(self._read(member)) for member in members), data
+
+  def save(self):
+    manifest = json.dumps({'files': self.files, 'bundles': self.bundles}, indent=2, sort_keys=True)
+    os.makedirs(os.path.join(self.root, DIST), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.join(self.root, DIST))
+    with os.fdopen(handle, 'w') as out:
+      out.write(manifest)
+    os.replace(temporary, os.path.join(self.root, DIST, MANIFEST))
+
+  def clean(self):
+    """Delete the files of earlier builds; returns how many."""
+    removed = 0
+    dist = os.path.join(self.root, DIST)
+    for directory, _, names in os.walk(dist):
+      for name in names:
+        path = os.path.relpath(os.path.join(directory, name), dist).replace(os.sep, '/')
+        if path != MANIFEST and path not in self.written:
+          os.remove(os.path.join(directory, name))
+          removed += 1
+    return removed
+
+
+def build(root, bundles, clean=False):
+  """Build static folder `root`; returns the bundles' source and built
+  sizes, and how many stale files were removed."""
+  run = Build(root)
+  run.copy()
+  sizes = {}
+  for name, members in sorted(bundles.items()):
+    source_bytes, data = run.bundle(name, members)
+    sizes[name] = {'sources': len(members), 'source_bytes': source_bytes, 'bytes': len(data),
+                   'gzip_bytes': len(gzip.compress(data, 9, mtime=0))}
+  run.save()
+  return sizes, run.clean() if clean else 0
+
+
+def load_manifest(root):
+  try:
+    with open(os.path.join(root, DIST, MANIFEST)) as handle:
+      return json.load(handle)
+  except (OSError, ValueError):
+    return {'files': {}, 'bundles': {}}
+
+
+def _fingerprinted(endpoint, values):
+  if endpoint == 'static' and 'filename' in values:
+    built = current_app.extensions['assets']['files'].get(values['filename'])
+    if built is not None:
+      values['filename'] = posixpath.join(DIST, built)
+
+
+def bundle_urls(name):
+  """URLs to include bundle `name`: the built bundle, or its sources when
+  there is no build."""
+  built = current_app.extensions['assets']['bundles'].get(name)
+  if built is not None:
+    return [url_for('static', filename=posixpath.join(DIST, built))]
+  return [url_for('static', filename=member) for member in current_app.config['ASSET_BUNDLES'][name]]
+
+
+@assets.route('/static/dist/<path:filename>')
+def asset(filename):
+  directory = os.path.join(current_app.static_folder, DIST)
+  mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+  encoding = None
+  for candidate, suffix in ENCODINGS:
+    if request.accept_encodings[candidate] and os.path.isfile(safe_join(directory, filename + suffix)):
+      encoding, filename = candidate, filename + suffix
+      break
+  response = send_from_directory(directory, filename, mimetype=mimetype)
+  if encoding is not None:
+    response.headers['Content-Encoding'] = encoding
+  if filename.endswith(COMPRESSIBLE) or encoding is not None:
+    response.vary.add('Accept-Encoding')
+  response.headers['Cache-Control'] = 'public, max-age=%d, immutable' \
+    % current_app.config['ASSET_MAX_AGE']
+  return response
+
+
+def init_app(app):
+  app.config.setdefault('ASSET_BUNDLES', {})
+  app.config.setdefault('ASSET_FINGERPRINTS', True)
+  app.config.setdefault('ASSET_MAX_AGE', 365 * 24 * 3600)
+  app.extensions['assets'] = load_manifest(app.static_folder) if app.config['ASSET_FINGERPRINTS'] \
+    else {'files': {}, 'bundles': {}}
+  app.url_defaults(_fingerprinted)
+  app.add_template_global(bundle_urls)
+  app.register_blueprint(assets)
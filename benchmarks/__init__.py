@@ -0,0 +1,4 @@
+"""Benchmarks run against a seeded copy of the Fyyur schema.
+
+Each module is a script: `python -m benchmarks.<name> --help`.
+"""
@@ -0,0 +1,147 @@
+"""Edit throughput, conflicts and statements per save under concurrent writers.
+
+    python -m benchmarks.editing --writers 8 --hot 20 --seconds 10 \
+        --database-url postgresql://localhost/fyyur_bench
+
+Each writer repeatedly reads a venue's version, as the edit page does, and
+saves a new name for it, picking from the --hot most contended venues:
+
+  cas   editing.update(): one UPDATE ... WHERE id AND version, no SELECT
+  orm   load the venue, assign every field and flush through the session
+        (the version_id_col check raises on a conflict)
+  http  POST /venues/<id>/edit through the test client
+
+Saves/s, conflicts/s, save latency percentiles and SQL statements per save
+are reported per mode. SQLite serializes writers, so run against Postgres
+for numbers that mean anything about concurrency.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm.exc import StaleDataError
+
+from benchmarks.routes import percentile
+from benchmarks.seed import load_app, seed
+
+MODES = ('cas', 'orm', 'http')
+
+
+class Counter(object):
+  """Statements executed by the current thread."""
+
+  def __init__(self, engine):
+    self.local = threading.local()
+    event.listen(engine, 'before_cursor_execute', self._count)
+
+  def _count(self, *args):
+    self.local.count = getattr(self.local, 'count', 0) + 1
+
+  def take(self):
+    count, self.local.count = getattr(self.local, 'count', 0), 0
+    return count
+
+
+def _save(mode, app, db, client, venue_id, version, name):
+  """Save `name` on the venue based on `version`; False on a conflict."""
+  from models import Venue
+  import editing
+  if mode == 'http':
+    response = client.post('/venues/%d/edit' % venue_id, data={'version': version, 'name': name})
+    return response.status_code == 302
+  try:
+    if mode == 'cas':
+      editing.update('venue', venue_id, version, {'name': name})
+    else:
+      venue = Venue.query.get(venue_id)
+      if venue.version != version:
+        raise StaleDataError()
+      for column in editing.OWNERS['venue'][2]:
+        setattr(venue, column, name if column == 'name' else getattr(venue, column))
+    db.session.commit()
+    return True
+  except (editing.Conflict, StaleDataError):
+    db.session.rollback()
+    return False
+
+
+def writer(mode, app, db, counter, venue_ids, deadline, think, seed, result):
+  from models import Venue
+  rng = random.Random(seed)
+  client = app.test_client()
+  with app.app_context():
+    while time.perf_counter() < deadline:
+      venue_id = rng.choice(venue_ids)
+      version = db.session.query(Venue.version).filter(Venue.id == venue_id).scalar()
+      db.session.commit()
+      time.sleep(think)
+      counter.take()
+      start = time.perf_counter()
+      saved = _save(mode, app, db, client, venue_id, version, 'Edited %d' % rng.randint(1, 10 ** 6))
+      result['latencies'].append((time.perf_counter() - start) * 1000)
+      result['statements'] += counter.take()
+      result['saves' if saved else 'conflicts'] += 1
+    db.session.remove()
+
+
+def run(mode, app, db, counter, venue_ids, writers, seconds, think):
+  results = [{'latencies': [], 'statements': 0, 'saves': 0, 'conflicts': 0} for _ in range(writers)]
+  deadline = time.perf_counter() + seconds
+  threads = [threading.Thread(target=writer, args=(mode, app, db, counter, venue_ids, deadline,
+                                                   think, i, results[i]))
+             for i in range(writers)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  latencies = [latency for result in results for latency in result['latencies']]
+  saves = sum(result['saves'] for result in results)
+  conflicts = sum(result['conflicts'] for result in results)
+  return {"saves_per_s": saves / float(seconds), "conflicts_per_s": conflicts / float(seconds),
+          "p50_ms": percentile(latencies, 50) if latencies else None,
+          "p95_ms": percentile(latencies, 95) if latencies else None,
+          "statements_per_save": sum(result['statements'] for result in results)
+          / float(max(saves + conflicts, 1))}
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--writers', type=int, default=8)
+  parser.add_argument('--hot', type=int, default=20, help='venues the writers edit')
+  parser.add_argument('--seconds', type=float, default=5.0, help='per mode')
+  parser.add_argument('--think', type=float, default=0.0,
+                      help='seconds between reading the version and saving')
+  parser.add_argument('--mode', action='append', dest='modes', choices=MODES,
+                      help='mode to run (repeatable; all by default)')
+  parser.add_argument('--output', help='write the report as JSON to this file')
+  args = parser.parse_args()
+
+  app, db = load_app(args.database_url)
+  with app.app_context():
+    seed(db, args.venues, 10, 0)
+    from models import Venue
+    venue_ids = [id for id, in db.session.query(Venue.id).order_by(Venue.id).limit(args.hot)]
+    counter = Counter(db.engine)
+    db.session.remove()
+
+  report = {}
+  print('%-5s %10s %13s %9s %9s %11s' % ('mode', 'saves/s', 'conflicts/s', 'p50 ms', 'p95 ms',
+                                         'stmts/save'))
+  for mode in args.modes or MODES:
+    result = report[mode] = run(mode, app, db, counter, venue_ids, args.writers, args.seconds,
+                                args.think)
+    print('%-5s %10.1f %13.1f %9.2f %9.2f %11.2f' % (mode, result['saves_per_s'], result['conflicts_per_s'],
+                                                     result['p50_ms'] or 0, result['p95_ms'] or 0,
+                                                     result['statements_per_save']))
+  if args.output:
+    with open(args.output, 'w') as handle:
+      json.dump(report, handle, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,106 @@
+"""Query plans and timings for the Show/Venue hot paths, with and without
+the lookup indexes from migration c41a7e0b93d5.
+
+    python -m benchmarks.query_plans --venues 2000 --artists 10000 --shows 200000
+"""
+import argparse
+import json
+import time
+
+from benchmarks.seed import load_app, seed
+
+INDEXES = ['ix_Show_venue_id_time', 'ix_Show_artist_id_time', 'ix_Show_time', 'ix_Venue_city_state']
+
+
+def capture(db, fn):
+  """Run `fn` and return the (statement, parameters) pairs it executed."""
+  from sqlalchemy import event
+  statements = []
+
+  def record(conn, cursor, statement, parameters, context, executemany):
+    statements.append((statement, parameters))
+
+  engine = db.engine
+  event.listen(engine, 'before_cursor_execute', record)
+  try:
+    fn()
+  finally:
+    event.remove(engine, 'before_cursor_execute', record)
+  return statements
+
+
+def explain(db, statement, parameters):
+  prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+  with db.engine.connect() as conn:
+    return [str(row[-1]) for row in conn.execute(prefix + statement, parameters)]
+
+
+def timed(db, statement, parameters, repeat):
+  with db.engine.connect() as conn:
+    start = time.perf_counter()
+    for _ in range(repeat):
+      conn.execute(statement, parameters).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def hot_paths(app, venue_id, artist_id):
+  import queries
+  with app.test_request_context():
+    return {
+      "venue_detail": lambda: queries.venue_detail(venue_id),
+      "artist_detail": lambda: queries.artist_detail(artist_id),
+      "venue_areas": lambda: queries.venue_areas(),
+      "show_page": lambda: queries.show_page(),
+    }
+
+
+def report(app, db, venue_id, artist_id, repeat):
+  results = {}
+  for name, fn in hot_paths(app, venue_id, artist_id).items():
+    with app.test_request_context():
+      statements = capture(db, fn)
+    results[name] = [{"sql": " ".join(statement.split()),
+                      "plan": explain(db, statement, parameters),
+                      "ms": round(timed(db, statement, parameters, repeat), 3)}
+                     for statement, parameters in statements]
+  return results
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=2000)
+  parser.add_argument('--artists', type=int, default=10000)
+  parser.add_argument('--shows', type=int, default=200000)
+  parser.add_argument('--repeat', type=int, default=20)
+  parser.add_argument('--output', help='write the report as JSON to this file')
+  args = parser.parse_args()
+
+  app, db = load_app(args.database_url)
+  with app.app_context():
+    venue_ids, artist_ids = seed(db, args.venues, args.artists, args.shows)
+    venue_id, artist_id = venue_ids[len(venue_ids) // 2], artist_ids[len(artist_ids) // 2]
+
+    after = report(app, db, venue_id, artist_id, args.repeat)
+    for index in INDEXES:
+      db.session.execute('DROP INDEX "%s"' % index)
+    db.session.commit()
+    before = report(app, db, venue_id, artist_id, args.repeat)
+    for index in db.metadata.tables['Show'].indexes | db.metadata.tables['Venue'].indexes:
+      if index.name in INDEXES:
+        index.create(db.engine)
+
+  for name in after:
+    print('== %s' % name)
+    for label, runs in (('before', before[name]), ('after', after[name])):
+      for run in runs:
+        print('  %-6s %8.3f ms  %s' % (label, run["ms"], run["sql"][:100]))
+        for line in run["plan"]:
+          print('           %s' % line)
+  if args.output:
+    with open(args.output, 'w') as out:
+      json.dump({"before": before, "after": after}, out, indent=2)
+
+
+if __name__ == '__main__':
+  main()
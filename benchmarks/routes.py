@@ -0,0 +1,255 @@
+"""Latency, query count and memory of every route on a seeded database.
+
+    python -m benchmarks.routes --venues 10000 --artists 50000 --shows 1000000 \
+        --output bench.json --compare bench_baseline.json
+
+Every rule in the app's URL map is driven through the Flask test client.
+p50/p95/p99 latency and statements per request (read back from the
+Server-Timing header) come from --requests timed calls. Peak traced memory
+comes from one more call under tracemalloc. With --compare, the run is
+checked against an earlier report and exits non-zero on regressions.
+
+The image proxy is driven against a local HTTP stand-in serving the
+homepage splash image, so nothing is fetched from the network.
+"""
+import argparse
+import http.server
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.seed import load_app, seed
+
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(samples, pct):
+  ordered = sorted(samples)
+  return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1)]
+
+
+class Scenarios(object):
+  """URL arguments and form bodies for each endpoint, drawn from the seed."""
+
+  def __init__(self, db, venue_ids, artist_ids, rng, image_url=None):
+    self.db = db
+    self.venue_ids = venue_ids
+    self.artist_ids = artist_ids
+    self.rng = rng
+    self.image_url = image_url
+
+  def view_args(self, endpoint, arguments):
+    endpoint = endpoint.rsplit('.', 1)[-1]
+    values = {}
+    for name in arguments:
+      if name == 'venue_id':
+        values[name] = self._scratch('Venue') if endpoint == 'delete_venue' \
+          else self.rng.choice(self.venue_ids)
+      elif name == 'artist_id':
+        values[name] = self._scratch('Artist') if endpoint == 'delete_artist' \
+          else self.rng.choice(self.artist_ids)
+      elif name == 'name':
+        values[name] = 'Jazz'
+      elif name == 'kind':
+        values[name] = 'venues'
+      elif name == 'size':
+        values[name] = 'md'
+      elif name == 'format':
+        from images import signature
+        values.update(format='webp', src=self.image_url, sig=signature(self.image_url))
+      else:
+        raise KeyError('No sample value for <%s> in %s' % (name, endpoint))
+    if endpoint == 'venues_near':
+      values.update(artist_id=self.rng.choice(self.artist_ids), miles=100)
+    elif endpoint == 'artists_near':
+      values.update(venue_id=self.rng.choice(self.venue_ids), miles=100)
+    return values
+
+  def form(self, endpoint, values=None):
+    endpoint = endpoint.rsplit('.', 1)[-1]
+    n = self.rng.randint(1, 10 ** 6)
+    if endpoint == 'import_upload':
+      rows = ''.join('Bench Venue %d-%d,Austin,TX,%d Main St,Jazz\n' % (n, i, i) for i in range(100))
+      return {"file": (io.BytesIO(('name,city,state,address,genres\n' + rows).encode()), 'venues.csv')}
+    if endpoint.startswith('search_'):
+      return {"search_term": str(self.rng.randint(1, 999))}
+    if endpoint in ('create_venue_submission', 'edit_venue_submission'):
+      return dict(self._version('Venue', values), name="Bench Venue %d" % n, city="Austin",
+                  state="TX", address="%d Main St" % n, genres=["Jazz", "Blues"],
+                  facebook_link="https://facebook.com/%d" % n)
+    if endpoint in ('create_artist_submission', 'edit_artist_submission'):
+      return dict(self._version('Artist', values), name="Bench Artist %d" % n, city="Austin",
+                  state="TX", genres=["Jazz"], facebook_link="https://facebook.com/%d" % n)
+    if endpoint == 'create_show_submission':
+      start = datetime.now() + timedelta(days=self.rng.randint(1, 365))
+      return {"artist_id": self.rng.choice(self.artist_ids),
+              "venue_id": self.rng.choice(self.venue_ids),
+              "start_time": start.strftime('%Y-%m-%d %H:%M:%S')}
+    return {}
+
+  def _version(self, kind, values):
+    """The version field an edit page would carry for the row in `values`."""
+    key = kind.lower() + '_id'
+    if not values or key not in values:
+      return {}
+    import models
+    model = getattr(models, kind)
+    version = self.db.session.query(model.version).filter(model.id == values[key]).scalar()
+    self.db.session.remove()
+    return {"version": version}
+
+  def _scratch(self, kind):
+    """A new venue/artist for a delete to remove."""
+    import models
+    entity = getattr(models, kind)(name='Scratch ' + kind.lower(), city='Austin', state='TX')
+    self.db.session.add(entity)
+    self.db.session.commit()
+    id = entity.id
+    self.db.session.remove()
+    return id
+
+
+def image_server():
+  """Serve static/img/front-splash.jpg on a free local port from a daemon
+  thread; returns its URL."""
+  with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         'static', 'img', 'front-splash.jpg'), 'rb') as image:
+    body = image.read()
+
+  class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+      self.send_response(200)
+      self.send_header('Content-Type', 'image/jpeg')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args):
+      pass
+
+  server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return 'http://127.0.0.1:%d/splash.jpg' % server.server_address[1]
+
+
+def routes(app):
+  for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+    if rule.endpoint in ('static', 'assets.asset'):
+      continue
+    for method in sorted(rule.methods - {'HEAD', 'OPTIONS'}):
+      yield method, rule
+
+
+def call(client, app, scenarios, method, rule):
+  with app.test_request_context():
+    from flask import url_for
+    values = scenarios.view_args(rule.endpoint, rule.arguments)
+    url = url_for(rule.endpoint, **values)
+    data = scenarios.form(rule.endpoint, values) if method == 'POST' else None
+  start = time.perf_counter()
+  response = client.open(url, method=method, data=data)
+  elapsed = (time.perf_counter() - start) * 1000
+  timing = QUERIES.search(', '.join(response.headers.getlist('Server-Timing')))
+  return elapsed, int(timing.group(1)) if timing else None, response.status_code
+
+
+def run(app, scenarios, requests):
+  client = app.test_client()
+  results = {}
+  for method, rule in routes(app):
+    samples, queries, statuses = [], [], set()
+    for _ in range(requests):
+      elapsed, count, status = call(client, app, scenarios, method, rule)
+      samples.append(elapsed)
+      queries.append(count)
+      statuses.add(status)
+
+    tracemalloc.start()
+    call(client, app, scenarios, method, rule)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    results['%s %s' % (method, rule.rule)] = {
+      "p50_ms": round(percentile(samples, 50), 3),
+      "p95_ms": round(percentile(samples, 95), 3),
+      "p99_ms": round(percentile(samples, 99), 3),
+      "mean_ms": round(sum(samples) / len(samples), 3),
+      "queries": max(queries) if None not in queries else None,
+      "peak_kib": round(peak / 1024.0, 1),
+      "statuses": sorted(statuses),
+    }
+  return results
+
+
+def regressions(current, baseline, tolerance):
+  """Routes whose p95 grew by more than `tolerance` or that issue more queries."""
+  found = []
+  for route, before in baseline["routes"].items():
+    after = current["routes"].get(route)
+    if after is None:
+      continue
+    if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+      found.append('%s: p95 %.3f ms -> %.3f ms' % (route, before["p95_ms"], after["p95_ms"]))
+    if before["queries"] is not None and (after["queries"] or 0) > before["queries"]:
+      found.append('%s: queries %d -> %d' % (route, before["queries"], after["queries"]))
+  return found
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=5000)
+  parser.add_argument('--shows', type=int, default=50000)
+  parser.add_argument('--requests', type=int, default=50, help='timed calls per route')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--cache', action='store_true', help='leave the response cache enabled')
+  parser.add_argument('--output', help='write the report as JSON to this file')
+  parser.add_argument('--compare', help='fail on regressions against this earlier report')
+  parser.add_argument('--tolerance', type=float, default=0.2,
+                      help='allowed relative p95 growth before --compare fails')
+  args = parser.parse_args()
+
+  if not args.cache:
+    os.environ['CACHE_TYPE'] = 'null'
+  os.environ['IMAGE_CACHE_DIR'] = tempfile.mkdtemp(prefix='fyyur-bench-images-')
+  app, db = load_app(args.database_url)
+  app.config['IMAGE_ALLOW_PRIVATE_HOSTS'] = True
+  with app.app_context():
+    venue_ids, artist_ids = seed(db, args.venues, args.artists, args.shows, seed=args.seed)
+    db.session.remove()
+    scenarios = Scenarios(db, venue_ids, artist_ids, random.Random(args.seed), image_server())
+    report = {
+      "meta": {"venues": args.venues, "artists": args.artists, "shows": args.shows,
+               "requests": args.requests, "cache": args.cache,
+               "dialect": db.engine.dialect.name,
+               "created": datetime.now().isoformat()},
+      "routes": run(app, scenarios, args.requests),
+    }
+
+  print('%-40s %9s %9s %9s %7s %10s' % ('route', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'peak KiB'))
+  for route, stats in sorted(report["routes"].items()):
+    print('%-40s %9.3f %9.3f %9.3f %7s %10.1f' % (route, stats["p50_ms"], stats["p95_ms"],
+          stats["p99_ms"], stats["queries"], stats["peak_kib"]))
+  if args.output:
+    with open(args.output, 'w') as out:
+      json.dump(report, out, indent=2, sort_keys=True)
+  if args.compare:
+    with open(args.compare) as baseline:
+      found = regressions(report, json.load(baseline), args.tolerance)
+    for line in found:
+      print('REGRESSION ' + line)
+    if found:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,144 @@
+"""Seed a database with synthetic venues, artists and shows.
+
+    python -m benchmarks.seed --database-url sqlite:////tmp/fyyur.db \
+        --venues 10000 --artists 50000 --shows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+CITIES = [
+  ('San Francisco', 'CA'), ('Oakland', 'CA'), ('Los Angeles', 'CA'),
+  ('New York', 'NY'), ('Brooklyn', 'NY'), ('Austin', 'TX'), ('Houston', 'TX'),
+  ('Chicago', 'IL'), ('Springfield', 'IL'), ('Springfield', 'MO'),
+  ('Nashville', 'TN'), ('Memphis', 'TN'), ('New Orleans', 'LA'),
+  ('Seattle', 'WA'), ('Portland', 'OR'), ('Denver', 'CO'), ('Atlanta', 'GA'),
+  ('Detroit', 'MI'), ('Boston', 'MA'), ('Miami', 'FL'),
+]
+
+
+def load_app(database_url=None):
+  """Build the app against `database_url` (a fresh SQLite file by default)
+  and create its schema.
+
+  DATABASE_URL is exported as well, so servers started from the benchmarks
+  use the same database.
+  """
+  if database_url is None:
+    handle, path = tempfile.mkstemp(prefix='fyyur-bench-', suffix='.db')
+    os.close(handle)
+    os.remove(path)
+    database_url = 'sqlite:///' + path
+  os.environ['DATABASE_URL'] = database_url
+  from app import create_app
+  from extensions import db
+  # Every route is driven far faster than a client may call it.
+  app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'RATELIMIT_ENABLED': False})
+  with app.app_context():
+    db.create_all()
+  return app, db
+
+
+def _next_id(db, table):
+  return (db.session.query(db.func.max(table.c.id)).scalar() or 0) + 1
+
+
+def _insert(db, table, rows, chunk):
+  for start in range(0, len(rows), chunk):
+    db.session.execute(table.insert(), rows[start:start + chunk])
+
+
+def seed(db, venues=1000, artists=5000, shows=50000, chunk=10000, seed=0, now=None):
+  """Bulk-insert synthetic rows with executemany, returning the new id ranges.
+
+  Shows fill two-hour slots spread uniformly over a year either side of
+  `now`, so the past/upcoming split is roughly even, without double-booking
+  a venue or an artist.
+  """
+  import counters
+  from forms import VenueForm
+  from models import Venue, Artist, Show, Genre, artist_genres, venue_genres
+  from geo import location
+
+  rng = random.Random(seed)
+  now = now or datetime.now()
+  genres = Genre.named([name for name, _ in VenueForm.genres.kwargs['choices']])
+  db.session.add_all(genres)
+  db.session.flush()
+  genre_ids = [genre.id for genre in genres]
+  places = dict((place, location(*place)) for place in CITIES)
+
+  first_venue = _next_id(db, Venue.__table__)
+  venue_ids = range(first_venue, first_venue + venues)
+  venue_rows, venue_genre_rows = [], []
+  for id in venue_ids:
+    city, state = rng.choice(CITIES)
+    venue_rows.append({"id": id, "name": "Venue %d" % id, "city": city, "state": state,
+                       "address": "%d Main St" % id, "phone": "555-%04d" % (id % 10000),
+                       "image_link": "https://example.com/venues/%d.jpg" % id,
+                       "seeking_talent": rng.random() < 0.3})
+    venue_rows[-1].update(places[city, state])
+    for genre_id in rng.sample(genre_ids, 2):
+      venue_genre_rows.append({"venue_id": id, "genre_id": genre_id})
+  _insert(db, Venue.__table__, venue_rows, chunk)
+  _insert(db, venue_genres, venue_genre_rows, chunk)
+
+  first_artist = _next_id(db, Artist.__table__)
+  artist_ids = range(first_artist, first_artist + artists)
+  artist_rows, artist_genre_rows = [], []
+  for id in artist_ids:
+    city, state = rng.choice(CITIES)
+    artist_rows.append({"id": id, "name": "Artist %d" % id, "city": city, "state": state,
+                        "phone": "555-%04d" % (id % 10000),
+                        "image_link": "https://example.com/artists/%d.jpg" % id,
+                        "seeking_venue": rng.random() < 0.3})
+    artist_rows[-1].update(places[city, state])
+    for genre_id in rng.sample(genre_ids, 2):
+      artist_genre_rows.append({"artist_id": id, "genre_id": genre_id})
+  _insert(db, Artist.__table__, artist_rows, chunk)
+  _insert(db, artist_genres, artist_genre_rows, chunk)
+
+  # Two-hour slots; no venue or artist is booked twice in one slot.
+  length = timedelta(hours=2)
+  slots = 2 * 365 * 12
+  if shows > min(venues, artists) * slots // 2:
+    raise ValueError('Too many shows to book %d venues and %d artists' % (venues, artists))
+  booked = set()
+  for start in range(0, shows, chunk):
+    rows = []
+    while len(rows) < min(chunk, shows - start):
+      slot = rng.randrange(slots)
+      venue_id, artist_id = rng.choice(venue_ids), rng.choice(artist_ids)
+      if ('v', venue_id, slot) in booked or ('a', artist_id, slot) in booked:
+        continue
+      booked.update([('v', venue_id, slot), ('a', artist_id, slot)])
+      time = now + (slot - slots // 2) * length
+      rows.append({"time": time, "end_time": time + length,
+                   "artist_id": artist_id, "venue_id": venue_id})
+    _insert(db, Show.__table__, rows, chunk)
+  # Core inserts bypass the ORM events that maintain the counters.
+  for model, show_fk, _ in counters.OWNERS:
+    counters.refresh(db.session.connection(), model, show_fk, now=now)
+  db.session.commit()
+  return venue_ids, artist_ids
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=5000)
+  parser.add_argument('--shows', type=int, default=50000)
+  parser.add_argument('--seed', type=int, default=0)
+  args = parser.parse_args()
+
+  app, db = load_app(args.database_url)
+  with app.app_context():
+    seed(db, args.venues, args.artists, args.shows, seed=args.seed)
+  print(os.environ['DATABASE_URL'])
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,194 @@
+"""Throughput of sync WSGI workers against the ASGI entry point at equal memory.
+
+    python -m benchmarks.serving --memory 400 --concurrency 64 --duration 20
+
+Serves a seeded database under gunicorn sync workers and under uvicorn with
+asgi.py, drives both with the same concurrent keep-alive clients and reports
+requests per second, latency percentiles and the resident memory of the
+whole server process tree. With --memory, each mode is first run warm with
+two workers to measure what a worker costs, then given as many workers as
+fit in that many MiB. Otherwise --sync-workers and --asgi-workers are used
+as given and throughput is also reported per 100 MiB. Needs gunicorn,
+uvicorn and Linux (memory is read from /proc).
+"""
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.routes import percentile
+from benchmarks.seed import load_app, seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def command(mode, workers, port):
+  if mode == 'sync':
+    return [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+            '--bind', '127.0.0.1:%d' % port, 'app:create_app()']
+  return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--workers', str(workers),
+          '--port', str(port), '--log-level', 'warning']
+
+
+def children(pid):
+  pids = []
+  for task in os.listdir('/proc/%d/task' % pid):
+    with open('/proc/%d/task/%s/children' % (pid, task)) as listing:
+      pids.extend(int(child) for child in listing.read().split())
+  return pids
+
+
+def rss(pid):
+  """Resident memory of one process in KiB."""
+  with open('/proc/%d/status' % pid) as status:
+    for line in status:
+      if line.startswith('VmRSS:'):
+        return int(line.split()[1])
+  return 0
+
+
+def tree_rss(pid):
+  """Resident memory in KiB of `pid` and all of its descendants."""
+  try:
+    return rss(pid) + sum(tree_rss(child) for child in children(pid))
+  except (IOError, OSError):
+    return 0
+
+
+class Server(object):
+
+  def __init__(self, mode, workers, port):
+    self.mode = mode
+    self.workers = workers
+    self.port = port
+    self.process = None
+
+  def __enter__(self):
+    self.process = subprocess.Popen(command(self.mode, self.workers, self.port), cwd=ROOT,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+      try:
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=1)
+        connection.request('GET', '/_metrics')
+        connection.getresponse().read()
+        connection.close()
+        # Wait for every worker to finish importing the app.
+        time.sleep(1 + 0.2 * self.workers)
+        return self
+      except (IOError, OSError, http.client.HTTPException):
+        if self.process.poll() is not None:
+          raise RuntimeError('%s server exited with %d' % (self.mode, self.process.returncode))
+        time.sleep(0.2)
+    raise RuntimeError('%s server did not come up' % self.mode)
+
+  def __exit__(self, *exc):
+    self.process.terminate()
+    self.process.wait()
+
+  def rss(self):
+    return tree_rss(self.process.pid)
+
+
+def load(port, urls, concurrency, duration, seed):
+  """Hammer the server from `concurrency` keep-alive clients for `duration`
+  seconds; returns latencies in ms and the number of failed requests."""
+  latencies = []
+  errors = [0]
+  lock = threading.Lock()
+  stop = time.time() + duration
+
+  def client(n):
+    rng = random.Random(seed + n)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    mine, failed = [], 0
+    while time.time() < stop:
+      start = time.perf_counter()
+      try:
+        connection.request('GET', rng.choice(urls))
+        response = connection.getresponse()
+        response.read()
+        if response.status >= 500:
+          failed += 1
+      except (IOError, OSError, http.client.HTTPException):
+        failed += 1
+        connection.close()
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        continue
+      mine.append((time.perf_counter() - start) * 1000)
+    connection.close()
+    with lock:
+      latencies.extend(mine)
+      errors[0] += failed
+
+  threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return latencies, errors[0]
+
+
+def workers_for(mode, memory, port, urls, concurrency):
+  """How many workers of `mode` fit in `memory` MiB, measured after a short
+  load. Uses two workers, since uvicorn runs a single one without a
+  supervisor process."""
+  with Server(mode, 2, port) as server:
+    load(port, urls, concurrency, 3, 0)
+    master = rss(server.process.pid)
+    workers = [tree_rss(child) for child in children(server.process.pid)]
+  worker = max(sum(workers) // max(len(workers), 1), 1)
+  return max(1, int((memory * 1024 - master) // worker))
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=5000)
+  parser.add_argument('--shows', type=int, default=50000)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--memory', type=int, help='MiB each mode may use; sizes the worker counts')
+  parser.add_argument('--sync-workers', type=int, default=4)
+  parser.add_argument('--asgi-workers', type=int, default=1)
+  parser.add_argument('--concurrency', type=int, default=32, help='concurrent clients')
+  parser.add_argument('--duration', type=float, default=10, help='seconds of load per mode')
+  parser.add_argument('--port', type=int, default=8765)
+  parser.add_argument('--cache', action='store_true', help='leave the response cache enabled')
+  args = parser.parse_args()
+
+  if not args.cache:
+    os.environ['CACHE_TYPE'] = 'null'
+  # The servers are probed on /_metrics until they answer.
+  os.environ['METRICS_PAGE'] = '1'
+  app, db = load_app(args.database_url)
+  with app.app_context():
+    venue_ids, artist_ids = seed(db, args.venues, args.artists, args.shows, seed=args.seed)
+    db.session.remove()
+  rng = random.Random(args.seed)
+  urls = ['/', '/venues', '/artists', '/shows', '/api/v1/venues', '/api/v1/shows'] \
+    + ['/venues/%d' % rng.choice(venue_ids) for _ in range(20)] \
+    + ['/artists/%d' % rng.choice(artist_ids) for _ in range(20)]
+
+  print('%-6s %8s %10s %9s %9s %9s %7s %9s %12s' % ('mode', 'workers', 'requests', 'req/s',
+        'p50 ms', 'p95 ms', 'errors', 'RSS MiB', 'req/s/100MiB'))
+  for mode, workers in (('sync', args.sync_workers), ('asgi', args.asgi_workers)):
+    if args.memory:
+      workers = workers_for(mode, args.memory, args.port, urls, args.concurrency)
+    with Server(mode, workers, args.port) as server:
+      latencies, errors = load(args.port, urls, args.concurrency, args.duration, args.seed)
+      resident = server.rss() / 1024.0
+    rate = len(latencies) / args.duration
+    print('%-6s %8d %10d %9.1f %9.2f %9.2f %7d %9.1f %12.1f' % (
+          mode, workers, len(latencies), rate,
+          percentile(latencies, 50) if latencies else 0,
+          percentile(latencies, 95) if latencies else 0,
+          errors, resident, rate / resident * 100 if resident else 0))
+
+
+if __name__ == '__main__':
+  main()
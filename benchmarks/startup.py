@@ -0,0 +1,80 @@
+"""Cold start of a worker: import, app factory and first response.
+
+    python -m benchmarks.startup --runs 20 --path / --path /venues
+
+Each run is a fresh interpreter that imports `app`, calls create_app() and
+serves one request per --path through the test client, as a newly forked
+or serverless worker would. Reports the median and worst time of each
+phase, and the modules loaded before the first request, against a small
+seeded database.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.routes import percentile
+from benchmarks.seed import load_app, seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON line of timings in ms.
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+built = time.perf_counter()
+modules = len(sys.modules)
+client = app.test_client()
+for path in sys.argv[1:]:
+  status = client.get(path).status_code
+  if status >= 500:
+    sys.exit('%s returned %d' % (path, status))
+  if path == sys.argv[1]:
+    first = time.perf_counter()
+print(json.dumps({"import": (imported - start) * 1000, "create_app": (built - imported) * 1000,
+                  "first response": (first - built) * 1000, "total": (first - start) * 1000,
+                  "modules": modules}))
+'''
+
+PHASES = ('import', 'create_app', 'first response', 'total')
+
+
+def probe(paths):
+  output = subprocess.check_output([sys.executable, '-c', PROBE] + paths, cwd=ROOT)
+  return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--runs', type=int, default=10, help='fresh interpreters to start')
+  parser.add_argument('--path', action='append', dest='paths',
+                      help='request to serve after startup (repeatable; the first is timed)')
+  parser.add_argument('--output', help='write the report as JSON to this file')
+  args = parser.parse_args()
+
+  app, db = load_app(args.database_url)
+  with app.app_context():
+    seed(db, 50, 200, 1000)
+    db.session.remove()
+  runs = [probe(args.paths or ['/']) for _ in range(args.runs)]
+
+  report = {}
+  print('%-16s %9s %9s' % ('phase', 'p50 ms', 'max ms'))
+  for phase in PHASES:
+    samples = [run[phase] for run in runs]
+    report[phase] = {"p50_ms": percentile(samples, 50), "max_ms": max(samples)}
+    print('%-16s %9.1f %9.1f' % (phase, report[phase]['p50_ms'], report[phase]['max_ms']))
+  report['modules'] = runs[-1]['modules']
+  print('%d modules loaded before the first request' % report['modules'])
+  if args.output:
+    with open(args.output, 'w') as handle:
+      json.dump(report, handle, indent=2)
+
+
+if __name__ == '__main__':
+  main()
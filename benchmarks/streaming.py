@@ -0,0 +1,73 @@
+"""Time to first byte, total time, bytes sent and peak memory of the full listings.
+
+    python -m benchmarks.streaming --shows 200000 --encoding gzip --encoding identity
+
+Requests /shows?all=1 and /artists?all=1 (streamed) and the paginated
+/shows and /artists for comparison through the test client, reading the
+body chunk by chunk as a client would. Peak memory is traced Python
+allocations during the request, which stays flat for the streamed pages
+however many rows they render. Fragment caching is off, so every row is
+rendered.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.seed import load_app, seed
+
+PATHS = ('/shows?all=1', '/artists?all=1', '/shows', '/artists')
+
+
+def measure(client, path, encoding):
+  tracemalloc.start()
+  start = time.perf_counter()
+  response = client.get(path, headers={'Accept-Encoding': encoding}, buffered=False)
+  first = None
+  sent = 0
+  for chunk in response.response:
+    if first is None:
+      first = time.perf_counter()
+    sent += len(chunk)
+  response.close()
+  done = time.perf_counter()
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+  return {"ttfb_ms": (first - start) * 1000, "total_ms": (done - start) * 1000,
+          "bytes": sent, "peak_kib": peak / 1024.0}
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--database-url')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=20000)
+  parser.add_argument('--shows', type=int, default=50000)
+  parser.add_argument('--encoding', action='append', dest='encodings',
+                      help='Accept-Encoding to send (repeatable; gzip by default)')
+  parser.add_argument('--output', help='write the report as JSON to this file')
+  args = parser.parse_args()
+
+  app, db = load_app(args.database_url)
+  with app.app_context():
+    seed(db, args.venues, args.artists, args.shows)
+    db.session.remove()
+  app.extensions.pop('fragments', None)
+  client = app.test_client()
+  for path in PATHS:
+    client.get(path)
+
+  report = {}
+  print('%-16s %-9s %9s %10s %12s %9s' % ('path', 'encoding', 'ttfb ms', 'total ms', 'bytes', 'peak KiB'))
+  for path in PATHS:
+    for encoding in args.encodings or ['gzip']:
+      result = report.setdefault(path, {})[encoding] = measure(client, path, encoding)
+      print('%-16s %-9s %9.1f %10.1f %12d %9.0f' % (path, encoding, result['ttfb_ms'],
+                                                   result['total_ms'], result['bytes'], result['peak_kib']))
+  if args.output:
+    with open(args.output, 'w') as handle:
+      json.dump(report, handle, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,169 @@
+#----------------------------------------------------------------------------#
+# Show bookings and availability.
+#
+# A show books its venue and its artist from `time` to `end_time`; neither
+# may be booked twice at once. On Postgres, exclusion constraints over
+# tsrange(time, end_time) enforce this in a GiST index (see models.py). On
+# every database a new booking is checked first, for a clear error:
+# bookings of one venue or artist never overlap, so sorted by start they
+# are sorted by end too, and only the last booking starting before the new
+# one ends can overlap it. That is one seek on the (owner, time) indexes of
+# Show, or a bisect in an `Intervals` set in memory, instead of a scan.
+#----------------------------------------------------------------------------#
+
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from flask import current_app, jsonify, request
+from extensions import db
+from models import Venue, Artist, Show
+
+OWNERS = {'venue': (Venue, Show.venue_id), 'artist': (Artist, Show.artist_id)}
+
+
+class Intervals(object):
+  """Disjoint [start, end) intervals sorted by start. Overlapping intervals
+  passed in are merged."""
+
+  def __init__(self, intervals=()):
+    self.starts = []
+    self.ends = []
+    for start, end in sorted(intervals):
+      if self.ends and start < self.ends[-1]:
+        self.ends[-1] = max(self.ends[-1], end)
+      else:
+        self.starts.append(start)
+        self.ends.append(end)
+
+  def conflict(self, start, end):
+    """The interval overlapping [start, end), or None. O(log n)."""
+    i = bisect_left(self.starts, end) - 1
+    if i >= 0 and self.ends[i] > start:
+      return self.starts[i], self.ends[i]
+    return None
+
+  def add(self, start, end):
+    if self.conflict(start, end) is not None:
+      raise ValueError('%s - %s overlaps a booking' % (start, end))
+    i = bisect_left(self.starts, start)
+    self.starts.insert(i, start)
+    self.ends.insert(i, end)
+
+  def free(self, start, end, min_length=timedelta(0)):
+    """The gaps of at least `min_length` between the intervals, within
+    [start, end)."""
+    gaps = []
+    cursor = start
+    for i in range(max(bisect_left(self.starts, start) - 1, 0), len(self.starts)):
+      if self.starts[i] >= end:
+        break
+      if self.starts[i] > cursor and self.starts[i] - cursor >= min_length:
+        gaps.append((cursor, self.starts[i]))
+      cursor = max(cursor, self.ends[i])
+    if end > cursor and end - cursor >= min_length:
+      gaps.append((cursor, end))
+    return gaps
+
+  def __iter__(self):
+    return iter(zip(self.starts, self.ends))
+
+
+def default_end(start):
+  return start + timedelta(minutes=current_app.config['SHOW_DEFAULT_MINUTES'])
+
+
+def check_length(start, end):
+  """Why [start, end) can't be a show, or None."""
+  if end <= start:
+    return 'A show must end after it starts.'
+  if end - start > timedelta(minutes=current_app.config['SHOW_MAX_MINUTES']):
+    return 'A show may last at most %d minutes.' % current_app.config['SHOW_MAX_MINUTES']
+  return None
+
+
+def conflict(owner, owner_id, start, end):
+  """The (start, end, show id) of a booking of venue/artist `owner_id`
+  overlapping [start, end), or None."""
+  show_fk = OWNERS[owner][1]
+  row = db.session.query(Show.time, Show.end_time, Show.id) \
+    .filter(show_fk == owner_id, Show.time < end, Show.deleted_at.is_(None)) \
+    .order_by(Show.time.desc()).first()
+  return tuple(row) if row is not None and row.end_time > start else None
+
+
+def missing(venue_id, artist_id):
+  """A message for each of the venue and artist that doesn't exist or was
+  deleted."""
+  messages = []
+  for owner, owner_id in (('venue', venue_id), ('artist', artist_id)):
+    model = OWNERS[owner][0]
+    if db.session.query(model.id).filter(model.id == owner_id, model.deleted_at.is_(None)) \
+        .scalar() is None:
+      messages.append('There is no %s with id %d.' % (owner, owner_id))
+  return messages
+
+
+def conflicts(start, end, venue_id, artist_id):
+  """A message for each of the venue and artist already booked during
+  [start, end)."""
+  messages = []
+  for owner, owner_id in (('venue', venue_id), ('artist', artist_id)):
+    booked = conflict(owner, owner_id, start, end)
+    if booked is not None:
+      messages.append('The %s is already booked from %s to %s.'
+                      % (owner, booked[0].strftime('%Y-%m-%d %H:%M'),
+                         booked[1].strftime('%Y-%m-%d %H:%M')))
+  return messages
+
+
+def bookings(owner, owner_ids, start, end):
+  """Intervals of the shows of each of `owner_ids` overlapping [start, end),
+  in one query. Shows are at most SHOW_MAX_MINUTES long, which bounds the
+  index range scanned."""
+  show_fk = OWNERS[owner][1]
+  longest = timedelta(minutes=current_app.config['SHOW_MAX_MINUTES'])
+  rows = db.session.query(show_fk, Show.time, Show.end_time) \
+    .filter(show_fk.in_(list(owner_ids)), Show.time < end, Show.time > start - longest,
+            Show.end_time > start, Show.deleted_at.is_(None))
+  intervals = dict((owner_id, []) for owner_id in owner_ids)
+  for owner_id, show_start, show_end in rows:
+    intervals[owner_id].append((show_start, show_end))
+  return dict((owner_id, Intervals(found)) for owner_id, found in intervals.items())
+
+
+def availability(owner, owner_id, start, end, min_length=timedelta(0)):
+  """The busy and free time of a venue/artist within [start, end), for the
+  availability endpoints. None when it doesn't exist."""
+  model = OWNERS[owner][0]
+  if db.session.query(model.id).filter(model.id == owner_id, model.deleted_at.is_(None)) \
+      .scalar() is None:
+    return None
+  busy = bookings(owner, [owner_id], start, end)[owner_id]
+  return {
+    owner + "_id": owner_id,
+    "from": start.isoformat(),
+    "to": end.isoformat(),
+    "busy": [{"start": s.isoformat(), "end": e.isoformat()} for s, e in busy],
+    "free": [{"start": s.isoformat(), "end": e.isoformat()}
+             for s, e in busy.free(start, end, min_length)],
+  }
+
+
+def availability_view(owner, owner_id):
+  """JSON for /venues/<id>/availability and /artists/<id>/availability:
+  ?from= and ?to= (ISO dates or datetimes; the next AVAILABILITY_DEFAULT_DAYS
+  by default) and ?min= (the shortest free slot reported, in minutes)."""
+  try:
+    start = datetime.fromisoformat(request.args['from']) if 'from' in request.args \
+      else datetime.now().replace(second=0, microsecond=0)
+    end = datetime.fromisoformat(request.args['to']) if 'to' in request.args \
+      else start + timedelta(days=current_app.config['AVAILABILITY_DEFAULT_DAYS'])
+    min_length = timedelta(minutes=request.args.get('min', 0, type=int))
+  except ValueError as error:
+    return jsonify(error=str(error)), 400
+  if end <= start or end - start > timedelta(days=current_app.config['AVAILABILITY_MAX_DAYS']):
+    return jsonify(error='to must be after from, by at most %d days.'
+                   % current_app.config['AVAILABILITY_MAX_DAYS']), 400
+  result = availability(owner, owner_id, start, end, min_length)
+  if result is None:
+    return jsonify(error='No %s with id %d.' % (owner, owner_id)), 404
+  return jsonify(result)
@@ -0,0 +1,377 @@
+#----------------------------------------------------------------------------#
+# Bulk import / export.
+#
+# Rows are streamed from CSV or NDJSON in fixed-size chunks, validated
+# against the same WTForms used by the create pages, and written with one
+# executemany per chunk. Foreign keys and duplicate ids are resolved with one
+# query per chunk. A chunk is committed on its own, and rows that fail
+# validation or the insert are reported by line without stopping the import.
+# Shows that would double-book their venue or artist, against the database
+# or an earlier row, are rejected the same way (see bookings.py).
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+from datetime import datetime
+from itertools import islice
+from sqlalchemy.exc import DBAPIError
+from werkzeug.datastructures import MultiDict
+from wtforms.validators import DataRequired
+from extensions import db
+from bookings import bookings, check_length, default_end
+from geo import location
+from models import Venue, Artist, Show, Genre, artist_genres, venue_genres
+import counters
+
+CHUNK_SIZE = 1000
+FORMATS = ('csv', 'ndjson')
+MAX_REPORTED_ERRORS = 1000
+
+BOOLEANS = {'1': True, 'true': True, 'yes': True, '0': False, 'false': False, 'no': False, '': False}
+
+RESOURCES = {
+  'venues': {
+    'model': Venue,
+    'form': 'VenueForm',
+    'columns': ['id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+                'website', 'seeking_talent', 'seeking_description', 'genres'],
+    'genres': (venue_genres, 'venue_id'),
+  },
+  'artists': {
+    'model': Artist,
+    'form': 'ArtistForm',
+    'columns': ['id', 'name', 'city', 'state', 'phone', 'image_link', 'facebook_link',
+                'website', 'seeking_venue', 'seeking_description', 'genres'],
+    'genres': (artist_genres, 'artist_id'),
+  },
+  'shows': {
+    'model': Show,
+    'form': 'ShowForm',
+    'columns': ['id', 'artist_id', 'venue_id', 'start_time', 'end_time'],
+    'genres': None,
+  },
+}
+
+
+def read_rows(stream, format):
+  """Yield (line number, dict) pairs from a text stream; lines that are not
+  a JSON object come through as None."""
+  if format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      yield reader.line_num, row
+  elif format == 'ndjson':
+    for line_num, line in enumerate(stream, 1):
+      if not line.strip():
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError:
+        row = None
+      yield line_num, row if isinstance(row, dict) else None
+  else:
+    raise ValueError('Unsupported format: %s' % format)
+
+
+def format_of(filename, default='csv'):
+  return 'ndjson' if filename.endswith(('.ndjson', '.jsonl')) else default
+
+
+def _genre_names(value):
+  if isinstance(value, (list, tuple)):
+    return [str(name).strip() for name in value if str(name).strip()]
+  return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def _formdata(row):
+  data = MultiDict()
+  for key, value in row.items():
+    if key == 'genres':
+      for name in _genre_names(value):
+        data.add(key, name)
+    elif value is not None:
+      data.add(key, str(value))
+  return data
+
+
+def _validate(form_class, row):
+  """Run the resource's form over `row`. Blank fields that the form does not
+  require are skipped rather than held to their format validators."""
+  form = form_class(formdata=_formdata(row), meta={'csrf': False})
+  form.validate()
+  errors = {}
+  for field in form:
+    blank = not _genre_names(row.get(field.name)) if field.name == 'genres' \
+      else not str(row.get(field.name) or '').strip()
+    required = any(isinstance(validator, DataRequired) for validator in field.validators)
+    if blank and required:
+      # Don't let a field default (ShowForm.start_time) stand in for a missing value.
+      errors[field.name] = ['This field is required.']
+    elif field.errors and not blank:
+      errors[field.name] = field.errors
+  return form, errors
+
+
+def _record(kind, form, row):
+  if kind == 'shows':
+    return {'id': _int(row.get('id')),
+            'artist_id': int(form.artist_id.data),
+            'venue_id': int(form.venue_id.data),
+            'time': form.start_time.data,
+            'end_time': form.end_time.data or default_end(form.start_time.data)}
+  record = {}
+  for column in RESOURCES[kind]['columns']:
+    if column == 'genres':
+      continue
+    value = row.get(column)
+    if column == 'id':
+      value = _int(value)
+    elif column.startswith('seeking_') and column != 'seeking_description':
+      value = value if isinstance(value, bool) else BOOLEANS.get(str(value or '').strip().lower(), False)
+    elif value == '':
+      value = None
+    record[column] = value
+  record.update(location(record['city'], record['state']))
+  return record
+
+
+def _int(value):
+  return int(value) if value not in (None, '') else None
+
+
+def _existing(model, ids, live=False):
+  """Which of `ids` are rows of `model`; with `live`, rows not deleted."""
+  ids = set(id for id in ids if id is not None)
+  if not ids:
+    return set()
+  query = db.session.query(model.id).filter(model.id.in_(ids))
+  if live:
+    query = query.filter(model.deleted_at.is_(None))
+  return set(id for id, in query)
+
+
+def _allocate_ids(model, count):
+  """Reserve `count` primary keys so association rows can be written in the
+  same executemany pass as their owners."""
+  if count == 0:
+    return []
+  if db.session.get_bind().dialect.name == 'postgresql':
+    sequence = db.session.execute("SELECT pg_get_serial_sequence('\"%s\"', 'id')"
+                                  % model.__tablename__).scalar()
+    return [id for id, in db.session.execute(
+      'SELECT nextval(:sequence) FROM generate_series(1, :count)',
+      {'sequence': sequence, 'count': count})]
+  start = (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+  return list(range(start, start + count))
+
+
+class Report(object):
+
+  def __init__(self):
+    self.rows = 0
+    self.inserted = 0
+    self.failed = 0
+    self.errors = []
+
+  def error(self, line, errors):
+    self.failed += 1
+    if len(self.errors) < MAX_REPORTED_ERRORS:
+      self.errors.append({'line': line, 'errors': errors})
+
+  def as_dict(self):
+    return {'rows': self.rows, 'inserted': self.inserted, 'failed': self.failed,
+            'errors': self.errors}
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE, report=None):
+  """Validate and insert (line, row) pairs for `kind`, one chunk at a time.
+  Counts go to `report` (a new Report by default), so a caller stopped by
+  an unreadable row still knows what the earlier chunks inserted."""
+  import forms
+  resource = RESOURCES[kind]
+  model = resource['model']
+  form_class = getattr(forms, resource['form'])
+  report = report if report is not None else Report()
+  rows = iter(rows)
+  while True:
+    chunk = list(islice(rows, chunk_size))
+    if not chunk:
+      break
+    report.rows += len(chunk)
+
+    valid = []
+    for line, row in chunk:
+      if row is None:
+        report.error(line, {'row': ['Not a JSON object.']})
+        continue
+      form, errors = _validate(form_class, row)
+      if errors:
+        report.error(line, errors)
+        continue
+      try:
+        valid.append((line, row, _record(kind, form, row)))
+      except ValueError:
+        report.error(line, {'id': ['Ids must be whole numbers.']})
+
+    valid = _resolve_keys(kind, model, valid, report)
+    _write(kind, resource, model, valid, report)
+  if db.session.get_bind().dialect.name == 'postgresql':
+    db.session.execute("SELECT setval(pg_get_serial_sequence('\"{t}\"', 'id'), "
+                       "coalesce(max(id), 1)) FROM \"{t}\"".format(t=model.__tablename__))
+    db.session.commit()
+  return report
+
+
+def _resolve_keys(kind, model, valid, report):
+  """Drop rows whose id is taken, whose artist/venue does not exist or
+  which would double-book it."""
+  taken = _existing(model, [record['id'] for _, _, record in valid])
+  if kind == 'shows':
+    venues = _existing(Venue, [record['venue_id'] for _, _, record in valid], live=True)
+    artists = _existing(Artist, [record['artist_id'] for _, _, record in valid], live=True)
+    booked = _booked(valid, venues, artists)
+  kept = []
+  for line, row, record in valid:
+    errors = {}
+    if record['id'] in taken:
+      errors['id'] = ['%s %d already exists.' % (model.__name__, record['id'])]
+    if kind == 'shows':
+      if record['venue_id'] not in venues:
+        errors['venue_id'] = ['No venue with id %d.' % record['venue_id']]
+      if record['artist_id'] not in artists:
+        errors['artist_id'] = ['No artist with id %d.' % record['artist_id']]
+      if not errors:
+        errors = _book(booked, record)
+    if errors:
+      report.error(line, errors)
+    else:
+      kept.append((line, row, record))
+  return kept
+
+
+def _booked(valid, venues, artists):
+  """The bookings of the chunk's venues and artists over the time it spans,
+  read in one query each."""
+  if not valid:
+    return {}
+  start = min(record['time'] for _, _, record in valid)
+  end = max(record['end_time'] for _, _, record in valid)
+  return {'venue': bookings('venue', venues, start, end),
+          'artist': bookings('artist', artists, start, end)}
+
+
+def _book(booked, record):
+  """Errors if `record` can't be booked; otherwise book it, so later rows of
+  the chunk are checked against it too."""
+  problem = check_length(record['time'], record['end_time'])
+  if problem:
+    return {'end_time': [problem]}
+  errors = {}
+  for owner in ('venue', 'artist'):
+    taken = booked[owner][record[owner + '_id']].conflict(record['time'], record['end_time'])
+    if taken is not None:
+      errors[owner + '_id'] = ['The %s is already booked from %s to %s.' % (owner, taken[0], taken[1])]
+  if not errors:
+    for owner in ('venue', 'artist'):
+      booked[owner][record[owner + '_id']].add(record['time'], record['end_time'])
+  return errors
+
+
+def _write(kind, resource, model, valid, report):
+  if not valid:
+    return
+  new_ids = iter(_allocate_ids(model, sum(1 for _, _, record in valid if record['id'] is None)))
+  for _, _, record in valid:
+    if record['id'] is None:
+      record['id'] = next(new_ids)
+
+  links = []
+  if resource['genres']:
+    table, owner_column = resource['genres']
+    names = set()
+    for _, row, _ in valid:
+      names.update(_genre_names(row.get('genres')))
+    genres = Genre.named(names)
+    db.session.add_all(genres)
+    db.session.flush()
+    genre_ids = dict((genre.name, genre.id) for genre in genres)
+    for _, row, record in valid:
+      for name in set(_genre_names(row.get('genres'))):
+        links.append({owner_column: record['id'], 'genre_id': genre_ids[name]})
+
+  try:
+    db.session.execute(model.__table__.insert(), [record for _, _, record in valid])
+    if links:
+      db.session.execute(resource['genres'][0].insert(), links)
+    if kind == 'shows':
+      _refresh_counters(valid)
+    db.session.commit()
+    report.inserted += len(valid)
+  except DBAPIError:
+    db.session.rollback()
+    if len(valid) == 1:
+      line, _, _ = valid[0]
+      report.error(line, {'row': ['Rejected by the database.']})
+    else:
+      # Isolate the offending rows instead of losing the whole chunk.
+      for row in valid:
+        _write(kind, resource, model, [row], report)
+
+
+def _refresh_counters(valid):
+  connection = db.session.connection()
+  counters.refresh(connection, Venue, Show.venue_id, set(r['venue_id'] for _, _, r in valid))
+  counters.refresh(connection, Artist, Show.artist_id, set(r['artist_id'] for _, _, r in valid))
+
+
+def export_rows(kind, chunk_size=CHUNK_SIZE):
+  """Yield every live row of `kind` as a dict, walking the table by id in
+  chunks."""
+  resource = RESOURCES[kind]
+  model = resource['model']
+  table = model.__table__
+  last_id = 0
+  while True:
+    rows = db.session.execute(table.select().where(table.c.id > last_id)
+                              .order_by(table.c.id).limit(chunk_size)).fetchall()
+    if not rows:
+      break
+    last_id = rows[-1].id
+    rows = [row for row in rows if row.deleted_at is None]
+    genres = {}
+    if resource['genres']:
+      association, owner_column = resource['genres']
+      owner = association.c[owner_column]
+      for owner_id, name in db.session.execute(
+          db.select([owner, Genre.name])
+          .select_from(association.join(Genre.__table__, Genre.id == association.c.genre_id))
+          .where(owner.in_([row.id for row in rows]))
+          .order_by(owner, Genre.name)):
+        genres.setdefault(owner_id, []).append(name)
+    for row in rows:
+      if kind == 'shows':
+        yield {'id': row.id, 'artist_id': row.artist_id, 'venue_id': row.venue_id,
+               'start_time': row.time.strftime('%Y-%m-%d %H:%M:%S'),
+               'end_time': row.end_time.strftime('%Y-%m-%d %H:%M:%S')}
+      else:
+        record = dict((column, row[column]) for column in resource['columns'] if column != 'genres')
+        record['genres'] = genres.get(row.id, [])
+        yield record
+
+
+def write_rows(kind, rows, stream, format):
+  """Serialize exported rows to a text stream."""
+  columns = RESOURCES[kind]['columns']
+  if format == 'csv':
+    writer = csv.DictWriter(stream, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+      if 'genres' in row:
+        row = dict(row, genres=','.join(row['genres']))
+      writer.writerow(row)
+  elif format == 'ndjson':
+    for row in rows:
+      stream.write(json.dumps(row, default=lambda value: value.isoformat()
+                              if isinstance(value, datetime) else str(value)) + '\n')
+  else:
+    raise ValueError('Unsupported format: %s' % format)
@@ -0,0 +1,159 @@
+#----------------------------------------------------------------------------#
+# Response cache.
+#
+# Cached views are tagged with the kinds of data they render ('venues',
+# 'artists', 'shows'). Every tag has a version token that is folded into
+# the cache key, so a write invalidates exactly the pages carrying its tag
+# by replacing that token; nothing is ever flushed or scanned. Writes
+# replace the tokens as their transaction commits (invalidate_after_commit),
+# in the request that wrote, so its redirect already reads the new page.
+#----------------------------------------------------------------------------#
+
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, make_response, request, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class LRUBackend(object):
+  """In-process backend: a bounded, thread-safe LRU with per-entry TTLs."""
+
+  def __init__(self, max_entries=1024):
+    self.max_entries = max_entries
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+
+  def get_many(self, keys):
+    now = time.time()
+    values = []
+    with self._lock:
+      for key in keys:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+          del self._entries[key]
+          entry = None
+        if entry is not None:
+          self._entries.move_to_end(key)
+        values.append(entry[0] if entry is not None else None)
+    return values
+
+  def set(self, key, value, ttl=None):
+    expires = time.time() + ttl if ttl else None
+    with self._lock:
+      self._entries[key] = (value, expires)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def delete(self, *keys):
+    with self._lock:
+      for key in keys:
+        self._entries.pop(key, None)
+
+
+class RedisBackend(object):
+  """Backend over any client with the redis-py get/mget/set/delete API."""
+
+  def __init__(self, client, prefix='fyyur:'):
+    self.client = client
+    self.prefix = prefix
+
+  def get_many(self, keys):
+    values = self.client.mget([self.prefix + key for key in keys])
+    return [pickle.loads(value) if value is not None else None for value in values]
+
+  def set(self, key, value, ttl=None):
+    self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+  def delete(self, *keys):
+    if keys:
+      self.client.delete(*[self.prefix + key for key in keys])
+
+
+class Cache(object):
+
+  def __init__(self, app=None):
+    self.backend = None
+    self.default_ttl = None
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('CACHE_TYPE', 'lru')
+    app.config.setdefault('CACHE_DEFAULT_TTL', 60)
+    app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+    app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    self.default_ttl = app.config['CACHE_DEFAULT_TTL']
+    self.backend = None
+    if app.config['CACHE_TYPE'] == 'redis':
+      import redis
+      self.backend = RedisBackend(redis.Redis.from_url(app.config['CACHE_REDIS_URL']))
+    elif app.config['CACHE_TYPE'] == 'lru':
+      self.backend = LRUBackend(app.config['CACHE_MAX_ENTRIES'])
+    if not event.contains(Session, 'after_commit', _after_commit):
+      event.listen(Session, 'after_commit', _after_commit)
+      event.listen(Session, 'after_rollback', _after_rollback)
+    app.extensions['cache'] = self
+
+  def tag_versions(self, tags):
+    """Current version token of each tag, minting one for unknown tags.
+
+    A tag evicted from the backend gets a fresh token rather than a reset
+    counter, so entries written under the old token can never be hit again.
+    """
+    keys = ['tag:' + tag for tag in tags]
+    versions = self.backend.get_many(keys)
+    for i, version in enumerate(versions):
+      if version is None:
+        versions[i] = uuid.uuid4().hex
+        self.backend.set(keys[i], versions[i])
+    return versions
+
+  def invalidate(self, *tags):
+    if self.backend is None:
+      return
+    for tag in tags:
+      self.backend.set('tag:' + tag, uuid.uuid4().hex)
+
+  def invalidate_after_commit(self, *tags, session=None):
+    """Invalidate `tags` once `session` (the app's session by default)
+    commits; nothing happens if it rolls back."""
+    if session is None:
+      from extensions import db
+      session = db.session()
+    session.info.setdefault('cache_tags', []).append((self, tags))
+
+  def cached(self, *tags, ttl=None):
+    """Cache a GET view's response under `tags` for `ttl` seconds."""
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        # A pending flash message would be baked into the cached page.
+        if self.backend is None or request.method != 'GET' or session.get('_flashes'):
+          return view(*args, **kwargs)
+        key = 'view:%s:%s' % (request.full_path, ':'.join(self.tag_versions(tags)))
+        hit = self.backend.get_many([key])[0]
+        if hit is not None:
+          body, status, mimetype = hit
+          return Response(body, status=status, mimetype=mimetype)
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.is_streamed:
+          self.backend.set(key, (response.get_data(), response.status_code, response.mimetype),
+                           ttl or self.default_ttl)
+        return response
+      return wrapper
+    return decorator
+
+
+def _after_commit(session):
+  for cache, tags in session.info.pop('cache_tags', []):
+    cache.invalidate(*tags)
+
+
+def _after_rollback(session):
+  session.info.pop('cache_tags', None)
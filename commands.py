@@ -0,0 +1,187 @@
+#----------------------------------------------------------------------------#
+# Command line.
+#
+# `flask create-db`, `flask import`, `flask export`, `flask roll-counters`, `flask geocode`,
+# `flask purge`, `flask compile-templates`, `flask build-assets` and
+# `flask jobs`, added to the app by create_app() when it is built by the
+# flask command.
+#----------------------------------------------------------------------------#
+
+import json
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from extensions import db, cache, jobs
+from counters import roll_forward
+from models import Venue, Artist
+import geo
+import assets
+import bulk
+import deletion
+
+
+#  Schema
+#  ----------------------------------------------------------------
+
+@click.command('create-db')
+@with_appcontext
+def create_db():
+  """Create the schema in an empty database and stamp it as migrated.
+
+  The first migrations alter tables that older releases created on
+  import, so `flask db upgrade` cannot start from an empty database. Later
+  migrations apply to a database created here as usual.
+  """
+  from flask_migrate import stamp
+  db.create_all()
+  stamp()
+  click.echo('Created the schema at the latest migration.')
+
+#  Bulk import / export
+#  ----------------------------------------------------------------
+
+@click.command('import')
+@click.argument('kind', type=click.Choice(sorted(bulk.RESOURCES)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(bulk.FORMATS),
+              help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+@with_appcontext
+def import_command(kind, source, format):
+  """Import venues, artists or shows from a CSV/NDJSON file ('-' for stdin)."""
+  report = bulk.import_rows(kind, bulk.read_rows(source, format or bulk.format_of(getattr(source, 'name', ''))))
+  if report.inserted:
+    cache.invalidate(kind)
+  click.echo(json.dumps(report.as_dict(), indent=2))
+
+@click.command('export')
+@click.argument('kind', type=click.Choice(sorted(bulk.RESOURCES)))
+@click.argument('target', type=click.File('w', encoding='utf-8'))
+@click.option('--format', type=click.Choice(bulk.FORMATS),
+              help='Defaults to ndjson for .ndjson/.jsonl files, csv otherwise.')
+@with_appcontext
+def export_command(kind, target, format):
+  """Export venues, artists or shows to a CSV/NDJSON file ('-' for stdout)."""
+  bulk.write_rows(kind, bulk.export_rows(kind), target, format or bulk.format_of(getattr(target, 'name', '')))
+
+#  Maintenance
+#  ----------------------------------------------------------------
+
+@click.command('roll-counters')
+@with_appcontext
+def roll_counters():
+  """Recount upcoming shows for venues and artists whose next show has started.
+
+  Run this periodically (e.g. from cron) to keep the counters read by the
+  listings and search in step with the clock.
+  """
+  refreshed = roll_forward(db.session.connection())
+  db.session.commit()
+  if refreshed:
+    cache.invalidate('shows')
+  click.echo('Refreshed %d venue/artist counters.' % refreshed)
+
+@click.command('geocode')
+@click.option('--all', 'everything', is_flag=True,
+              help='Place every row again, e.g. after the gazetteer changed.')
+@with_appcontext
+def geocode_command(everything):
+  """Place venues and artists at their city's coordinates for radius search.
+
+  New and edited rows are placed as they are saved; run this after the
+  upgrade that added locations, or after adding cities to the gazetteer.
+  """
+  connection = db.session.connection()
+  placed = dict((model.__tablename__, geo.geocode(connection, model, everything))
+                for model in (Venue, Artist))
+  db.session.commit()
+  click.echo('Placed %(Venue)d venues and %(Artist)d artists.' % placed)
+
+@click.command('purge')
+@with_appcontext
+def purge_command():
+  """Remove the venues, artists and shows deleted over DELETE_RETENTION_DAYS ago.
+
+  Run this periodically (e.g. daily from cron). Rows go in batches of
+  DELETE_BATCH_SIZE, one transaction each.
+  """
+  purged = deletion.purge()
+  click.echo('Purged %(shows)d shows, %(venues)d venues and %(artists)d artists.' % purged)
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates():
+  """Compile every template into the bytecode cache.
+
+  Run it at deploy time so freshly started workers load compiled templates
+  instead of each compiling them on its first requests.
+  """
+  environment = current_app.jinja_env
+  names = environment.list_templates(filter_func=lambda name: name.endswith('.html'))
+  for name in names:
+    environment.get_template(name)
+  click.echo('Compiled %d templates.' % len(names))
+
+@click.command('build-assets')
+@click.option('--clean', is_flag=True, help='Delete the files of earlier builds.')
+@with_appcontext
+def build_assets(clean):
+  """Fingerprint, bundle and precompress the static files into static/dist.
+
+  Run it at deploy time, before the workers start; they read the manifest
+  it writes on startup. Keep earlier builds (no --clean) while pages
+  rendered by the previous release may still be open.
+  """
+  sizes, removed = assets.build(current_app.static_folder, current_app.config['ASSET_BUNDLES'], clean)
+  for name, size in sizes.items():
+    click.echo('%-10s %2d files  %8d -> %8d bytes, %8d gzipped' % (
+      name, size['sources'], size['source_bytes'], size['bytes'], size['gzip_bytes']))
+  if removed:
+    click.echo('Removed %d files of earlier builds.' % removed)
+
+#  Background jobs
+#  ----------------------------------------------------------------
+
+@click.group('jobs')
+def jobs_command():
+  """Run and inspect background jobs."""
+
+@jobs_command.command('work')
+@click.option('--burst', is_flag=True, help='Exit once no job is due instead of polling.')
+@click.option('--batch', default=10, help='Jobs claimed at a time.')
+@click.option('--interval', default=1.0, help='Seconds between polls of an empty queue.')
+@with_appcontext
+def work_command(burst, batch, interval):
+  """Run jobs from the Job table (JOBS_BACKEND = 'db')."""
+  if current_app.config['JOBS_BACKEND'] != 'db':
+    raise click.UsageError("Jobs only queue in the database when JOBS_BACKEND is 'db'.")
+  while True:
+    if not jobs.backend.work(batch, current_app.config['JOBS_VISIBILITY_TIMEOUT']):
+      if burst:
+        break
+      time.sleep(interval)
+
+@jobs_command.command('list')
+@with_appcontext
+def list_command():
+  """Show queued, running and failed jobs."""
+  for job in jobs.listing():
+    click.echo('%s  %-8s %-18s attempts=%d run_at=%s args=%s' % (
+      job['id'], job['status'], job['task'], job['attempts'],
+      job['run_at'].isoformat(), json.dumps(job['args'])))
+    if job['status'] == 'failed' and job['last_error']:
+      click.echo('    ' + job['last_error'].strip().splitlines()[-1])
+
+@jobs_command.command('retry')
+@with_appcontext
+def retry_command():
+  """Queue every failed job again (JOBS_BACKEND = 'db')."""
+  if current_app.config['JOBS_BACKEND'] != 'db':
+    raise click.UsageError("Failed jobs are only kept in the database when JOBS_BACKEND is 'db'.")
+  click.echo('Requeued %d failed jobs.' % jobs.backend.retry_failed())
+
+
+def init_app(app):
+  for command in (create_db, import_command, export_command, roll_counters, geocode_command, purge_command,
+                  compile_templates, build_assets, jobs_command):
+    app.cli.add_command(command)
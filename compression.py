@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Response compression.
+#
+# Text responses (pages, JSON) are compressed with brotli when the client
+# accepts it and the brotli package is installed, with gzip otherwise.
+# Streamed responses are compressed chunk by chunk, each chunk flushed as
+# it is produced, so the client still receives the page as it renders.
+# Files sent as they are (send_file: images, built assets with their own
+# precompressed variants) and bodies under COMPRESS_MIN_SIZE are left
+# alone. Compressed responses carry a weak ETag, as their bytes differ from
+# the representation the ETag was computed over.
+#----------------------------------------------------------------------------#
+
+import zlib
+from flask import current_app, request
+
+TYPES = ('text/html', 'text/plain', 'text/css', 'text/csv', 'application/json',
+         'application/javascript', 'application/x-ndjson', 'image/svg+xml')
+
+
+class _Gzip(object):
+
+  def __init__(self, level):
+    self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+  def compress(self, data, flush=False):
+    out = self._compressor.compress(data)
+    return out + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else out
+
+  def finish(self):
+    return self._compressor.flush()
+
+
+class _Brotli(object):
+
+  def __init__(self, quality):
+    import brotli
+    self._compressor = brotli.Compressor(quality=quality)
+
+  def compress(self, data, flush=False):
+    out = self._compressor.process(data)
+    return out + self._compressor.flush() if flush else out
+
+  def finish(self):
+    return self._compressor.finish()
+
+
+def _compressor(encoding):
+  config = current_app.config
+  if encoding == 'br':
+    return _Brotli(config['COMPRESS_BROTLI_QUALITY'])
+  return _Gzip(config['COMPRESS_LEVEL'])
+
+
+def _negotiate():
+  """The encoding to send, or None."""
+  accepted = request.accept_encodings
+  if accepted['br']:
+    try:
+      import brotli  # noqa: F401
+      return 'br'
+    except ImportError:
+      pass
+  if accepted['gzip']:
+    return 'gzip'
+  return None
+
+
+def _stream(chunks, compressor, charset):
+  try:
+    for chunk in chunks:
+      if not isinstance(chunk, bytes):
+        chunk = chunk.encode(charset)
+      out = compressor.compress(chunk, flush=True)
+      if out:
+        yield out
+    yield compressor.finish()
+  finally:
+    # Ends the request context held open by stream_with_context.
+    close = getattr(chunks, 'close', None)
+    if close is not None:
+      close()
+
+
+def compress(response):
+  if not current_app.config['COMPRESS'] or response.direct_passthrough \
+      or response.status_code < 200 or response.status_code in (204, 206, 304) \
+      or 'Content-Encoding' in response.headers or response.mimetype not in TYPES:
+    return response
+  response.vary.add('Accept-Encoding')
+  encoding = _negotiate()
+  if encoding is None:
+    return response
+  if response.is_streamed:
+    response.response = _stream(response.response, _compressor(encoding), response.charset)
+    response.headers.pop('Content-Length', None)
+  else:
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+      return response
+    compressor = _compressor(encoding)
+    response.set_data(compressor.compress(data) + compressor.finish())
+  response.headers['Content-Encoding'] = encoding
+  etag, weak = response.get_etag()
+  if etag and not weak:
+    response.set_etag(etag, weak=True)
+  return response
+
+
+def init_app(app):
+  app.config.setdefault('COMPRESS', True)
+  app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+  app.config.setdefault('COMPRESS_LEVEL', 6)
+  app.config.setdefault('COMPRESS_BROTLI_QUALITY', 5)
+  app.after_request(compress)
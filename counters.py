@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------------#
+# Upcoming show counters.
+#
+# Venue and Artist carry a denormalized upcoming_shows_count and
+# next_show_time so listings can read them instead of aggregating Show.
+# They are adjusted incrementally in the same transaction whenever a show
+# is inserted or deleted through the ORM, so the page a booking redirects
+# to already counts it. Once the transaction commits, a background job
+# (tasks.py) recounts the two rows from Show to reconcile them, off the
+# request. `flask roll-counters` rolls the counters forward as shows drift
+# from upcoming to past.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from extensions import db, jobs
+from models import Venue, Artist, Show
+
+OWNERS = ((Venue, Show.venue_id, 'venue_id'), (Artist, Show.artist_id, 'artist_id'))
+
+
+def _recompute(model, show_fk, now):
+  """UPDATE assignments recomputing a row's counters from its shows."""
+  upcoming = db.and_(show_fk == model.id, Show.time > now, Show.deleted_at.is_(None))
+  return {
+    model.upcoming_shows_count: db.select([db.func.count(Show.id)]).where(upcoming).as_scalar(),
+    model.next_show_time: db.select([db.func.min(Show.time)]).where(upcoming).as_scalar(),
+  }
+
+
+def refresh(connection, model, show_fk, ids=None, now=None):
+  """Recompute the counters of `ids` (every row when None) in one UPDATE."""
+  statement = model.__table__.update().values(_recompute(model, show_fk, now or datetime.now()))
+  if ids is not None:
+    statement = statement.where(model.id.in_(list(ids)))
+  return connection.execute(statement).rowcount
+
+
+def roll_forward(connection, now=None):
+  """Recount every venue/artist whose next show has started since it was
+  last counted. Returns the number of rows refreshed."""
+  now = now or datetime.now()
+  refreshed = 0
+  for model, show_fk, _ in OWNERS:
+    statement = model.__table__.update() \
+      .values(_recompute(model, show_fk, now)) \
+      .where(model.next_show_time <= now)
+    refreshed += connection.execute(statement).rowcount
+  return refreshed
+
+
+def _reconcile(show):
+  """Recount the counters of `show`'s venue and artist once its session
+  commits."""
+  jobs.after_commit('refresh_counters', [show.venue_id], [show.artist_id],
+                    session=object_session(show))
+
+
+@event.listens_for(Show, 'after_insert')
+def show_inserted(mapper, connection, show):
+  # Past shows never count.
+  if show.time <= datetime.now():
+    return
+  for model, _, attribute in OWNERS:
+    connection.execute(model.__table__.update()
+      .where(model.id == getattr(show, attribute))
+      .values({
+        model.upcoming_shows_count: model.upcoming_shows_count + 1,
+        model.next_show_time: db.case(
+          [(db.or_(model.next_show_time.is_(None), model.next_show_time > show.time), show.time)],
+          else_=model.next_show_time),
+      }))
+  _reconcile(show)
+
+
+@event.listens_for(Show, 'after_delete')
+def show_deleted(mapper, connection, show):
+  now = datetime.now()
+  if show.time <= now:
+    return
+  for model, show_fk, attribute in OWNERS:
+    # Only when the show was the next one does next_show_time need the
+    # (indexed) MIN over the remaining upcoming shows.
+    upcoming = db.and_(show_fk == model.id, Show.time > now, Show.deleted_at.is_(None))
+    connection.execute(model.__table__.update()
+      .where(model.id == getattr(show, attribute))
+      .values({
+        model.upcoming_shows_count: db.case(
+          [(model.upcoming_shows_count > 0, model.upcoming_shows_count - 1)], else_=0),
+        model.next_show_time: db.case(
+          [(model.next_show_time == show.time,
+            db.select([db.func.min(Show.time)]).where(upcoming).as_scalar())],
+          else_=model.next_show_time),
+      }))
+  _reconcile(show)
@@ -0,0 +1,115 @@
+#----------------------------------------------------------------------------#
+# Deleting venues and artists.
+#
+# Deleting a venue or artist only stamps its deleted_at, so the request
+# touches one row however many shows it has. Every live query filters on
+# deleted_at IS NULL (and the listing indexes only cover live rows), so it
+# disappears at once, along with its shows, which are joined to their
+# venue and artist wherever they are read.
+#
+# Two background steps follow, each in transactions of DELETE_BATCH_SIZE
+# rows so no statement holds many locks on Show:
+#
+#   cascade  once the delete commits, the owner's shows are stamped with
+#            the same deleted_at, and the upcoming show counters of the
+#            artists/venues on their other side are recounted.
+#   purge    `flask purge`, run periodically, hard-deletes rows deleted
+#            more than DELETE_RETENTION_DAYS ago: shows first, then the
+#            venues and artists left without shows, with their genres.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from flask import current_app
+from extensions import db, cache, jobs
+from models import Venue, Artist, Show, artist_genres, venue_genres
+import counters
+
+OWNERS = {
+  'venue': (Venue, Show.venue_id, Artist, Show.artist_id, venue_genres.c.venue_id),
+  'artist': (Artist, Show.artist_id, Venue, Show.venue_id, artist_genres.c.artist_id),
+}
+
+
+def delete(owner, owner_id):
+  """Soft-delete a venue/artist and queue the cascade to its shows once the
+  session commits. False when there is no such live venue/artist.
+
+  One UPDATE guarded by deleted_at IS NULL rather than an ORM flush, which
+  would check the row's version and fail on a concurrent edit; an edit
+  saved meanwhile is deleted along with the row, and an edit saved after
+  it gets a Conflict (editing.py)."""
+  model = OWNERS[owner][0]
+  deleted = db.session.connection().execute(
+    model.__table__.update().values(deleted_at=datetime.now(), version=model.version + 1)
+    .where(db.and_(model.id == owner_id, model.deleted_at.is_(None)))
+  ).rowcount
+  if not deleted:
+    return False
+  jobs.after_commit('cascade_delete', owner, owner_id)
+  cache.invalidate_after_commit(owner + 's', 'shows')
+  return True
+
+
+def _batch():
+  return current_app.config['DELETE_BATCH_SIZE']
+
+
+def cascade(owner, owner_id):
+  """Stamp the live shows of a deleted venue/artist as deleted, one batch
+  per transaction, recounting the counters of each batch's counterparts.
+  Returns the number of shows stamped."""
+  model, show_fk, counterpart, counterpart_fk, _ = OWNERS[owner]
+  deleted_at = db.session.query(model.deleted_at).filter(model.id == owner_id).scalar()
+  stamped = 0
+  while deleted_at is not None:
+    rows = db.session.query(Show.id, counterpart_fk) \
+      .filter(show_fk == owner_id, Show.deleted_at.is_(None)).limit(_batch()).all()
+    if not rows:
+      break
+    connection = db.session.connection()
+    connection.execute(Show.__table__.update().values(deleted_at=deleted_at)
+                       .where(Show.id.in_([id for id, _ in rows])))
+    counters.refresh(connection, counterpart, counterpart_fk, set(other for _, other in rows))
+    db.session.commit()
+    stamped += len(rows)
+  if stamped:
+    counters.refresh(db.session.connection(), model, show_fk, [owner_id])
+    db.session.commit()
+    cache.invalidate('venues', 'artists', 'shows')
+  return stamped
+
+
+def _purge_batches(select_ids, delete):
+  """Run `delete(ids)` over batches from `select_ids(limit)`, one
+  transaction each, until none are left. Returns the number of ids."""
+  purged = 0
+  while True:
+    ids = [id for id, in db.session.execute(select_ids(_batch()))]
+    if not ids:
+      return purged
+    delete(db.session.connection(), ids)
+    db.session.commit()
+    purged += len(ids)
+
+
+def purge(now=None):
+  """Hard-delete the shows, venues and artists deleted more than
+  DELETE_RETENTION_DAYS ago. Returns the counts purged per table."""
+  cutoff = (now or datetime.now()) - timedelta(days=current_app.config['DELETE_RETENTION_DAYS'])
+  purged = {'shows': _purge_batches(
+    lambda limit: db.select([Show.id]).where(Show.deleted_at < cutoff).limit(limit),
+    lambda connection, ids: connection.execute(Show.__table__.delete().where(Show.id.in_(ids))))}
+
+  for owner, (model, show_fk, _, _, genre_fk) in sorted(OWNERS.items()):
+    # Rows whose shows are not all purged yet wait for the next run.
+    orphaned = db.and_(model.deleted_at < cutoff,
+                       ~db.exists().where(show_fk == model.id))
+
+    def delete_rows(connection, ids, model=model, genre_fk=genre_fk):
+      connection.execute(genre_fk.table.delete().where(genre_fk.in_(ids)))
+      connection.execute(model.__table__.delete().where(model.id.in_(ids)))
+
+    purged[owner + 's'] = _purge_batches(
+      lambda limit, model=model, orphaned=orphaned: db.select([model.id]).where(orphaned).limit(limit),
+      delete_rows)
+  return purged
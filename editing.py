@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------------#
+# Editing venues and artists.
+#
+# An edit page carries the version of the row it was rendered from (the
+# version_id_col of Venue and Artist). Saving it is one statement, without
+# reading the row first:
+#
+#   UPDATE "Venue" SET <submitted columns>, version = version + 1
+#    WHERE id = :id AND version = :version AND deleted_at IS NULL
+#
+# When no row matches, someone else saved (or deleted) the row since the
+# page was rendered; the edit raises Conflict instead of overwriting their
+# changes. Columns absent from the request are left alone, and the edit
+# pages' script only submits the fields the user changed, so an edit writes
+# just those columns (and a name left as it was doesn't touch the search
+# index).
+#----------------------------------------------------------------------------#
+
+from extensions import db, cache
+from models import Venue, Artist, Genre, artist_genres, venue_genres
+from geo import location
+
+OWNERS = {
+  'venue': (Venue, venue_genres.c.venue_id, ('name', 'city', 'state', 'address', 'phone',
+                                             'facebook_link')),
+  'artist': (Artist, artist_genres.c.artist_id, ('name', 'city', 'state', 'phone',
+                                                 'facebook_link')),
+}
+
+
+class Conflict(Exception):
+  """The row is no longer at the version the edit was based on."""
+
+
+def changes(owner, form):
+  """The column values and genre names (None when absent) submitted in
+  `form` for a venue/artist. The edit pages send an empty `genres` next to
+  the select, so a form clearing every genre still carries the field."""
+  columns = OWNERS[owner][2]
+  values = dict((column, form[column]) for column in columns if column in form)
+  genres = [name for name in form.getlist('genres') if name] if 'genres' in form else None
+  return values, genres
+
+
+def update(owner, owner_id, version, values, genres=None):
+  """Save `values` (column -> value) and, unless None, the genre names
+  `genres` on venue/artist `owner_id` if it is still at `version`. Returns
+  the row's new version; raises Conflict when it has moved on or was
+  deleted. The caller commits."""
+  model, genre_fk, _ = OWNERS[owner]
+  if not values and genres is None:
+    # Nothing to write, but a save based on an old version still conflicts.
+    current = db.session.query(model.version) \
+      .filter(model.id == owner_id, model.deleted_at.is_(None)).scalar()
+    if current != version:
+      raise Conflict('%s %d is no longer at version %d.' % (owner, owner_id, version))
+    return version
+  values = dict(values)
+  if 'city' in values and 'state' in values:
+    values.update(location(values['city'], values['state']))
+  values['version'] = model.version + 1
+  connection = db.session.connection()
+  matched = connection.execute(
+    model.__table__.update().values(values)
+    .where(db.and_(model.id == owner_id, model.version == version, model.deleted_at.is_(None)))
+  ).rowcount
+  if matched != 1:
+    raise Conflict('%s %d is no longer at version %d.' % (owner, owner_id, version))
+  if ('city' in values) != ('state' in values):
+    # Placing the row needs the other half of its city, state.
+    city, state = connection.execute(
+      db.select([model.city, model.state]).where(model.id == owner_id)).first()
+    connection.execute(model.__table__.update().values(location(city, state))
+                       .where(model.id == owner_id))
+  if genres is not None:
+    named = Genre.named(genres)
+    db.session.add_all(named)
+    db.session.flush()
+    connection.execute(genre_fk.table.delete().where(genre_fk == owner_id))
+    if named:
+      connection.execute(genre_fk.table.insert(),
+                         [{genre_fk.name: owner_id, 'genre_id': genre.id} for genre in named])
+  cache.invalidate_after_commit(owner + 's')
+  return version + 1
@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# Extensions.
+#
+# Created unbound and attached to an app by app.create_app(), so models,
+# queries and blueprints can import them without building an app.
+#----------------------------------------------------------------------------#
+
+from cache import Cache
+from instrumentation import Instrumentation
+from jobs import Jobs
+from ratelimit import RateLimiter
+from routing import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
+cache = Cache()
+instrumentation = Instrumentation()
+jobs = Jobs()
+limiter = RateLimiter()
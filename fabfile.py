@@ -1,3 +1,5 @@
+import os
+
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
@@ -7,12 +9,24 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m pytest", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def bench(baseline="bench_baseline.json"):
+    command = "python -m benchmarks.routes --output bench.json"
+    if os.path.exists(baseline):
+        command += " --compare {}".format(baseline)
+    else:
+        print("No {} yet, so nothing to compare against.".format(baseline))
+    with settings(warn_only=True):
+        result = local(command)
+    if result.failed and not confirm("Benchmarks regressed. Continue?"):
+        abort("Aborted at user request.")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -22,8 +36,11 @@ def push():
     local("git push origin master")
 
 
-def prepare():
+# seeding and timing 50k shows takes minutes: `fab prepare:benchmark=yes`
+def prepare(benchmark="no"):
     test()
+    if benchmark == "yes":
+        bench()
     commit()
     push()
 
@@ -40,7 +57,7 @@ def heroku():
 
 def heroku_test():
     local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
+        "heroku run python -m pytest"
     )
 
 
@@ -0,0 +1,248 @@
+#----------------------------------------------------------------------------#
+# Locations and radius search.
+#
+# Venues and artists are placed at the latitude/longitude of their city as
+# found in a local gazetteer (GAZETTEER_PATH: a CSV of city, state,
+# latitude, longitude), so geocoding never calls out to a service. Rows are
+# placed as they are created or edited through the ORM or the importer,
+# and `flask geocode` places the rows that predate a gazetteer entry.
+#
+# /venues/near and /artists/near return the rows within a radius, nearest
+# first, without scanning the table: on Postgres a GiST index on
+# point(longitude, latitude) answers a bounding box query, elsewhere the
+# btree index on each row's geohash answers one range per geohash cell
+# around the origin. Only the candidates' coordinates are read to rank
+# them by great-circle distance; the page of nearest rows is then loaded.
+#----------------------------------------------------------------------------#
+
+import csv
+import heapq
+from functools import lru_cache
+from math import asin, cos, degrees, radians, sin, sqrt
+from flask import current_app, jsonify, request
+from sqlalchemy import event, inspect
+from extensions import db
+from models import Venue, Artist
+
+EARTH_RADIUS_MILES = 3958.8
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+
+OWNERS = {'venue': Venue, 'artist': Artist}
+
+
+#  Geocoding
+#  ----------------------------------------------------------------
+
+def _place(city, state):
+  return ' '.join((city or '').split()).lower(), (state or '').strip().upper()
+
+
+@lru_cache(maxsize=None)
+def _gazetteer(path):
+  with open(path, encoding='utf-8', newline='') as handle:
+    return dict((_place(row['city'], row['state']), (float(row['latitude']), float(row['longitude'])))
+                for row in csv.DictReader(handle))
+
+
+def locate(city, state):
+  """(latitude, longitude) of a city, or None when the gazetteer lacks it."""
+  return _gazetteer(current_app.config['GAZETTEER_PATH']).get(_place(city, state))
+
+
+def location(city, state):
+  """The latitude, longitude and geohash columns of a row in `city`;
+  all None when the city is unknown."""
+  found = locate(city, state)
+  if found is None:
+    return {'latitude': None, 'longitude': None, 'geohash': None}
+  return {'latitude': found[0], 'longitude': found[1], 'geohash': encode(*found)}
+
+
+def geocode(connection, model, everything=False):
+  """Place the rows of `model` without a location (every row when
+  `everything`), with one UPDATE per distinct city. Returns the number of
+  rows placed."""
+  places = db.select([model.city, model.state]).distinct()
+  if not everything:
+    places = places.where(model.latitude.is_(None))
+  placed = 0
+  for city, state in connection.execute(places).fetchall():
+    values = location(city, state)
+    if values['latitude'] is None:
+      continue
+    statement = model.__table__.update().values(values) \
+      .where(db.and_(model.city == city, model.state == state))
+    if not everything:
+      statement = statement.where(model.latitude.is_(None))
+    placed += connection.execute(statement).rowcount
+  return placed
+
+
+def _placed(mapper, connection, target):
+  state = inspect(target)
+  if state.persistent and not (state.attrs.city.history.has_changes()
+                               or state.attrs.state.history.has_changes()):
+    return
+  for column, value in location(target.city, target.state).items():
+    setattr(target, column, value)
+
+
+for _model in OWNERS.values():
+  event.listen(_model, 'before_insert', _placed)
+  event.listen(_model, 'before_update', _placed)
+
+
+#  Geohashes and distances
+#  ----------------------------------------------------------------
+
+def encode(latitude, longitude, precision=PRECISION):
+  """The geohash of a point."""
+  bounds = {True: [-180.0, 180.0], False: [-90.0, 90.0]}
+  chars, value, bits, even = [], 0, 0, True
+  while len(chars) < precision:
+    low_high, coordinate = bounds[even], longitude if even else latitude
+    middle = (low_high[0] + low_high[1]) / 2
+    value <<= 1
+    if coordinate >= middle:
+      value |= 1
+      low_high[0] = middle
+    else:
+      low_high[1] = middle
+    even = not even
+    bits += 1
+    if bits == 5:
+      chars.append(BASE32[value])
+      value, bits = 0, 0
+  return ''.join(chars)
+
+
+def _cell(precision):
+  """(height, width) in degrees of the geohash cells of `precision`."""
+  return 180.0 / 2 ** (5 * precision // 2), 360.0 / 2 ** ((5 * precision + 1) // 2)
+
+
+def distance(latitude1, longitude1, latitude2, longitude2):
+  """Great-circle distance between two points in miles."""
+  a = sin(radians(latitude2 - latitude1) / 2) ** 2 + cos(radians(latitude1)) \
+    * cos(radians(latitude2)) * sin(radians(longitude2 - longitude1) / 2) ** 2
+  return 2 * EARTH_RADIUS_MILES * asin(min(1.0, sqrt(a)))
+
+
+def _reach(latitude, miles):
+  """(degrees of latitude, degrees of longitude) within `miles` of a point
+  at `latitude`; the longitude reach is None when the circle contains a
+  pole."""
+  angle = miles / EARTH_RADIUS_MILES
+  if abs(latitude) + degrees(angle) >= 90 or sin(angle) >= cos(radians(latitude)):
+    return degrees(angle), None
+  return degrees(angle), degrees(asin(sin(angle) / cos(radians(latitude))))
+
+
+def _wrap(longitude):
+  return (longitude + 180.0) % 360.0 - 180.0
+
+
+def _bounds(model, latitude, longitude, miles):
+  """A filter on `model` keeping the rows within the circle's bounding
+  box, through the dialect's spatial index."""
+  dlat, dlon = _reach(latitude, miles)
+  south, north = max(latitude - dlat, -90.0), min(latitude + dlat, 90.0)
+  if db.session.get_bind(mapper=db.inspect(model)).dialect.name == 'postgresql':
+    point = db.func.point(model.longitude, model.latitude)
+    if dlon is None:
+      boxes = [(-180.0, 180.0)]
+    elif longitude - dlon < -180 or longitude + dlon > 180:
+      boxes = [(_wrap(longitude - dlon), 180.0), (-180.0, _wrap(longitude + dlon))]
+    else:
+      boxes = [(longitude - dlon, longitude + dlon)]
+    return db.or_(*[point.op('<@')(db.func.box(db.func.point(west, south), db.func.point(east, north)))
+                    for west, east in boxes])
+
+  # The 3x3 block of the coarsest cells at least as large as the reach
+  # around the origin's cell covers the circle.
+  precision = 0
+  while precision < PRECISION:
+    height, width = _cell(precision + 1)
+    if height < dlat or dlon is None or width < dlon:
+      break
+    precision += 1
+  if precision == 0:
+    return model.geohash.isnot(None)
+  height, width = _cell(precision)
+  cells = set(encode(min(max(latitude + i * height, -90.0), 90.0), _wrap(longitude + j * width), precision)
+              for i in (-1, 0, 1) for j in (-1, 0, 1))
+  return db.or_(*[db.and_(model.geohash >= cell, model.geohash < cell + '~') for cell in sorted(cells)])
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+def near(owner, latitude, longitude, miles, limit, exclude=None):
+  """The `limit` venues/artists nearest to a point within `miles`, nearest
+  first, as dicts with their distance in miles. Two statements."""
+  model = OWNERS[owner]
+  candidates = db.session.query(model.id, model.latitude, model.longitude) \
+    .filter(_bounds(model, latitude, longitude, miles), model.deleted_at.is_(None))
+  if exclude is not None:
+    candidates = candidates.filter(model.id != exclude)
+  distances = ((distance(latitude, longitude, row.latitude, row.longitude), row.id)
+               for row in candidates)
+  ranked = heapq.nsmallest(limit, (pair for pair in distances if pair[0] <= miles))
+  if not ranked:
+    return []
+  columns = [model.id, model.name, model.city, model.state, model.image_link,
+             model.upcoming_shows_count.label('num_upcoming_shows')]
+  if model is Venue:
+    columns.append(model.address)
+  rows = dict((row.id, row) for row in db.session.query(*columns)
+              .filter(model.id.in_([id for _, id in ranked])))
+  return [dict(rows[id]._asdict(), distance=round(miles_away, 1))
+          for miles_away, id in ranked if id in rows]
+
+
+def _origin():
+  """The point a /near request searches around: ?lat=&lng=, ?city=&state=,
+  or the location of ?venue_id= or ?artist_id=."""
+  args = request.args
+  if 'lat' in args or 'lng' in args:
+    latitude, longitude = args.get('lat', type=float), args.get('lng', type=float)
+    if latitude is None or longitude is None or not -90 <= latitude <= 90 \
+        or not -180 <= longitude <= 180:
+      raise ValueError('lat and lng must be a latitude and a longitude.')
+    return (latitude, longitude), None
+  if 'city' in args:
+    found = locate(args['city'], args.get('state'))
+    if found is None:
+      raise LookupError('%s, %s is not in the gazetteer.' % (args['city'], args.get('state', '')))
+    return found, None
+  for owner, model in OWNERS.items():
+    id = args.get(owner + '_id', type=int)
+    if id is not None:
+      row = db.session.query(model.latitude, model.longitude) \
+        .filter(model.id == id, model.deleted_at.is_(None)).first()
+      if row is None or row.latitude is None:
+        raise LookupError('No located %s with id %d.' % (owner, id))
+      return (row.latitude, row.longitude), (owner, id)
+  raise ValueError('Pass lat and lng, city and state, venue_id or artist_id.')
+
+
+def near_view(owner):
+  """JSON for /venues/near and /artists/near: the origin (see _origin),
+  ?miles= (NEAR_DEFAULT_MILES by default) and ?limit=."""
+  from queries import _search_limit
+  try:
+    (latitude, longitude), source = _origin()
+  except ValueError as error:
+    return jsonify(error=str(error)), 400
+  except LookupError as error:
+    return jsonify(error=str(error)), 404
+  miles = request.args.get('miles', current_app.config['NEAR_DEFAULT_MILES'], type=float)
+  if not 0 < miles <= current_app.config['NEAR_MAX_MILES']:
+    return jsonify(error='miles must be above 0 and at most %d.'
+                   % current_app.config['NEAR_MAX_MILES']), 400
+  exclude = source[1] if source is not None and source[0] == owner else None
+  data = near(owner, latitude, longitude, miles,
+              _search_limit(request.args.get('limit', type=int)), exclude)
+  return jsonify(origin={"latitude": latitude, "longitude": longitude}, miles=miles,
+                 count=len(data), data=data)
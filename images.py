@@ -0,0 +1,315 @@
+#----------------------------------------------------------------------------#
+# Image proxy.
+#
+# Venue and artist image_link URLs are rendered through the `thumbnail`
+# filter, which points them at /images/<size>.<format>?src=...&sig=... The
+# proxy fetches each source once, resizes it to one of IMAGE_SIZES as WebP
+# or JPEG and serves the result with a year-long immutable Cache-Control.
+#
+# Originals and thumbnails live in a disk cache under IMAGE_CACHE_DIR:
+# originals are stored under the hash of their content, so URLs pointing at
+# the same image share thumbnails, and files are evicted least recently
+# used once the cache outgrows IMAGE_CACHE_MAX_BYTES. URLs are signed with
+# SECRET_KEY so the proxy cannot be pointed at arbitrary hosts.
+#
+# Resizing needs Pillow (in requirements.txt). Without it the filter leaves
+# image links as they are; when a source can't be fetched or decoded, the
+# proxy redirects to the original.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import hmac
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import urllib.parse
+import urllib.request
+from functools import lru_cache
+from flask import Blueprint, abort, current_app, redirect, request, send_file, url_for
+
+images = Blueprint('images', __name__)
+
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+
+
+def _hash(data):
+  return hashlib.sha256(data).hexdigest()
+
+
+def signature(src):
+  key = current_app.config['SECRET_KEY']
+  if not isinstance(key, bytes):
+    key = key.encode()
+  return hmac.new(key, src.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+@lru_cache(maxsize=None)
+def have_pillow():
+  try:
+    import PIL  # noqa: F401
+  except ImportError:
+    return False
+  return True
+
+
+def thumbnail_url(src, size='md', format='jpeg'):
+  """URL of the `size` thumbnail of image `src`, or `src` itself when it is
+  empty, not http(s), or the proxy is off or can't resize."""
+  if not src or not current_app.config['IMAGE_PROXY'] or not have_pillow() \
+      or not src.startswith(('http://', 'https://')):
+    return src
+  return url_for('images.thumbnail', size=size, format=format, src=src, sig=signature(src))
+
+
+class DiskCache(object):
+  """Files under `directory`, evicted least recently used (by mtime) once
+  they add up to more than `max_bytes`."""
+
+  def __init__(self, directory, max_bytes):
+    self.directory = directory
+    self.max_bytes = max_bytes
+    self._written = 0
+    self._lock = threading.Lock()
+
+  def path(self, key):
+    return os.path.join(self.directory, _hash(key.encode())[:2], key)
+
+  def get(self, key):
+    """Path of `key`, marked as just used, or None."""
+    path = self.path(key)
+    try:
+      os.utime(path)
+    except OSError:
+      return None
+    return path
+
+  def read(self, key):
+    path = self.get(key)
+    if path is None:
+      return None
+    try:
+      with open(path, 'rb') as handle:
+        return handle.read()
+    except OSError:
+      return None
+
+  def put(self, key, data):
+    path = self.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(handle, 'wb') as out:
+      out.write(data)
+    os.replace(temporary, path)
+    with self._lock:
+      self._written += len(data)
+      sweep = self._written > self.max_bytes // 10
+      if sweep:
+        self._written = 0
+    if sweep:
+      self.evict()
+    return path
+
+  def evict(self):
+    """Delete the least recently used files until the cache is back under
+    nine tenths of `max_bytes`."""
+    files = []
+    for root, _, names in os.walk(self.directory):
+      for name in names:
+        try:
+          stat = os.stat(os.path.join(root, name))
+        except OSError:
+          continue
+        files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+    total = sum(size for _, size, _ in files)
+    if total <= self.max_bytes:
+      return
+    for _, size, path in sorted(files):
+      if total <= self.max_bytes * 0.9:
+        break
+      try:
+        os.remove(path)
+        total -= size
+      except OSError:
+        pass
+
+
+class SourceError(Exception):
+  pass
+
+
+def _check_url(url):
+  parts = urllib.parse.urlsplit(url)
+  if parts.scheme not in ('http', 'https') or not parts.hostname:
+    raise SourceError('%s is not an http(s) URL' % url)
+
+
+def _connect(host, port, timeout):
+  """A socket connected to `host`, refusing hosts that resolve to a
+  private, loopback or link-local address unless IMAGE_ALLOW_PRIVATE_HOSTS
+  is set: image links are user input and must not reach internal services.
+  The socket connects to the addresses that were checked, so a host can't
+  resolve to a public address for the check and a private one for the
+  connection."""
+  try:
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+  except (OSError, UnicodeError) as error:
+    raise SourceError('%s: %s' % (host, error))
+  if not current_app.config['IMAGE_ALLOW_PRIVATE_HOSTS']:
+    for address in addresses:
+      if not ipaddress.ip_address(address[4][0].split('%')[0]).is_global:
+        raise SourceError('%s resolves to a non-public address' % host)
+  error = None
+  for family, type, proto, _, address in addresses:
+    sock = socket.socket(family, type, proto)
+    try:
+      if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+        sock.settimeout(timeout)
+      sock.connect(address)
+      return sock
+    except OSError as failed:
+      sock.close()
+      error = failed
+  raise error
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+
+  def connect(self):
+    self.sock = _connect(self.host, self.port, self.timeout)
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+
+  def connect(self):
+    # The certificate is still checked against the host name.
+    self.sock = self._context.wrap_socket(_connect(self.host, self.port, self.timeout),
+                                          server_hostname=self.host)
+
+
+class _HTTPHandler(urllib.request.HTTPHandler):
+
+  def http_open(self, req):
+    return self.do_open(_HTTPConnection, req)
+
+
+class _HTTPSHandler(urllib.request.HTTPSHandler):
+
+  def https_open(self, req):
+    return self.do_open(_HTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirects(urllib.request.HTTPRedirectHandler):
+
+  def redirect_request(self, req, fp, code, msg, headers, newurl):
+    _check_url(newurl)
+    return urllib.request.HTTPRedirectHandler.redirect_request(
+      self, req, fp, code, msg, headers, newurl)
+
+
+def _fetch(src, limit, timeout):
+  _check_url(src)
+  # No proxies from the environment: the proxy would make the connection.
+  opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _HTTPHandler,
+                                       _HTTPSHandler, _CheckedRedirects)
+  outbound = urllib.request.Request(src, headers={'User-Agent': 'fyyur-image-proxy'})
+  try:
+    with opener.open(outbound, timeout=timeout) as response:
+      data = response.read(limit + 1)
+  except (OSError, ValueError) as error:
+    raise SourceError('%s: %s' % (src, error))
+  if len(data) > limit:
+    raise SourceError('%s is larger than %d bytes' % (src, limit))
+  return data
+
+
+def _resize(data, box, format):
+  from PIL import Image, ImageOps
+  try:
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image.thumbnail((box, box), Image.LANCZOS)
+    if format == 'jpeg' and image.mode != 'RGB':
+      image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+      image = image.convert('RGBA')
+    out = io.BytesIO()
+    image.save(out, FORMATS[format][0], quality=current_app.config['IMAGE_QUALITY'],
+               optimize=True)
+  except (OSError, ValueError, Image.DecompressionBombError) as error:
+    raise SourceError('could not resize: %s' % error)
+  return out.getvalue()
+
+
+class Proxy(object):
+
+  def __init__(self, cache, stripes=64):
+    self.cache = cache
+    self._locks = [threading.Lock() for _ in range(stripes)]
+
+  def _lock(self, key):
+    return self._locks[int(key[-8:], 16) % len(self._locks)]
+
+  def render(self, src, size, format):
+    """Path of the cached thumbnail and its content hash, made on a miss.
+    Concurrent misses for one source fetch it once."""
+    source_key = 'url-' + _hash(src.encode())
+    digest = self.cache.read(source_key)
+    if digest is not None:
+      digest = digest.decode()
+      path = self.cache.get('%s-%s.%s' % (digest, size, format))
+      if path is not None:
+        return path, digest
+
+    with self._lock(source_key):
+      config = current_app.config
+      digest = self.cache.read(source_key)
+      original = digest and self.cache.read('orig-' + digest.decode())
+      if original is None:
+        original = _fetch(src, config['IMAGE_MAX_SOURCE_BYTES'], config['IMAGE_FETCH_TIMEOUT'])
+        digest = _hash(original).encode()
+        self.cache.put('orig-' + digest.decode(), original)
+        self.cache.put(source_key, digest)
+      digest = digest.decode()
+      thumb = _resize(original, config['IMAGE_SIZES'][size], format)
+      return self.cache.put('%s-%s.%s' % (digest, size, format), thumb), digest
+
+
+@images.route('/images/<size>.<any(webp, jpeg):format>')
+def thumbnail(size, format):
+  src = request.args.get('src', '')
+  if size not in current_app.config['IMAGE_SIZES']:
+    abort(404)
+  if not hmac.compare_digest(request.args.get('sig', ''), signature(src)):
+    abort(403)
+  if not have_pillow():
+    return redirect(src)
+  try:
+    path, digest = current_app.extensions['images'].render(src, size, format)
+  except SourceError as error:
+    current_app.logger.warning('Image proxy: %s', error)
+    return redirect(src)
+
+  response = send_file(path, mimetype=FORMATS[format][1], add_etags=False)
+  response.set_etag('%s-%s.%s' % (digest, size, format))
+  response.headers['Cache-Control'] = 'public, max-age=%d, immutable' \
+    % current_app.config['IMAGE_MAX_AGE']
+  return response.make_conditional(request)
+
+
+def init_app(app):
+  app.config.setdefault('IMAGE_PROXY', True)
+  app.config.setdefault('IMAGE_SIZES', {'sm': 160, 'md': 400, 'lg': 1000})
+  app.config.setdefault('IMAGE_QUALITY', 80)
+  app.config.setdefault('IMAGE_CACHE_DIR', None)
+  app.config.setdefault('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+  app.config.setdefault('IMAGE_MAX_SOURCE_BYTES', 10 * 1024 * 1024)
+  app.config.setdefault('IMAGE_FETCH_TIMEOUT', 10)
+  app.config.setdefault('IMAGE_ALLOW_PRIVATE_HOSTS', False)
+  app.config.setdefault('IMAGE_MAX_AGE', 365 * 24 * 3600)
+  directory = app.config['IMAGE_CACHE_DIR'] or os.path.join(tempfile.gettempdir(), 'fyyur-images')
+  app.extensions['images'] = Proxy(DiskCache(directory, app.config['IMAGE_CACHE_MAX_BYTES']))
+  app.add_template_filter(thumbnail_url, 'thumbnail')
+  app.register_blueprint(images)
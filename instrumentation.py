@@ -0,0 +1,165 @@
+#----------------------------------------------------------------------------#
+# Query instrumentation.
+#
+# Counts the SQL statements and database time of every request from
+# SQLAlchemy engine events, reports them in a Server-Timing header and as
+# Prometheus counters on /_metrics (when METRICS_PAGE is set: it is
+# unauthenticated, so only behind access control), and flags statements
+# repeated within a request (the signature of an N+1). With
+# QUERY_BUDGET_STRICT set, a request issuing more statements than its budget
+# fails instead of only being counted.
+#----------------------------------------------------------------------------#
+
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import Response, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+PARAM = r'(?:\?|%\(\w+\)s|:\w+|\$\d+)'
+PARAM_LIST = re.compile(r'%s(?:\s*,\s*%s)+' % (PARAM, PARAM))
+PARAM_ONE = re.compile(PARAM)
+NUMBER = re.compile(r'\b\d+\b')
+
+
+class QueryBudgetExceeded(Exception):
+  pass
+
+
+def fingerprint(statement):
+  """Normalize a statement so repeats with different parameters collide."""
+  statement = PARAM_LIST.sub('?, ...', statement)
+  statement = PARAM_ONE.sub('?', statement)
+  statement = NUMBER.sub('N', statement)
+  return ' '.join(statement.split())
+
+
+class RequestStats(object):
+
+  def __init__(self):
+    self.started = time.perf_counter()
+    self.queries = 0
+    self.db_time = 0.0
+    self.fingerprints = Counter()
+    # queries.gather() may report statements from several threads at once.
+    self._lock = threading.Lock()
+
+  def record(self, statement, elapsed):
+    with self._lock:
+      self.queries += 1
+      self.db_time += elapsed
+      self.fingerprints[fingerprint(statement)] += 1
+
+  def repeated(self, threshold):
+    return dict((statement, count) for statement, count in self.fingerprints.items()
+                if count >= threshold)
+
+
+class Instrumentation(object):
+
+  METRICS = (
+    ('fyyur_http_requests_total', 'counter', 'Requests served.'),
+    ('fyyur_http_request_seconds_total', 'counter', 'Wall time spent serving requests.'),
+    ('fyyur_db_queries_total', 'counter', 'SQL statements executed.'),
+    ('fyyur_db_seconds_total', 'counter', 'Time spent executing SQL statements.'),
+    ('fyyur_db_repeated_statements_total', 'counter',
+     'Statements repeated at least REPEATED_QUERY_THRESHOLD times in one request.'),
+    ('fyyur_query_budget_exceeded_total', 'counter', 'Requests that went over their query budget.'),
+  )
+
+  def __init__(self, app=None):
+    self._lock = threading.Lock()
+    self._totals = defaultdict(lambda: defaultdict(float))
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('QUERY_BUDGET', None)
+    app.config.setdefault('QUERY_BUDGET_STRICT', False)
+    app.config.setdefault('REPEATED_QUERY_THRESHOLD', 5)
+    app.config.setdefault('METRICS_PAGE', False)
+    self.app = app
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+      event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+      event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+      event.listen(Engine, 'handle_error', _handle_error)
+    app.before_request(self._start)
+    app.after_request(self._finish)
+    if app.config['METRICS_PAGE']:
+      app.add_url_rule('/_metrics', 'metrics', self.metrics)
+    app.extensions['instrumentation'] = self
+
+  def budget_for(self, endpoint):
+    budget = self.app.config['QUERY_BUDGET']
+    if isinstance(budget, dict):
+      return budget.get(endpoint, budget.get('default'))
+    return budget
+
+  def _start(self):
+    g._query_stats = RequestStats()
+
+  def _finish(self, response):
+    stats = g.pop('_query_stats', None)
+    if stats is None:
+      return response
+    endpoint = request.endpoint or 'none'
+    elapsed = time.perf_counter() - stats.started
+    repeated = stats.repeated(self.app.config['REPEATED_QUERY_THRESHOLD'])
+    budget = self.budget_for(endpoint)
+    over_budget = budget is not None and stats.queries > budget
+
+    with self._lock:
+      totals = self._totals[endpoint]
+      totals['fyyur_http_requests_total'] += 1
+      totals['fyyur_http_request_seconds_total'] += elapsed
+      totals['fyyur_db_queries_total'] += stats.queries
+      totals['fyyur_db_seconds_total'] += stats.db_time
+      totals['fyyur_db_repeated_statements_total'] += len(repeated)
+      totals['fyyur_query_budget_exceeded_total'] += over_budget
+
+    response.headers.add('Server-Timing', 'db;dur=%.2f;desc="%d queries"'
+                         % (stats.db_time * 1000, stats.queries))
+    response.headers.add('Server-Timing', 'total;dur=%.2f' % (elapsed * 1000))
+    for statement, count in repeated.items():
+      self.app.logger.warning('Statement ran %d times in %s: %s', count, endpoint, statement)
+    if over_budget:
+      message = '%s issued %d queries, budget is %d' % (endpoint, stats.queries, budget)
+      if self.app.config['QUERY_BUDGET_STRICT']:
+        raise QueryBudgetExceeded(message)
+      self.app.logger.warning(message)
+    return response
+
+  def metrics(self):
+    """Per-process totals in the Prometheus text exposition format."""
+    lines = []
+    with self._lock:
+      for name, kind, help in self.METRICS:
+        lines.append('# HELP %s %s' % (name, help))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for endpoint in sorted(self._totals):
+          lines.append('%s{endpoint="%s"} %s' % (name, endpoint, repr(self._totals[endpoint][name])))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  started = conn.info['query_started'].pop()
+  if not has_app_context():
+    return
+  stats = g.get('_query_stats')
+  if stats is not None:
+    stats.record(statement, time.perf_counter() - started)
+
+
+def _handle_error(context):
+  # A failed statement never reaches after_cursor_execute; drop its start
+  # time so the connection's next statement doesn't pop it.
+  if context.execution_context is not None:
+    started = context.connection.info.get('query_started')
+    if started:
+      started.pop()
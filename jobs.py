@@ -0,0 +1,248 @@
+#----------------------------------------------------------------------------#
+# Background jobs.
+#
+# Work that can run after a request has answered (counter refreshes, delete
+# cascades) is queued by task name with JSON-serializable arguments.
+# JOBS_BACKEND picks where it runs:
+#
+#   'thread'  a pool of JOBS_WORKERS threads in each app process; nothing
+#             to deploy, but jobs queued in a process die with it.
+#   'db'      rows of the Job table (models.Job), run by `flask jobs work`;
+#             jobs survive restarts and any number of workers can share
+#             the table.
+#
+# Jobs that change what cached pages show invalidate the response cache
+# from wherever they run, so under 'db' the cache must be shared by the web
+# processes and the workers: CACHE_TYPE 'redis' (or 'null'), not 'lru'.
+#
+# A failing job is retried up to JOBS_MAX_ATTEMPTS times, waiting
+# JOBS_RETRY_DELAY seconds, doubled after every attempt. Queued, running
+# and failed jobs are listed by `flask jobs list`, and on /_jobs when
+# JOBS_STATUS_PAGE is set (it is unauthenticated, so only behind access
+# control).
+#----------------------------------------------------------------------------#
+
+import json
+import threading
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import jsonify
+import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class ThreadBackend(object):
+  """Runs jobs on an in-process thread pool, started on first use so forked
+  workers each get their own."""
+
+  def __init__(self, jobs, workers):
+    self.jobs = jobs
+    self.workers = workers
+    self._pool = None
+    self._lock = threading.Lock()
+    self._queued = {}
+    self._failed = deque(maxlen=100)
+
+  def enqueue(self, task, args, delay=0, attempts=0):
+    job = {"id": uuid.uuid4().hex, "task": task, "args": args, "status": "pending",
+           "attempts": attempts, "run_at": datetime.now() + timedelta(seconds=delay),
+           "last_error": None}
+    with self._lock:
+      if self._pool is None:
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='fyyur-jobs')
+      self._queued[job['id']] = job
+    if delay:
+      timer = threading.Timer(delay, self._pool.submit, (self._run, job))
+      timer.daemon = True
+      timer.start()
+    else:
+      self._pool.submit(self._run, job)
+    return job['id']
+
+  def _run(self, job):
+    job['status'] = 'running'
+    job['attempts'] += 1
+    error = self.jobs.run(job['task'], job['args'])
+    with self._lock:
+      del self._queued[job['id']]
+      if error is not None:
+        job['last_error'] = error
+        if job['attempts'] >= self.jobs.max_attempts:
+          job['status'] = 'failed'
+          self._failed.append(job)
+    if error is not None and job['status'] != 'failed':
+      self.enqueue(job['task'], job['args'], self.jobs.retry_delay(job['attempts']), job['attempts'])
+
+  def listing(self):
+    with self._lock:
+      return [dict(job) for job in list(self._queued.values()) + list(self._failed)]
+
+
+class DatabaseBackend(object):
+  """Keeps jobs in the Job table; `flask jobs work` claims and runs them."""
+
+  def __init__(self, jobs, db):
+    from models import Job
+    self.jobs = jobs
+    self.db = db
+    self.table = Job.__table__
+
+  def engine(self):
+    return self.db.get_engine(self.jobs.app)
+
+  def enqueue(self, task, args, delay=0):
+    now = datetime.now()
+    with self.engine().begin() as connection:
+      result = connection.execute(self.table.insert().values(
+        task=task, args=json.dumps(args), status='pending', attempts=0,
+        run_at=now + timedelta(seconds=delay), created_at=now))
+    return result.inserted_primary_key[0]
+
+  def claim(self, limit, visibility_timeout):
+    """Mark up to `limit` due jobs running and return them. Jobs left
+    running for longer than `visibility_timeout` seconds, by a worker that
+    died, are due again."""
+    now = datetime.now()
+    due = sa.or_(
+      sa.and_(self.table.c.status == 'pending', self.table.c.run_at <= now),
+      sa.and_(self.table.c.status == 'running',
+              self.table.c.claimed_at <= now - timedelta(seconds=visibility_timeout)))
+    claimed = []
+    with self.engine().begin() as connection:
+      rows = connection.execute(sa.select([self.table]).where(due)
+                                .order_by(self.table.c.run_at).limit(limit)).fetchall()
+      for row in rows:
+        # Another worker may have claimed the row since it was read.
+        taken = connection.execute(self.table.update()
+          .where(sa.and_(self.table.c.id == row.id, self.table.c.attempts == row.attempts))
+          .values(status='running', attempts=row.attempts + 1, claimed_at=now)).rowcount
+        if taken:
+          claimed.append(dict(row, attempts=row.attempts + 1))
+    return claimed
+
+  def finish(self, job, error):
+    with self.engine().begin() as connection:
+      if error is None:
+        connection.execute(self.table.delete().where(self.table.c.id == job['id']))
+      elif job['attempts'] >= self.jobs.max_attempts:
+        connection.execute(self.table.update().where(self.table.c.id == job['id'])
+                           .values(status='failed', last_error=error))
+      else:
+        connection.execute(self.table.update().where(self.table.c.id == job['id'])
+                           .values(status='pending', last_error=error,
+                                   run_at=datetime.now() + timedelta(
+                                     seconds=self.jobs.retry_delay(job['attempts']))))
+
+  def work(self, limit, visibility_timeout):
+    """Run one batch of due jobs; returns how many were run."""
+    batch = self.claim(limit, visibility_timeout)
+    for job in batch:
+      self.finish(job, self.jobs.run(job['task'], json.loads(job['args'])))
+    return len(batch)
+
+  def retry_failed(self):
+    with self.engine().begin() as connection:
+      return connection.execute(self.table.update().where(self.table.c.status == 'failed')
+                                .values(status='pending', attempts=0,
+                                        run_at=datetime.now())).rowcount
+
+  def listing(self):
+    with self.engine().connect() as connection:
+      rows = connection.execute(sa.select([self.table]).order_by(self.table.c.run_at)).fetchall()
+    return [dict(row, args=json.loads(row.args)) for row in rows]
+
+
+class Jobs(object):
+
+  def __init__(self, app=None):
+    self.app = None
+    self.backend = None
+    self.tasks = {}
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('JOBS_BACKEND', 'thread')
+    app.config.setdefault('JOBS_WORKERS', 2)
+    app.config.setdefault('JOBS_MAX_ATTEMPTS', 3)
+    app.config.setdefault('JOBS_RETRY_DELAY', 1)
+    app.config.setdefault('JOBS_VISIBILITY_TIMEOUT', 300)
+    app.config.setdefault('JOBS_STATUS_PAGE', False)
+    self.app = app
+    if app.config['JOBS_BACKEND'] == 'db':
+      if app.config.get('CACHE_TYPE') == 'lru':
+        raise ValueError("JOBS_BACKEND 'db' runs jobs in other processes, whose cache "
+                         "invalidations an 'lru' cache would not see; set CACHE_TYPE to "
+                         "'redis' (or 'null').")
+      self.backend = DatabaseBackend(self, app.extensions['sqlalchemy'].db)
+    else:
+      self.backend = ThreadBackend(self, app.config['JOBS_WORKERS'])
+    if not event.contains(Session, 'after_commit', _after_commit):
+      event.listen(Session, 'after_commit', _after_commit)
+      event.listen(Session, 'after_rollback', _after_rollback)
+    if app.config['JOBS_STATUS_PAGE']:
+      app.add_url_rule('/_jobs', 'jobs', self.status)
+    app.extensions['jobs'] = self
+
+  @property
+  def max_attempts(self):
+    return self.app.config['JOBS_MAX_ATTEMPTS']
+
+  def retry_delay(self, attempts):
+    return self.app.config['JOBS_RETRY_DELAY'] * 2 ** (attempts - 1)
+
+  def task(self, function):
+    """Register `function` as a task under its name."""
+    self.tasks[function.__name__] = function
+    return function
+
+  def enqueue(self, task, *args):
+    """Queue `task` (a registered name) to run with `args` now."""
+    if task not in self.tasks:
+      raise KeyError('Unknown task %r' % task)
+    return self.backend.enqueue(task, list(args))
+
+  def after_commit(self, task, *args, session=None):
+    """Queue `task` once `session` (the app's session by default) commits;
+    dropped if it rolls back."""
+    if task not in self.tasks:
+      raise KeyError('Unknown task %r' % task)
+    if session is None:
+      session = self.app.extensions['sqlalchemy'].db.session()
+    session.info.setdefault('jobs', []).append((self, task, list(args)))
+
+  def run(self, task, args):
+    """Run one job in an app context; returns the error, or None."""
+    with self.app.app_context():
+      try:
+        self.tasks[task](*args)
+      except Exception:
+        self.app.logger.exception('Job %s%r failed', task, tuple(args))
+        return traceback.format_exc()
+    return None
+
+  def listing(self):
+    return self.backend.listing()
+
+  def status(self):
+    jobs = self.listing()
+    counts = dict((status, sum(1 for job in jobs if job['status'] == status))
+                  for status in ('pending', 'running', 'failed'))
+    for job in jobs:
+      for field in ('run_at', 'claimed_at', 'created_at'):
+        if job.get(field) is not None:
+          job[field] = job[field].isoformat()
+    return jsonify(backend=self.app.config['JOBS_BACKEND'], counts=counts, jobs=jobs)
+
+
+def _after_commit(session):
+  for jobs, task, args in session.info.pop('jobs', []):
+    jobs.backend.enqueue(task, args)
+
+
+def _after_rollback(session):
+  session.info.pop('jobs', None)
@@ -0,0 +1,31 @@
+"""add venue and artist row versions
+
+Revision ID: 0b6d3f8e21a4
+Revises: e7b5d20a6f13
+Create Date: 2026-10-18 19:38:38.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6d3f8e21a4'
+down_revision = 'e7b5d20a6f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ['Venue', 'Artist']:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table in ['Artist', 'Venue']:
+        if sqlite:
+            # Dropping in place keeps the FTS triggers a batch rebuild would lose.
+            op.execute('ALTER TABLE "{}" DROP COLUMN version'.format(table))
+        else:
+            op.drop_column(table, 'version')
@@ -0,0 +1,54 @@
+"""add name search indexes
+
+Revision ID: 5f1c3a9d7e42
+Revises: 12ec7dde559e
+Create Date: 2026-10-18 18:51:22.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1c3a9d7e42'
+down_revision = '12ec7dde559e'
+branch_labels = None
+depends_on = None
+
+TABLES = ['Venue', 'Artist']
+
+FTS_DDL = [
+    'CREATE VIRTUAL TABLE "{t}_fts" USING fts5('
+    'name, content="{t}", content_rowid="id", tokenize="trigram")',
+    'CREATE TRIGGER "{t}_fts_ai" AFTER INSERT ON "{t}" BEGIN '
+    'INSERT INTO "{t}_fts"(rowid, name) VALUES (new.id, new.name); END',
+    'CREATE TRIGGER "{t}_fts_ad" AFTER DELETE ON "{t}" BEGIN '
+    'INSERT INTO "{t}_fts"("{t}_fts", rowid, name) VALUES (\'delete\', old.id, old.name); END',
+    'CREATE TRIGGER "{t}_fts_au" AFTER UPDATE OF name ON "{t}" BEGIN '
+    'INSERT INTO "{t}_fts"("{t}_fts", rowid, name) VALUES (\'delete\', old.id, old.name); '
+    'INSERT INTO "{t}_fts"(rowid, name) VALUES (new.id, new.name); END',
+    'INSERT INTO "{t}_fts"("{t}_fts") VALUES (\'rebuild\')',
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        op.create_index('ix_{}_name_trgm'.format(table), table, ['name'],
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+        if dialect == 'sqlite':
+            for statement in FTS_DDL:
+                op.execute(statement.format(t=table))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == 'sqlite':
+            for trigger in ['ai', 'ad', 'au']:
+                op.execute('DROP TRIGGER IF EXISTS "{t}_fts_{g}"'.format(t=table, g=trigger))
+            op.execute('DROP TABLE IF EXISTS "{}_fts"'.format(table))
+        op.drop_index('ix_{}_name_trgm'.format(table), table_name=table)
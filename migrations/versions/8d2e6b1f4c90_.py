@@ -0,0 +1,86 @@
+"""normalize genres
+
+Revision ID: 8d2e6b1f4c90
+Revises: 5f1c3a9d7e42
+Create Date: 2026-10-18 18:52:29.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2e6b1f4c90'
+down_revision = '5f1c3a9d7e42'
+branch_labels = None
+depends_on = None
+
+artist = sa.table('Artist', sa.column('id', sa.Integer), sa.column('genres', sa.String))
+genre = sa.table('Genre', sa.column('id', sa.Integer), sa.column('name', sa.String))
+artist_genre = sa.table('ArtistGenre', sa.column('artist_id', sa.Integer), sa.column('genre_id', sa.Integer))
+
+
+def upgrade():
+    op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('ArtistGenre',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_ArtistGenre_genre_id'), 'ArtistGenre', ['genre_id'], unique=False)
+    op.create_table('VenueGenre',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index(op.f('ix_VenueGenre_genre_id'), 'VenueGenre', ['genre_id'], unique=False)
+
+    # Move the comma-joined Artist.genres values into the association table.
+    bind = op.get_bind()
+    links = []
+    for artist_id, genres in bind.execute(sa.select([artist.c.id, artist.c.genres])):
+        for name in (genres or '').split(','):
+            if name.strip():
+                links.append((artist_id, name.strip()))
+    names = sorted(set(name for _, name in links))
+    if names:
+        op.bulk_insert(genre, [{'name': name} for name in names])
+        ids = dict((name, id) for id, name in bind.execute(sa.select([genre.c.id, genre.c.name])))
+        op.bulk_insert(artist_genre, [{'artist_id': artist_id, 'genre_id': ids[name]}
+                                      for artist_id, name in sorted(set(links))])
+
+    if bind.dialect.name == 'sqlite':
+        # A batch rebuild of Artist would drop the FTS triggers; SQLite >= 3.35
+        # can drop the column in place.
+        op.execute('ALTER TABLE "Artist" DROP COLUMN genres')
+    else:
+        op.drop_column('Artist', 'genres')
+
+
+def downgrade():
+    op.add_column('Artist', sa.Column('genres', sa.String(length=120), nullable=True))
+    bind = op.get_bind()
+    joined = {}
+    rows = bind.execute(sa.select([artist_genre.c.artist_id, genre.c.name])
+                        .select_from(artist_genre.join(genre, genre.c.id == artist_genre.c.genre_id))
+                        .order_by(artist_genre.c.artist_id, genre.c.name))
+    for artist_id, name in rows:
+        joined.setdefault(artist_id, []).append(name)
+    for artist_id, names in joined.items():
+        bind.execute(artist.update().where(artist.c.id == artist_id)
+                     .values(genres=','.join(names)[:120]))
+
+    op.drop_index(op.f('ix_VenueGenre_genre_id'), table_name='VenueGenre')
+    op.drop_table('VenueGenre')
+    op.drop_index(op.f('ix_ArtistGenre_genre_id'), table_name='ArtistGenre')
+    op.drop_table('ArtistGenre')
+    op.drop_table('Genre')
@@ -0,0 +1,53 @@
+"""add show end times and booking exclusion constraints
+
+Existing shows are given the default two hour length. On Postgres the
+venue and artist bookings are then made exclusive; the upgrade stops with
+a list of overlapping shows if there are any, so they can be moved first.
+
+Revision ID: 9c3f5e1a7b28
+Revises: 6a9e4c27b15f
+Create Date: 2026-10-18 19:47:25.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c3f5e1a7b28'
+down_revision = '6a9e4c27b15f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    postgres = bind.dialect.name == 'postgresql'
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    if postgres:
+        op.execute('''UPDATE "Show" SET end_time = "time" + interval '2 hours' ''')
+    else:
+        op.execute('''UPDATE "Show" SET end_time = datetime("time", '+2 hours')''')
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+
+    if postgres:
+        for column in ['venue_id', 'artist_id']:
+            overlaps = bind.execute(sa.text(
+                'SELECT a.id, b.id FROM "Show" a JOIN "Show" b ON a.{c} = b.{c} AND a.id < b.id '
+                'AND a."time" < b.end_time AND b."time" < a.end_time LIMIT 20'.format(c=column))).fetchall()
+            if overlaps:
+                raise RuntimeError('Shows double-booked on %s, move them before upgrading: %s'
+                                   % (column, ', '.join('%d/%d' % pair for pair in overlaps)))
+        op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for column in ['venue_id', 'artist_id']:
+            op.execute('ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{c}_booking" EXCLUDE USING gist '
+                       '({c} WITH =, tsrange("time", end_time) WITH &&)'.format(c=column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for column in ['artist_id', 'venue_id']:
+            op.execute('ALTER TABLE "Show" DROP CONSTRAINT "ex_Show_{c}_booking"'.format(c=column))
+    with op.batch_alter_table('Show') as batch_op:
+        batch_op.drop_column('end_time')
@@ -0,0 +1,44 @@
+"""add venue and artist locations
+
+Rows are placed by `flask geocode` once the columns exist.
+
+Revision ID: d58a1f3c06b9
+Revises: 9c3f5e1a7b28
+Create Date: 2026-10-18 19:50:23.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58a1f3c06b9'
+down_revision = '9c3f5e1a7b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table in ['Venue', 'Artist']:
+        op.add_column(table, sa.Column('latitude', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('longitude', sa.Float(), nullable=True))
+        op.add_column(table, sa.Column('geohash', sa.String(length=12), nullable=True))
+        op.create_index(op.f('ix_{}_geohash'.format(table)), table, ['geohash'], unique=False)
+        if postgres:
+            op.execute('CREATE INDEX "ix_{t}_location" ON "{t}" USING gist (point(longitude, latitude))'
+                       .format(t=table))
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table in ['Artist', 'Venue']:
+        if not sqlite:
+            op.drop_index('ix_{}_location'.format(table), table_name=table)
+        op.drop_index(op.f('ix_{}_geohash'.format(table)), table_name=table)
+        for column in ['geohash', 'longitude', 'latitude']:
+            if sqlite:
+                # Dropping in place keeps the FTS triggers a batch rebuild would lose.
+                op.execute('ALTER TABLE "{}" DROP COLUMN {}'.format(table, column))
+            else:
+                op.drop_column(table, column)
@@ -0,0 +1,49 @@
+"""add upcoming show counters
+
+Revision ID: e7b5d20a6f13
+Revises: c41a7e0b93d5
+Create Date: 2026-10-18 18:55:04.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b5d20a6f13'
+down_revision = 'c41a7e0b93d5'
+branch_labels = None
+depends_on = None
+
+show = sa.table('Show', sa.column('id', sa.Integer), sa.column('time', sa.DateTime),
+                sa.column('venue_id', sa.Integer), sa.column('artist_id', sa.Integer))
+
+
+def upgrade():
+    for table in ['Venue', 'Artist']:
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('next_show_time', sa.DateTime(), nullable=True))
+
+    # Backfill from the shows already booked.
+    now = datetime.now()
+    for table, fk in [('Venue', show.c.venue_id), ('Artist', show.c.artist_id)]:
+        owner = sa.table(table, sa.column('id', sa.Integer),
+                         sa.column('upcoming_shows_count', sa.Integer),
+                         sa.column('next_show_time', sa.DateTime))
+        upcoming = sa.and_(fk == owner.c.id, show.c.time > now)
+        op.execute(owner.update().values(
+            upcoming_shows_count=sa.select([sa.func.count(show.c.id)]).where(upcoming).as_scalar(),
+            next_show_time=sa.select([sa.func.min(show.c.time)]).where(upcoming).as_scalar(),
+        ))
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table in ['Artist', 'Venue']:
+        for column in ['next_show_time', 'upcoming_shows_count']:
+            if sqlite:
+                # Dropping in place keeps the FTS triggers a batch rebuild would lose.
+                op.execute('ALTER TABLE "{}" DROP COLUMN {}'.format(table, column))
+            else:
+                op.drop_column(table, column)
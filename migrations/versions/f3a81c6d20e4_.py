@@ -0,0 +1,79 @@
+"""add soft deletes to venues, artists and shows
+
+The listing indexes on Venue(city, state) and Show(time) become partial,
+covering live rows only, the Show(venue_id, time) and Show(artist_id, time)
+indexes carry deleted_at, and the booking exclusion constraints on Postgres
+ignore deleted shows.
+
+Revision ID: f3a81c6d20e4
+Revises: d58a1f3c06b9
+Create Date: 2026-10-18 20:00:57.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a81c6d20e4'
+down_revision = 'd58a1f3c06b9'
+branch_labels = None
+depends_on = None
+
+LIVE = sa.text('deleted_at IS NULL')
+DELETED = sa.text('deleted_at IS NOT NULL')
+LISTINGS = [('ix_Venue_city_state', 'Venue', ['city', 'state']), ('ix_Show_time', 'Show', ['time'])]
+# Kept whole (the purge looks for any shows left), with deleted_at so live
+# range scans stay index-only.
+RANGES = [('ix_Show_venue_id_time', ['venue_id', 'time']), ('ix_Show_artist_id_time', ['artist_id', 'time'])]
+BOOKING = ('ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{c}_booking" EXCLUDE USING gist '
+           '({c} WITH =, tsrange("time", end_time) WITH &&){where}')
+
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for table in ['Venue', 'Artist', 'Show']:
+        op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        op.create_index('ix_{}_deleted_at'.format(table), table, ['deleted_at'], unique=False,
+                        sqlite_where=DELETED, postgresql_where=DELETED)
+    for name, table, columns in LISTINGS:
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns, unique=False, sqlite_where=LIVE, postgresql_where=LIVE)
+    for name, columns in RANGES:
+        op.drop_index(name, table_name='Show')
+        op.create_index(name, 'Show', columns + ['deleted_at'], unique=False)
+    if postgres:
+        for column in ['venue_id', 'artist_id']:
+            op.execute('ALTER TABLE "Show" DROP CONSTRAINT "ex_Show_{c}_booking"'.format(c=column))
+            op.execute(BOOKING.format(c=column, where=' WHERE (deleted_at IS NULL)'))
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    # Deleted rows would reappear; remove them first.
+    op.execute('DELETE FROM "Show" WHERE deleted_at IS NOT NULL OR venue_id IN '
+               '(SELECT id FROM "Venue" WHERE deleted_at IS NOT NULL) OR artist_id IN '
+               '(SELECT id FROM "Artist" WHERE deleted_at IS NOT NULL)')
+    for table, association, column in [('Venue', 'VenueGenre', 'venue_id'),
+                                       ('Artist', 'ArtistGenre', 'artist_id')]:
+        op.execute('DELETE FROM "{a}" WHERE {c} IN (SELECT id FROM "{t}" WHERE deleted_at IS NOT NULL)'
+                   .format(a=association, c=column, t=table))
+        op.execute('DELETE FROM "{}" WHERE deleted_at IS NOT NULL'.format(table))
+    if postgres:
+        for column in ['venue_id', 'artist_id']:
+            op.execute('ALTER TABLE "Show" DROP CONSTRAINT "ex_Show_{c}_booking"'.format(c=column))
+            op.execute(BOOKING.format(c=column, where=''))
+    for name, table, columns in LISTINGS:
+        op.drop_index(name, table_name=table)
+        op.create_index(name, table, columns, unique=False)
+    for name, columns in RANGES:
+        op.drop_index(name, table_name='Show')
+        op.create_index(name, 'Show', columns, unique=False)
+    for table in ['Show', 'Artist', 'Venue']:
+        op.drop_index('ix_{}_deleted_at'.format(table), table_name=table)
+        if sqlite:
+            # Dropping in place keeps the FTS triggers a batch rebuild would lose.
+            op.execute('ALTER TABLE "{}" DROP COLUMN deleted_at'.format(table))
+        else:
+            op.drop_column(table, 'deleted_at')
@@ -1,7 +1,89 @@
 
-from app import db
+from sqlalchemy import event
+from extensions import db
+
+def name_search_index(table):
+    """Trigram index backing the name search on Postgres, mirrored by an
+    external-content FTS5 table kept in sync by triggers on SQLite."""
+    fts_ddl = [
+        'CREATE VIRTUAL TABLE "{t}_fts" USING fts5('
+        'name, content="{t}", content_rowid="id", tokenize="trigram")',
+        'CREATE TRIGGER "{t}_fts_ai" AFTER INSERT ON "{t}" BEGIN '
+        'INSERT INTO "{t}_fts"(rowid, name) VALUES (new.id, new.name); END',
+        'CREATE TRIGGER "{t}_fts_ad" AFTER DELETE ON "{t}" BEGIN '
+        'INSERT INTO "{t}_fts"("{t}_fts", rowid, name) VALUES (\'delete\', old.id, old.name); END',
+        'CREATE TRIGGER "{t}_fts_au" AFTER UPDATE OF name ON "{t}" BEGIN '
+        'INSERT INTO "{t}_fts"("{t}_fts", rowid, name) VALUES (\'delete\', old.id, old.name); '
+        'INSERT INTO "{t}_fts"(rowid, name) VALUES (new.id, new.name); END',
+    ]
+    for statement in fts_ddl:
+        event.listen(table, 'after_create',
+                     db.DDL(statement.format(t=table.name)).execute_if(dialect='sqlite'))
+    event.listen(table, 'before_drop',
+                 db.DDL('DROP TABLE IF EXISTS "{t}_fts"'.format(t=table.name)).execute_if(dialect='sqlite'))
+    return db.Index('ix_{t}_name_trgm'.format(t=table.name), table.c.name,
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+LIVE = 'deleted_at IS NULL'
+
+def live_index(name, *columns):
+    """An index over the rows that are not deleted. Queries must filter on
+    deleted_at IS NULL to use it; see deletion.py."""
+    return db.Index(name, *columns, sqlite_where=db.text(LIVE), postgresql_where=db.text(LIVE))
+
+def deleted_index(name):
+    """An index over the deleted rows only, for the purge."""
+    deleted = db.text('deleted_at IS NOT NULL')
+    return db.Index(name, 'deleted_at', sqlite_where=deleted, postgresql_where=deleted)
+
+def booking_exclusion(table):
+    """Exclusion constraints keeping the shows of one venue, and of one
+    artist, from overlapping on Postgres; see bookings.py."""
+    event.listen(table, 'before_create',
+                 db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist').execute_if(dialect='postgresql'))
+    for column in ('venue_id', 'artist_id'):
+        event.listen(table, 'after_create', db.DDL(
+            'ALTER TABLE "{t}" ADD CONSTRAINT "ex_{t}_{c}_booking" EXCLUDE USING gist '
+            '({c} WITH =, tsrange("time", end_time) WITH &&) WHERE ({live})'
+            .format(t=table.name, c=column, live=LIVE))
+            .execute_if(dialect='postgresql'))
+
+def location_index(table):
+    """GiST index serving the radius search on Postgres; other databases
+    use the btree index on geohash instead. See geo.py."""
+    event.listen(table, 'after_create', db.DDL(
+        'CREATE INDEX "ix_{t}_location" ON "{t}" USING gist (point(longitude, latitude))'
+        .format(t=table.name)).execute_if(dialect='postgresql'))
+
+artist_genres = db.Table('ArtistGenre',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True, index=True))
+
+venue_genres = db.Table('VenueGenre',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'), primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True, index=True))
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
+
+    @classmethod
+    def named(cls, names):
+        """Genre rows for `names`, creating the ones that don't exist yet."""
+        names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+        if not names:
+            return []
+        existing = {genre.name: genre for genre in cls.query.filter(cls.name.in_(names))}
+        return [existing.get(name) or cls(name=name) for name in names]
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        live_index('ix_Venue_city_state', 'city', 'state'),
+        deleted_index('ix_Venue_deleted_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -14,27 +96,89 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, nullable=False, default=False)
     seeking_description = db.Column(db.String(), nullable=True)
     website = db.Column(db.String(), nullable=True)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, nullable=True)
+    # Where the row's city is, from the gazetteer (geo.py).
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+    # Set when the row is deleted, until it is purged (deletion.py).
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # Bumped by every ORM update; keys the cached fragments rendering the row.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    genres = db.relationship('Genre', secondary=venue_genres, lazy=True, order_by=Genre.name)
     show = db.relationship('Show', backref= 'venue',lazy=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
+name_search_index(Venue.__table__)
+location_index(Venue.__table__)
+
 class Artist(db.Model):
     __tablename__ = 'Artist'
+    __table_args__ = (
+        deleted_index('ix_Artist_deleted_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))
     website = db.Column(db.String(), nullable= True)
     seeking_venue = db.Column(db.Boolean, nullable=True, default=False)
     seeking_description = db.Column(db.String(), nullable=True)
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime, nullable=True)
+    # Where the row's city is, from the gazetteer (geo.py).
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True, index=True)
+    # Set when the row is deleted, until it is purged (deletion.py).
+    deleted_at = db.Column(db.DateTime, nullable=True)
+    # Bumped by every ORM update; keys the cached fragments rendering the row.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    genres = db.relationship('Genre', secondary=artist_genres, lazy=True, order_by=Genre.name)
     show = db.relationship('Show', backref= 'artist',lazy=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
+name_search_index(Artist.__table__)
+location_index(Artist.__table__)
+
 class Show(db.Model):
   __tablename__ = "Show"
+  __table_args__ = (
+    # deleted_at is carried so live range scans stay index-only; not
+    # partial, so the purge's check for remaining shows can use them too.
+    db.Index('ix_Show_venue_id_time', 'venue_id', 'time', 'deleted_at'),
+    db.Index('ix_Show_artist_id_time', 'artist_id', 'time', 'deleted_at'),
+    live_index('ix_Show_time', 'time'),
+    deleted_index('ix_Show_deleted_at'),
+  )
   id = db.Column(db.Integer, primary_key=True, autoincrement=True)
   time = db.Column(db.DateTime, nullable=False)
+  end_time = db.Column(db.DateTime, nullable=False)
   artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
\ No newline at end of file
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+  deleted_at = db.Column(db.DateTime, nullable=True)
+
+booking_exclusion(Show.__table__)
+
+class Job(db.Model):
+  """A queued background job, when JOBS_BACKEND is 'db' (see jobs.py)."""
+  __tablename__ = "Job"
+  __table_args__ = (
+    db.Index('ix_Job_status_run_at', 'status', 'run_at'),
+  )
+  id = db.Column(db.Integer, primary_key=True)
+  task = db.Column(db.String(120), nullable=False)
+  args = db.Column(db.Text, nullable=False)
+  status = db.Column(db.String(16), nullable=False, default='pending', server_default='pending')
+  attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  run_at = db.Column(db.DateTime, nullable=False)
+  claimed_at = db.Column(db.DateTime, nullable=True)
+  last_error = db.Column(db.Text, nullable=True)
+  created_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,58 @@
+#----------------------------------------------------------------------------#
+# Home page, genre listings and bulk upload.
+#----------------------------------------------------------------------------#
+
+import io
+from flask import Blueprint, render_template, request, jsonify
+from extensions import cache, limiter
+from models import Venue, Artist
+from routing import replica_reads
+from queries import gather, latest, genre_listing
+
+pages = Blueprint('pages', __name__)
+
+
+@pages.route('/')
+@replica_reads
+@cache.cached('venues', 'artists')
+def index():
+  latest_venues, latest_artist = gather(lambda: latest(Venue), lambda: latest(Artist))
+  return render_template('pages/home.html',
+                         latest_venues= latest_venues,
+                         latest_artist= latest_artist)
+
+
+#  Genres
+#  ----------------------------------------------------------------
+
+@pages.route('/genres/<name>')
+@replica_reads
+def show_genre(name):
+  return render_template('pages/show_genre.html', genre=genre_listing(name))
+
+
+#  Bulk import
+#  ----------------------------------------------------------------
+
+@pages.route('/import/<any(venues, artists, shows):kind>', methods=['POST'])
+@limiter.limit('import')
+def import_upload(kind):
+  import bulk
+  upload = request.files.get('file')
+  if upload is None:
+    return jsonify({"error": "Send the rows as a multipart 'file' upload."}), 400
+  format = request.form.get('format') or bulk.format_of(upload.filename or '')
+  if format not in bulk.FORMATS:
+    return jsonify({"error": "The format must be one of: %s." % ', '.join(bulk.FORMATS)}), 400
+  report = bulk.Report()
+  try:
+    bulk.import_rows(kind, bulk.read_rows(io.TextIOWrapper(upload.stream, encoding='utf-8'), format),
+                     report=report)
+  except UnicodeDecodeError:
+    # The chunks read before the undecodable bytes are already in.
+    if report.inserted:
+      cache.invalidate(kind)
+    return jsonify(dict(report.as_dict(), error="The file is not UTF-8 text.")), 400
+  if report.inserted:
+    cache.invalidate(kind)
+  return jsonify(report.as_dict())
@@ -0,0 +1,385 @@
+#----------------------------------------------------------------------------#
+# Query layer.
+#
+# Read-side queries shared by the controllers. Each function issues a fixed
+# number of SQL statements regardless of how many rows are involved.
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import groupby
+from flask import abort, current_app, g
+from extensions import db
+from models import Venue, Artist, Show, Genre, artist_genres, venue_genres
+
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def gather(*calls):
+  """Run independent zero-argument queries at the same time and return their
+  results in order.
+
+  The first call runs in the caller's thread; the rest run on a shared pool,
+  each on its own session and connection, so they must return plain data
+  rather than ORM objects. With QUERY_CONCURRENCY below 2 they simply run
+  one after another.
+  """
+  global _executor
+  app = current_app._get_current_object()
+  workers = app.config['QUERY_CONCURRENCY']
+  if workers < 2 or len(calls) < 2:
+    return [call() for call in calls]
+  with _executor_lock:
+    if _executor is None:
+      _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='query')
+  # Statements issued on the pool still count towards the request and go to
+  # the same database as the rest of it.
+  carried = dict((name, g.get(name)) for name in ('_query_stats', '_replica'))
+
+  def run(call):
+    with app.app_context():
+      for name, value in carried.items():
+        setattr(g, name, value)
+      try:
+        return call()
+      finally:
+        db.session.remove()
+
+  futures = [_executor.submit(run, call) for call in calls[1:]]
+  first = calls[0]()
+  return [first] + [future.result() for future in futures]
+
+
+def encode_cursor(values):
+  payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value
+                        for value in values])
+  return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+  try:
+    payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    values = json.loads(payload.decode())
+    if len(values) != len(keys):
+      raise ValueError(cursor)
+    return [datetime.fromisoformat(value) if isinstance(key.type, db.DateTime) else value
+            for key, value in zip(keys, values)]
+  except (ValueError, TypeError):
+    abort(400)
+
+
+def keyset_page(query, keys, after=None, before=None, per_page=None):
+  """Seek pagination over `query` ordered by the unique tuple `keys`.
+
+  Rows must expose every key column under its attribute name. Only
+  per_page + 1 rows are ever read, so the cost of a page does not depend on
+  how deep into the table it is.
+  """
+  per_page = per_page or current_app.config['PAGE_SIZE']
+  if before:
+    query = query.filter(db.tuple_(*keys) < db.tuple_(*decode_cursor(before, keys))) \
+      .order_by(*[key.desc() for key in keys])
+  else:
+    if after:
+      query = query.filter(db.tuple_(*keys) > db.tuple_(*decode_cursor(after, keys)))
+    query = query.order_by(*keys)
+
+  rows = query.limit(per_page + 1).all()
+  has_more = len(rows) > per_page
+  rows = rows[:per_page]
+  if before:
+    rows.reverse()
+
+  def cursor_of(row):
+    return encode_cursor([getattr(row, key.key) for key in keys])
+
+  next_cursor = prev_cursor = None
+  if rows:
+    if before or has_more:
+      next_cursor = cursor_of(rows[-1])
+    if after or (before and has_more):
+      prev_cursor = cursor_of(rows[0])
+  return Page(rows, next_cursor, prev_cursor)
+
+
+def streamed(query, keys):
+  """Every row of `query` in `keys` order, fetched STREAM_BATCH_SIZE rows
+  at a time through a server-side cursor, so rendering the whole table
+  takes no more memory than one batch."""
+  return query.order_by(*keys).yield_per(current_app.config['STREAM_BATCH_SIZE'])
+
+
+def latest(model, limit=10):
+  return db.session.query(model.id, model.name, model.city, model.state) \
+    .filter(model.deleted_at.is_(None)) \
+    .order_by(model.id.desc()).limit(limit).all()
+
+
+def venue_areas(after=None, before=None):
+  """A page of venues grouped by (city, state) with their upcoming show counts.
+
+  Returns the page plus the structure expected by templates/pages/venues.html:
+  [{"city": ..., "state": ..., "venues": [{"id", "name", "version", "num_upcoming_shows"}]}]
+  Pages are keyed on (city, state, id) so an area is never split out of order.
+  A missing city or state sorts and groups as '': NULL would compare as
+  unknown in the keyset filter and drop rows from every later page.
+  """
+  city = db.func.coalesce(Venue.city, '').label('city')
+  state = db.func.coalesce(Venue.state, '').label('state')
+  query = db.session.query(
+      city,
+      state,
+      Venue.id,
+      Venue.name,
+      Venue.version,
+      Venue.upcoming_shows_count.label('num_upcoming_shows'),
+    ).filter(Venue.deleted_at.is_(None))
+  page = keyset_page(query, [city, state, Venue.id], after, before)
+
+  areas = []
+  for (city, state), venues in groupby(page.items, key=lambda row: (row.city, row.state)):
+    areas.append({
+      "city": city,
+      "state": state,
+      "venues": [{"id": row.id,
+                  "name": row.name,
+                  "version": row.version,
+                  "num_upcoming_shows": row.num_upcoming_shows} for row in venues],
+    })
+  return page, areas
+
+
+def venue_page(after=None, before=None, per_page=None):
+  """A page of venues in id order, for clients that don't group by area."""
+  query = db.session.query(
+      Venue.id,
+      Venue.name,
+      Venue.city,
+      Venue.state,
+      Venue.image_link,
+      Venue.upcoming_shows_count,
+      Venue.next_show_time,
+    ).filter(Venue.deleted_at.is_(None))
+  return keyset_page(query, [Venue.id], after, before, per_page)
+
+
+def _artists():
+  return db.session.query(
+      Artist.id,
+      Artist.name,
+      Artist.version,
+      Artist.city,
+      Artist.state,
+      Artist.image_link,
+      Artist.upcoming_shows_count,
+      Artist.next_show_time,
+    ).filter(Artist.deleted_at.is_(None))
+
+
+def artist_page(after=None, before=None, per_page=None):
+  return keyset_page(_artists(), [Artist.id], after, before, per_page)
+
+
+def artist_rows():
+  return streamed(_artists(), [Artist.id])
+
+
+def _shows():
+  """Shows with venue name, artist name and image in one join."""
+  return db.session.query(
+      Show.id,
+      Show.time,
+      Show.end_time,
+      Show.venue_id,
+      Venue.name.label('venue_name'),
+      Venue.version.label('venue_version'),
+      Show.artist_id,
+      Artist.name.label('artist_name'),
+      Artist.version.label('artist_version'),
+      Artist.image_link.label('artist_image_link'),
+    ).join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .filter(Show.deleted_at.is_(None), Venue.deleted_at.is_(None), Artist.deleted_at.is_(None))
+
+
+def show_page(after=None, before=None, per_page=None):
+  return keyset_page(_shows(), [Show.time, Show.id], after, before, per_page)
+
+
+def show_rows():
+  return streamed(_shows(), [Show.time, Show.id])
+
+
+def _show_filter(owner, owner_id, counterpart, upcoming, now):
+  """Conditions selecting the live past or upcoming shows of a venue/artist,
+  once they are joined to a live `counterpart`."""
+  return db.and_(getattr(Show, owner.__name__.lower() + '_id') == owner_id,
+                 Show.deleted_at.is_(None), counterpart.deleted_at.is_(None),
+                 Show.time > now if upcoming else Show.time <= now)
+
+
+def _show_count(model, counterpart, upcoming, now):
+  """Scalar subquery counting what _shows_of() lists for the outer `model` row."""
+  foreign_key = getattr(Show, counterpart.__name__.lower() + '_id')
+  return db.session.query(db.func.count(Show.id)).select_from(Show) \
+    .join(counterpart, foreign_key == counterpart.id) \
+    .filter(_show_filter(model, model.id, counterpart, upcoming, now)) \
+    .correlate(model).as_scalar()
+
+
+def _profile(model, id, columns, counterpart, now):
+  """The named columns of one venue/artist plus its genre names and past and
+  upcoming show counts, or None."""
+  row = model.query.options(db.selectinload(model.genres)) \
+    .add_columns(_show_count(model, counterpart, False, now),
+                 _show_count(model, counterpart, True, now)) \
+    .filter(model.id == id, model.deleted_at.is_(None)).first()
+  if row is None:
+    return None
+  entity, past, upcoming = row
+  profile = dict((column, getattr(entity, column)) for column in columns)
+  profile["genres"] = [genre.name for genre in entity.genres]
+  profile["past_shows_count"] = past
+  profile["upcoming_shows_count"] = upcoming
+  return profile
+
+
+def _shows_of(owner, owner_id, counterpart, upcoming, now):
+  """Past or upcoming shows of a venue/artist with the name and image of the
+  `counterpart` on the other side of each, as template-ready dicts."""
+  prefix = counterpart.__name__.lower()
+  foreign_key = getattr(Show, prefix + '_id')
+  query = db.session.query(foreign_key, counterpart.name, counterpart.image_link,
+                           counterpart.version, Show.time) \
+    .join(counterpart, foreign_key == counterpart.id) \
+    .filter(_show_filter(owner, owner_id, counterpart, upcoming, now))
+  if upcoming:
+    query = query.order_by(Show.time)
+  else:
+    query = query.order_by(Show.time.desc())
+  return [{prefix + "_id": id,
+           prefix + "_name": name,
+           prefix + "_image_link": image_link,
+           prefix + "_version": version,
+           "start_time": time} for id, name, image_link, version, time in query]
+
+
+def _detail(model, id, columns, counterpart, now):
+  """The profile, past shows and upcoming shows of a venue/artist, fetched
+  concurrently: four queries in three round trips."""
+  now = now or datetime.now()
+  profile, past, upcoming = gather(
+    lambda: _profile(model, id, columns, counterpart, now),
+    lambda: _shows_of(model, id, counterpart, False, now),
+    lambda: _shows_of(model, id, counterpart, True, now))
+  if profile is None:
+    abort(404)
+  profile.update({
+    "past_shows": past,
+    "upcoming_shows": upcoming,
+  })
+  return profile
+
+
+def venue_detail(venue_id, now=None):
+  """Data for templates/pages/show_venue.html."""
+  return _detail(Venue, venue_id,
+                 ['id', 'name', 'address', 'city', 'state', 'phone', 'website', 'facebook_link',
+                  'seeking_talent', 'seeking_description', 'image_link'],
+                 Artist, now)
+
+
+def artist_detail(artist_id, now=None):
+  """Data for templates/pages/show_artist.html."""
+  return _detail(Artist, artist_id,
+                 ['id', 'name', 'city', 'state', 'phone', 'website', 'facebook_link',
+                  'seeking_venue', 'seeking_description', 'image_link'],
+                 Venue, now)
+
+
+def genre_listing(name):
+  """Artists and venues tagged with genre `name`, answered from the genre
+  association indexes in one UNION ALL."""
+  artists = db.session.query(
+      db.literal('artist').label('kind'), Artist.id.label('id'), Artist.name.label('name')) \
+    .join(artist_genres, artist_genres.c.artist_id == Artist.id) \
+    .join(Genre, Genre.id == artist_genres.c.genre_id) \
+    .filter(Genre.name == name, Artist.deleted_at.is_(None))
+  venues = db.session.query(
+      db.literal('venue').label('kind'), Venue.id.label('id'), Venue.name.label('name')) \
+    .join(venue_genres, venue_genres.c.venue_id == Venue.id) \
+    .join(Genre, Genre.id == venue_genres.c.genre_id) \
+    .filter(Genre.name == name, Venue.deleted_at.is_(None))
+
+  listing = {"name": name, "artists": [], "venues": []}
+  for row in artists.union_all(venues).all():
+    listing[row.kind + 's'].append({"id": row.id, "name": row.name})
+  return listing
+
+
+def _search(model, term, limit, offset):
+  """Ranked name search returning upcoming show counts and the total match
+  count from the same statement.
+
+  Postgres serves the ILIKE from the pg_trgm GIN index and ranks by
+  similarity; SQLite matches against the FTS5 trigram table instead.
+  """
+  query = db.session.query(
+      model.id,
+      model.name,
+      model.upcoming_shows_count.label('num_upcoming_shows'),
+      db.func.count().over().label('total'),
+    ).filter(model.deleted_at.is_(None))
+
+  dialect = db.session.get_bind(mapper=db.inspect(model)).dialect.name
+  pattern = '%' + term.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+  if not term:
+    query = query.order_by(model.name, model.id)
+  elif dialect == 'sqlite' and len(term) >= 3:
+    fts = db.table(model.__tablename__ + '_fts', db.column('rowid'), db.column('rank'))
+    query = query.join(fts, fts.c.rowid == model.id) \
+      .filter(db.literal_column('"%s"' % fts.name).op('MATCH')('"' + term.replace('"', '""') + '"')) \
+      .order_by(fts.c.rank, model.id)
+  elif dialect == 'postgresql':
+    query = query.filter(model.name.ilike(pattern, escape='!')) \
+      .order_by(db.func.similarity(model.name, term).desc(), model.id)
+  else:
+    query = query.filter(model.name.ilike(pattern, escape='!')) \
+      .order_by(model.name, model.id)
+
+  rows = query.limit(limit).offset(offset).all()
+  return {"count": rows[0].total if rows else 0,
+          "data": [{"id": row.id,
+                    "name": row.name,
+                    "num_upcoming_shows": row.num_upcoming_shows} for row in rows]}
+
+
+def _search_limit(limit):
+  return max(1, min(limit or current_app.config['SEARCH_PAGE_SIZE'],
+                    current_app.config['SEARCH_MAX_LIMIT']))
+
+
+def _search_bounds(term, offset):
+  """The term and offset of a search, cut to SEARCH_MAX_TERM_LENGTH and
+  SEARCH_MAX_OFFSET so no request asks the database for an unbounded
+  pattern or skip."""
+  config = current_app.config
+  return term[:config['SEARCH_MAX_TERM_LENGTH']], min(max(offset, 0), config['SEARCH_MAX_OFFSET'])
+
+
+def find_venues(term, limit=None, offset=0):
+  term, offset = _search_bounds(term, offset)
+  return _search(Venue, term, _search_limit(limit), offset)
+
+
+def find_artists(term, limit=None, offset=0):
+  term, offset = _search_bounds(term, offset)
+  return _search(Artist, term, _search_limit(limit), offset)
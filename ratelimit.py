@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------------#
+# Rate limiting.
+#
+# A view decorated with @limiter.limit(group) takes a token from a bucket
+# per client IP and, when the group's limits name it, per browser session,
+# each kept per route. A bucket holds up to `burst` tokens and refills at
+# `requests` per `seconds` (RATELIMIT_LIMITS). The buckets of a request are
+# taken from together: if any is empty none is debited, and the request is
+# answered 429 with Retry-After before the view runs, so it never reaches
+# the database. A group can also cap how many of its requests each process
+# serves at once (RATELIMIT_CONCURRENCY); the rest get a 503.
+#
+# A session bucket only slows down clients that keep their cookie; one that
+# drops it starts a fresh session, and a full bucket, on every request. So
+# every group limited per session must be limited per IP too.
+#
+# RATELIMIT_BACKEND picks where the buckets live:
+#
+#   'memory'  a bounded LRU in each process; with several workers a client
+#             gets up to that many times the limit.
+#   'redis'   a Redis server shared by every worker (RATELIMIT_REDIS_URL),
+#             the buckets of each request taken in one atomic script call.
+#----------------------------------------------------------------------------#
+
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, jsonify, render_template, request, session
+
+
+def refill(tokens, updated, capacity, rate, cost, now):
+  """Take `cost` tokens from a bucket holding `tokens` at time `updated`.
+  Returns (tokens left, seconds until the request would be allowed: 0 when
+  it is)."""
+  tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+  if tokens >= cost:
+    return tokens - cost, 0.0
+  return tokens, (cost - tokens) / rate
+
+
+class MemoryBackend(object):
+  """In-process buckets in a bounded, thread-safe LRU. An evicted bucket
+  comes back full."""
+
+  def __init__(self, max_keys=10000):
+    self.max_keys = max_keys
+    self._buckets = OrderedDict()
+    self._lock = threading.Lock()
+
+  def take(self, key, capacity, rate, cost=1, now=None):
+    """(allowed, seconds to wait) for a request costing `cost` tokens."""
+    return self.take_all([(key, capacity, rate)], cost, now)
+
+  def take_all(self, buckets, cost=1, now=None):
+    """Take `cost` tokens from every (key, capacity, rate) bucket, or from
+    none of them when one falls short: (allowed, longest wait)."""
+    now = time.time() if now is None else now
+    with self._lock:
+      taken = []
+      for key, capacity, rate in buckets:
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        taken.append((key, refill(tokens, updated, capacity, rate, cost, now)))
+      wait = max(result[1] for _, result in taken)
+      if wait:
+        return False, wait
+      for key, (tokens, _) in taken:
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+      while len(self._buckets) > self.max_keys:
+        self._buckets.popitem(last=False)
+    return True, 0
+
+
+class RedisBackend(object):
+  """Buckets in Redis hashes, over any client with the redis-py
+  register_script API. The script mirrors MemoryBackend.take_all()."""
+
+  SCRIPT = """
+local cost, now = tonumber(ARGV[1]), tonumber(ARGV[2])
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+  local capacity, rate = tonumber(ARGV[1 + 2 * i]), tonumber(ARGV[2 + 2 * i])
+  local bucket = redis.call('HMGET', key, 'tokens', 'updated')
+  local tokens = tonumber(bucket[1]) or capacity
+  local updated = tonumber(bucket[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+  if tokens < cost then
+    wait = math.max(wait, (cost - tokens) / rate)
+  end
+  levels[i] = tokens
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+  local capacity, rate = tonumber(ARGV[1 + 2 * i]), tonumber(ARGV[2 + 2 * i])
+  redis.call('HMSET', key, 'tokens', tostring(levels[i] - cost), 'updated', tostring(now))
+  redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+  def __init__(self, client, prefix='fyyur:ratelimit:'):
+    self.prefix = prefix
+    self._take = client.register_script(self.SCRIPT)
+
+  def take(self, key, capacity, rate, cost=1, now=None):
+    return self.take_all([(key, capacity, rate)], cost, now)
+
+  def take_all(self, buckets, cost=1, now=None):
+    now = time.time() if now is None else now
+    args = [cost, repr(now)]
+    for key, capacity, rate in buckets:
+      args.extend([capacity, rate])
+    wait = float(self._take(keys=[self.prefix + key for key, _, _ in buckets], args=args))
+    return wait == 0, wait
+
+
+def client_ip():
+  """The client's address, read from X-Forwarded-For behind
+  RATELIMIT_PROXIES trusted proxies."""
+  proxies = current_app.config['RATELIMIT_PROXIES']
+  route = request.access_route
+  if proxies and len(route) >= proxies:
+    return route[-proxies]
+  return request.remote_addr or 'unknown'
+
+
+def _identity(scope):
+  if scope == 'ip':
+    return client_ip()
+  if scope == 'session':
+    return session.setdefault('_client', uuid.uuid4().hex)
+  raise KeyError('Unknown rate limit scope %r' % scope)
+
+
+def _refused(status, wait, message):
+  if request.blueprint == 'api' or request.accept_mimetypes.best == 'application/json':
+    response = jsonify(error=message)
+  else:
+    response = current_app.make_response(render_template('errors/429.html', message=message))
+  response.status_code = status
+  response.headers['Retry-After'] = str(max(1, int(math.ceil(wait))))
+  return response
+
+
+class RateLimiter(object):
+
+  def __init__(self, app=None):
+    self.backend = None
+    self._slots = {}
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('RATELIMIT_ENABLED', True)
+    app.config.setdefault('RATELIMIT_BACKEND', 'memory')
+    app.config.setdefault('RATELIMIT_MAX_KEYS', 10000)
+    app.config.setdefault('RATELIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    app.config.setdefault('RATELIMIT_PROXIES', 0)
+    app.config.setdefault('RATELIMIT_LIMITS', {})
+    app.config.setdefault('RATELIMIT_CONCURRENCY', {})
+    for group, limits in app.config['RATELIMIT_LIMITS'].items():
+      if 'session' in limits and 'ip' not in limits:
+        raise ValueError('Rate limit group %r is limited per session only; clients '
+                         'that drop their cookie escape it, so limit it per ip too.' % group)
+    if app.config['RATELIMIT_BACKEND'] == 'redis':
+      import redis
+      self.backend = RedisBackend(redis.Redis.from_url(app.config['RATELIMIT_REDIS_URL']))
+    else:
+      self.backend = MemoryBackend(app.config['RATELIMIT_MAX_KEYS'])
+    self._slots = dict((group, threading.BoundedSemaphore(slots))
+                       for group, slots in app.config['RATELIMIT_CONCURRENCY'].items())
+    app.extensions['ratelimit'] = self
+
+  def check(self, group):
+    """Take this request's tokens from the buckets of `group`, all or none.
+    Returns the seconds to wait when one is empty, else 0."""
+    limits = current_app.config['RATELIMIT_LIMITS'].get(group, {})
+    if not limits:
+      return 0
+    buckets = [('%s:%s:%s:%s' % (group, request.endpoint, scope, _identity(scope)),
+                burst, requests / float(seconds))
+               for scope, (requests, seconds, burst) in sorted(limits.items())]
+    return self.backend.take_all(buckets)[1]
+
+  def limit(self, group):
+    """Rate limit a view under `group` of RATELIMIT_LIMITS and
+    RATELIMIT_CONCURRENCY."""
+    def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+        if not current_app.config['RATELIMIT_ENABLED']:
+          return view(*args, **kwargs)
+        wait = self.check(group)
+        if wait:
+          return _refused(429, wait, 'Too many requests; try again in a little while.')
+        slots = self._slots.get(group)
+        if slots is None:
+          return view(*args, **kwargs)
+        if not slots.acquire(blocking=False):
+          return _refused(503, 1, 'The server is busy; try again in a moment.')
+        try:
+          return view(*args, **kwargs)
+        finally:
+          slots.release()
+      return wrapper
+    return decorator
@@ -0,0 +1,103 @@
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#
+# Views marked @replica_reads send their SELECTs to one of the
+# SQLALCHEMY_REPLICA_URIS, picked once per request. Anything that writes
+# (a flush, or an INSERT/UPDATE/DELETE through session.execute) goes to the
+# primary and pins the client to the primary for REPLICA_PIN_SECONDS, so
+# the request that follows a write reads its own data even while the
+# replicas lag behind.
+#----------------------------------------------------------------------------#
+
+import random
+import time
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.sql.expression import CompoundSelect, Select
+
+# Pool settings that SQLite's NullPool/StaticPool do not accept.
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+def check_pool(app, request_threads):
+  """Refuse a pool too small for `request_threads` concurrent requests,
+  each holding a connection while queries.gather() runs on up to
+  QUERY_CONCURRENCY more. Short of that, requests would wait pool_timeout
+  on each other and fail."""
+  if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    return
+  options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+  pool_size, max_overflow = options.get('pool_size', 5), options.get('max_overflow', 10)
+  if max_overflow < 0:
+    return
+  concurrency = app.config.get('QUERY_CONCURRENCY', 0)
+  needed = request_threads + (concurrency if concurrency >= 2 else 0)
+  if pool_size + max_overflow < needed:
+    raise ValueError('A pool of %d + %d connections cannot serve %d request threads and %d '
+                     'query threads; raise DB_POOL_SIZE or DB_MAX_OVERFLOW.'
+                     % (pool_size, max_overflow, request_threads, concurrency))
+
+
+def replica_reads(view):
+  """Mark a view as read-only, so its queries may be served by a replica."""
+  view.replica_reads = True
+  return view
+
+
+def _is_read(clause):
+  return isinstance(clause, (Select, CompoundSelect))
+
+
+class RoutingSession(SignallingSession):
+
+  def __init__(self, db, **options):
+    self._db = db
+    SignallingSession.__init__(self, db, **options)
+
+  def get_bind(self, mapper=None, clause=None):
+    if self._flushing or (clause is not None and not _is_read(clause)):
+      if has_app_context():
+        g._wrote_primary = True
+    elif has_app_context() and g.get('_replica'):
+      return self._db.get_engine(self.app, bind=g._replica)
+    return SignallingSession.get_bind(self, mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def init_app(self, app):
+    app.config.setdefault('SQLALCHEMY_REPLICA_URIS', [])
+    app.config.setdefault('REPLICA_PIN_SECONDS', 5)
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, uri in enumerate(app.config['SQLALCHEMY_REPLICA_URIS']):
+      binds['replica_%d' % i] = uri
+    app.config['SQLALCHEMY_BINDS'] = binds or None
+    SQLAlchemy.init_app(self, app)
+    check_pool(app, 1)
+    app.before_request(self._route)
+    app.after_request(self._pin)
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+  def create_engine(self, sa_url, engine_opts):
+    if sa_url.drivername.startswith('sqlite'):
+      engine_opts = dict((option, value) for option, value in engine_opts.items()
+                         if option not in QUEUE_POOL_OPTIONS)
+    elif sa_url.drivername in ('postgresql', 'postgresql+psycopg2'):
+      # Send executemany() (bulk import, counter refreshes) as multi-row VALUES.
+      engine_opts = dict(engine_opts, executemany_mode=engine_opts.get('executemany_mode', 'values'))
+    return SQLAlchemy.create_engine(self, sa_url, engine_opts)
+
+  def _route(self):
+    replicas = len(current_app.config['SQLALCHEMY_REPLICA_URIS'])
+    view = current_app.view_functions.get(request.endpoint)
+    if replicas and getattr(view, 'replica_reads', False) \
+        and session.get('_primary_until', 0) < time.time():
+      g._replica = 'replica_%d' % random.randrange(replicas)
+
+  def _pin(self, response):
+    if g.get('_wrote_primary'):
+      session['_primary_until'] = time.time() + current_app.config['REPLICA_PIN_SECONDS']
+    return response
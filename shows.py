@@ -0,0 +1,84 @@
+#----------------------------------------------------------------------------#
+# Show pages.
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, Response, current_app, render_template, request, flash
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from extensions import db, cache, limiter
+from models import Show
+from routing import replica_reads
+from queries import show_page, show_rows
+from bookings import default_end, check_length, conflicts, missing
+from templating import stream_template
+
+show_pages = Blueprint('shows', __name__)
+
+
+@show_pages.route('/shows')
+@replica_reads
+@cache.cached('shows', 'venues', 'artists')
+def shows():
+  if request.args.get('all'):
+    # Every show, streamed as it is read; see templating.stream_template.
+    return Response(stream_template('pages/shows.html', shows=(_card(item) for item in show_rows()),
+                                    page=None))
+  page = show_page(after=request.args.get('after'), before=request.args.get('before'))
+  return render_template('pages/shows.html', shows=[_card(item) for item in page.items], page=page)
+
+def _card(item):
+  return {"id": item.id,
+          "venue_id": item.venue_id,
+          "venue_name": item.venue_name,
+          "venue_version": item.venue_version,
+          "artist_id": item.artist_id,
+          "artist_name": item.artist_name,
+          "artist_version": item.artist_version,
+          "artist_image_link": item.artist_image_link,
+          "start_time": item.time
+         }
+
+@show_pages.route('/shows/create')
+def create_shows():
+  from forms import ShowForm
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@show_pages.route('/shows/create', methods=['POST'])
+@limiter.limit('create')
+def create_show_submission():
+  artist_id = request.form.get("artist_id", "")
+  venue_id = request.form.get("venue_id", "")
+  time = request.form.get("start_time", "")
+  end_time = request.form.get("end_time", "")
+  try:
+    import dateutil.parser
+    start = dateutil.parser.parse(time)
+    end = dateutil.parser.parse(end_time) if end_time else default_end(start)
+    venue_id, artist_id = int(venue_id), int(artist_id)
+  except (ValueError, OverflowError):
+    flash('Show could not be listed. Give a venue id, an artist id and a start time.')
+    return render_template('pages/home.html')
+  try:
+    length_problem = check_length(start, end)
+    if length_problem:
+      problems = [length_problem]
+    else:
+      problems = missing(venue_id, artist_id) or conflicts(start, end, venue_id, artist_id)
+    if problems:
+      for problem in problems:
+        flash('Show could not be listed. ' + problem)
+      return render_template('pages/home.html')
+    show = Show(artist_id=artist_id, venue_id=venue_id, time=start, end_time=end)
+    db.session.add(show)
+    cache.invalidate_after_commit('shows')
+    db.session.commit()
+    flash('Show was successfully listed!')
+  except IntegrityError:
+    # Booked by a concurrent request since the check above (Postgres).
+    db.session.rollback()
+    flash('Show could not be listed. The venue or artist was booked at that time meanwhile.')
+  except SQLAlchemyError:
+    db.session.rollback()
+    current_app.logger.exception('Listing a show failed')
+    flash('An error occurred. Show could not be listed.')
+  return render_template('pages/home.html')
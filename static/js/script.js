@@ -4,3 +4,40 @@ window.parseISOString = function parseISOString(s) {
 };
 
 
+
+// Forms marked data-partial submit only the fields the user changed, so
+// an edit writes only those columns (see editing.py). Fields are disabled
+// just before submitting, and enabled again if the page is shown again.
+// A multi-select with nothing selected submits nothing, so it comes with
+// an empty hidden field of the same name, disabled along with it.
+document.addEventListener('submit', function (event) {
+  var form = event.target;
+  var unchanged = {};
+  if (!form.hasAttribute('data-partial')) return;
+  Array.prototype.forEach.call(form.elements, function (field) {
+    var changed;
+    if (field.type === 'hidden' || field.type === 'submit' || !field.name) return;
+    if (field.type === 'checkbox' || field.type === 'radio') {
+      changed = field.checked !== field.defaultChecked;
+    } else if (field.tagName === 'SELECT') {
+      changed = Array.prototype.some.call(field.options, function (option) {
+        return option.selected !== option.defaultSelected;
+      });
+    } else {
+      changed = field.value !== field.defaultValue;
+    }
+    if (!changed) {
+      field.disabled = true;
+      unchanged[field.name] = true;
+    }
+  });
+  Array.prototype.forEach.call(form.elements, function (field) {
+    if (field.type === 'hidden' && unchanged[field.name]) field.disabled = true;
+  });
+});
+
+window.addEventListener('pageshow', function () {
+  Array.prototype.forEach.call(document.querySelectorAll('form[data-partial] [disabled]'), function (field) {
+    field.disabled = false;
+  });
+});
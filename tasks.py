@@ -0,0 +1,36 @@
+#----------------------------------------------------------------------------#
+# Background tasks.
+#
+# Everything jobs.enqueue() / jobs.after_commit() can run, by name. Imported
+# by create_app(), so every web process and `flask jobs work` knows them.
+#----------------------------------------------------------------------------#
+
+from extensions import db, jobs
+from models import Venue, Artist, Show
+import counters
+import deletion
+
+
+@jobs.task
+def refresh_counters(venue_ids=(), artist_ids=()):
+  """Recount the upcoming shows of the given venues and artists. The write
+  that queued it already adjusted them and invalidated the pages showing
+  them; this only reconciles the counts with Show."""
+  connection = db.session.connection()
+  if venue_ids:
+    counters.refresh(connection, Venue, Show.venue_id, venue_ids)
+  if artist_ids:
+    counters.refresh(connection, Artist, Show.artist_id, artist_ids)
+  db.session.commit()
+
+
+@jobs.task
+def cascade_delete(owner, owner_id):
+  """Mark the shows of a deleted venue/artist deleted, in batches."""
+  deletion.cascade(owner, owner_id)
+
+
+@jobs.task
+def purge():
+  """Remove what was deleted more than DELETE_RETENTION_DAYS ago."""
+  deletion.purge()
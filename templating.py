@@ -0,0 +1,98 @@
+#----------------------------------------------------------------------------#
+# Template rendering.
+#
+# Compiled templates are kept in a bytecode cache on disk, so a new worker
+# loads them instead of parsing and compiling every template again. The
+# `datetime` filter formats native datetimes with babel patterns parsed
+# once per format. `{% cache 'name', key, ... %}...{% endcache %}` keeps a
+# rendered fragment in a per-process LRU under its template, name and key;
+# keys carry the row versions the fragment shows, so edits never need to
+# evict anything. `stream_template` renders a template as a response body
+# generated chunk by chunk, for pages iterating over a whole table.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+from flask import current_app, stream_with_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from cache import LRUBackend
+
+FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def _pattern(format):
+  """The parsed babel pattern and locale for a named or literal format."""
+  import babel
+  import babel.dates
+  return babel.dates.parse_pattern(FORMATS.get(format, format)), babel.Locale.parse(babel.dates.LC_TIME)
+
+
+def format_datetime(value, format='medium'):
+  """Format a datetime (or a string holding one) with a babel pattern.
+
+  Naive datetimes are formatted as they are; none of the patterns above
+  print a timezone.
+  """
+  if not isinstance(value, datetime):
+    import dateutil.parser
+    value = dateutil.parser.parse(value)
+  pattern, locale = _pattern(format)
+  return pattern.apply(value, locale)
+
+
+def stream_template(name, **context):
+  """The chunks of template `name` rendered with `context`, produced as
+  the response is sent; iterables in `context` are consumed as they are
+  rendered. Pass the result to a Response."""
+  app = current_app._get_current_object()
+  app.update_template_context(context)
+  stream = app.jinja_env.get_template(name).stream(context)
+  stream.enable_buffering(app.config['STREAM_BUFFER'])
+  return stream_with_context(stream)
+
+
+class FragmentCache(Extension):
+  """The `{% cache %}` tag; see the module comment."""
+
+  tags = {'cache'}
+
+  def parse(self, parser):
+    lineno = next(parser.stream).lineno
+    key = [nodes.Const(parser.name), parser.parse_expression()]
+    while parser.stream.skip_if('comma'):
+      key.append(parser.parse_expression())
+    body = parser.parse_statements(['name:endcache'], drop_needle=True)
+    return nodes.CallBlock(self.call_method('_render', [nodes.List(key)]), [], [], body) \
+      .set_lineno(lineno)
+
+  def _render(self, key, caller):
+    backend = current_app.extensions.get('fragments')
+    if backend is None:
+      return caller()
+    key = repr(key)
+    fragment = backend.get_many([key])[0]
+    if fragment is None:
+      fragment = caller()
+      backend.set(key, str(fragment))
+    return Markup(fragment)
+
+
+def init_app(app):
+  app.config.setdefault('TEMPLATE_BYTECODE_CACHE', True)
+  app.config.setdefault('TEMPLATE_BYTECODE_CACHE_DIR', None)
+  app.config.setdefault('FRAGMENT_CACHE_MAX_ENTRIES', 10000)
+  app.config.setdefault('STREAM_BUFFER', 100)
+  options = dict(app.jinja_options)
+  options['extensions'] = list(options.get('extensions', [])) + [FragmentCache]
+  if app.config['TEMPLATE_BYTECODE_CACHE']:
+    options['bytecode_cache'] = FileSystemBytecodeCache(app.config['TEMPLATE_BYTECODE_CACHE_DIR'])
+  app.jinja_options = options
+  if app.config['FRAGMENT_CACHE_MAX_ENTRIES']:
+    app.extensions['fragments'] = LRUBackend(app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+  app.add_template_filter(format_datetime, 'datetime')
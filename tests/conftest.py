@@ -0,0 +1,21 @@
+import pytest
+
+from app import create_app
+from extensions import db
+
+
+@pytest.fixture
+def make_app(tmp_path):
+  """Build the app on a fresh SQLite file with its schema created. Rate
+  limits are off unless a test turns them on."""
+  def make(**overrides):
+    config = {'TESTING': True,
+              'SQLALCHEMY_DATABASE_URI': 'sqlite:///%s' % (tmp_path / 'primary.db'),
+              'RATELIMIT_ENABLED': False,
+              'IMAGE_CACHE_DIR': str(tmp_path / 'images')}
+    config.update(overrides)
+    app = create_app(config)
+    with app.app_context():
+      db.create_all()
+    return app
+  return make
@@ -0,0 +1,89 @@
+import pytest
+
+import api
+from extensions import db, cache
+from models import Venue
+
+
+@pytest.fixture
+def app(make_app):
+  app = make_app()
+  with app.app_context():
+    db.session.add(Venue(id=1, name='The Musical Hop', city='San Francisco', state='CA',
+                         address='1015 Folsom Street', phone='123-123-1234'))
+    db.session.commit()
+  return app
+
+
+@pytest.fixture
+def listings(monkeypatch):
+  """Count the venue listings the API actually builds."""
+  calls = []
+  venue_page = api.venue_page
+
+  def counted(*args):
+    calls.append(args)
+    return venue_page(*args)
+
+  monkeypatch.setattr(api, 'venue_page', counted)
+  return calls
+
+
+def test_a_matching_etag_is_answered_304_from_the_cache(app, listings):
+  client = app.test_client()
+  first = client.get('/api/v1/venues')
+  assert first.status_code == 200
+  etag = first.headers['ETag']
+  assert first.get_json()['data'][0]['name'] == 'The Musical Hop'
+
+  again = client.get('/api/v1/venues', headers={'If-None-Match': etag})
+  assert again.status_code == 304
+  assert again.data == b''
+  assert again.headers['ETag'] == etag
+  assert len(listings) == 1
+
+
+def test_a_stale_etag_gets_the_body(app, listings):
+  client = app.test_client()
+  response = client.get('/api/v1/venues', headers={'If-None-Match': '"stale"'})
+  assert response.status_code == 200
+  assert response.get_json()['data']
+
+
+def test_a_write_changes_the_etag(app, listings):
+  client = app.test_client()
+  etag = client.get('/api/v1/venues').headers['ETag']
+  with app.app_context():
+    Venue.query.get(1).name = 'Renamed'
+    cache.invalidate_after_commit('venues')
+    db.session.commit()
+
+  response = client.get('/api/v1/venues', headers={'If-None-Match': etag})
+  assert response.status_code == 200
+  assert response.headers['ETag'] != etag
+  assert response.get_json()['data'][0]['name'] == 'Renamed'
+  assert len(listings) == 2
+
+
+def test_etags_follow_the_query_string(app):
+  client = app.test_client()
+  full = client.get('/api/v1/venues/1')
+  picked = client.get('/api/v1/venues/1?fields=id,name')
+  assert picked.get_json() == {'id': 1, 'name': 'The Musical Hop'}
+  assert picked.headers['ETag'] != full.headers['ETag']
+  assert client.get('/api/v1/venues/1?fields=id,name',
+                    headers={'If-None-Match': full.headers['ETag']}).status_code == 200
+
+
+def test_without_a_cache_the_etag_still_matches(make_app, listings):
+  app = make_app(CACHE_TYPE='null')
+  client = app.test_client()
+  etag = client.get('/api/v1/venues').headers['ETag']
+  assert client.get('/api/v1/venues', headers={'If-None-Match': etag}).status_code == 304
+  assert len(listings) == 2
+
+
+def test_errors_are_json(app):
+  response = app.test_client().get('/api/v1/venues/99')
+  assert response.status_code == 404
+  assert response.get_json() == {'error': 'Not Found', 'status': 404}
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Venue, Artist, Show
+from bookings import Intervals, conflict, conflicts
+
+START = datetime(2030, 5, 1, 20, 0)
+HOUR = timedelta(hours=1)
+
+
+def test_intervals_merge_overlaps():
+  intervals = Intervals([(START, START + 2 * HOUR), (START + HOUR, START + 3 * HOUR),
+                         (START + 5 * HOUR, START + 6 * HOUR)])
+  assert list(intervals) == [(START, START + 3 * HOUR), (START + 5 * HOUR, START + 6 * HOUR)]
+
+
+@pytest.mark.parametrize('start, end, expected', [
+  (START - HOUR, START, None),
+  (START + 2 * HOUR, START + 3 * HOUR, None),
+  (START - HOUR, START + timedelta(minutes=1), (START, START + 2 * HOUR)),
+  (START + HOUR, START + 90 * timedelta(minutes=1), (START, START + 2 * HOUR)),
+  (START + 2 * HOUR - timedelta(minutes=1), START + 3 * HOUR, (START, START + 2 * HOUR)),
+])
+def test_intervals_conflict(start, end, expected):
+  assert Intervals([(START, START + 2 * HOUR)]).conflict(start, end) == expected
+
+
+def test_back_to_back_intervals_can_be_added():
+  intervals = Intervals([(START, START + 2 * HOUR)])
+  intervals.add(START + 2 * HOUR, START + 3 * HOUR)
+  intervals.add(START - HOUR, START)
+  with pytest.raises(ValueError):
+    intervals.add(START + HOUR, START + 2 * HOUR)
+  assert len(list(intervals)) == 3
+
+
+def test_free_time_between_bookings():
+  intervals = Intervals([(START, START + HOUR), (START + 2 * HOUR, START + 3 * HOUR)])
+  assert intervals.free(START - HOUR, START + 4 * HOUR) == [
+    (START - HOUR, START), (START + HOUR, START + 2 * HOUR), (START + 3 * HOUR, START + 4 * HOUR)]
+  assert intervals.free(START, START + 3 * HOUR, min_length=2 * HOUR) == []
+
+
+@pytest.fixture
+def app(make_app):
+  app = make_app()
+  with app.app_context():
+    for id in (1, 2):
+      db.session.add(Venue(id=id, name='Venue %d' % id, city='Austin', state='TX',
+                           address='1 Main St', phone='555-0100'))
+      db.session.add(Artist(id=id, name='Artist %d' % id, city='Austin', state='TX',
+                            phone='555-0100'))
+    db.session.flush()
+    db.session.add(Show(venue_id=1, artist_id=1, time=START, end_time=START + 2 * HOUR))
+    db.session.commit()
+  return app
+
+
+def test_conflict_finds_the_overlapping_show(app):
+  with app.app_context():
+    assert conflict('venue', 1, START + HOUR, START + 3 * HOUR)[:2] == (START, START + 2 * HOUR)
+    assert conflict('artist', 1, START - HOUR, START + timedelta(minutes=1)) is not None
+    assert conflict('venue', 2, START, START + 2 * HOUR) is None
+
+
+def test_shows_ending_as_another_starts_do_not_conflict(app):
+  with app.app_context():
+    assert conflict('venue', 1, START + 2 * HOUR, START + 3 * HOUR) is None
+    assert conflict('venue', 1, START - HOUR, START) is None
+
+
+def test_deleted_shows_do_not_conflict(app):
+  with app.app_context():
+    Show.query.update({'deleted_at': datetime.now()})
+    db.session.commit()
+    assert conflict('venue', 1, START, START + HOUR) is None
+
+
+def test_conflicts_names_each_booked_side(app):
+  with app.app_context():
+    messages = conflicts(START + HOUR, START + 3 * HOUR, 1, 2)
+    assert messages == ['The venue is already booked from 2030-05-01 20:00 to 2030-05-01 22:00.']
+
+
+def book(app, venue_id, artist_id, start, end):
+  return app.test_client().post('/shows/create', data={
+    'venue_id': venue_id, 'artist_id': artist_id,
+    'start_time': start.isoformat(), 'end_time': end.isoformat()})
+
+
+def shows(app):
+  with app.app_context():
+    return Show.query.count()
+
+
+def test_a_double_booking_is_refused(app):
+  response = book(app, 1, 2, START + HOUR, START + 3 * HOUR)
+  assert b'The venue is already booked' in response.data
+  response = book(app, 2, 1, START + HOUR, START + 3 * HOUR)
+  assert b'The artist is already booked' in response.data
+  assert shows(app) == 1
+
+
+def test_a_back_to_back_booking_is_listed(app):
+  response = book(app, 1, 1, START + 2 * HOUR, START + 3 * HOUR)
+  assert b'Show was successfully listed!' in response.data
+  assert shows(app) == 2
+
+
+@pytest.mark.parametrize('venue_id, start, end, message', [
+  (1, START + 4 * HOUR, START + 3 * HOUR, b'A show must end after it starts.'),
+  (9, START + 4 * HOUR, START + 5 * HOUR, b'There is no venue with id 9.'),
+  ('x', START + 4 * HOUR, START + 5 * HOUR, b'Give a venue id, an artist id and a start time.'),
+])
+def test_invalid_bookings_are_refused(app, venue_id, start, end, message):
+  assert message in book(app, venue_id, 1, start, end).data
+  assert shows(app) == 1
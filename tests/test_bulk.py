@@ -0,0 +1,112 @@
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Venue, Artist, Show
+import bulk
+
+START = datetime(2030, 5, 1, 20, 0)
+HEADER = 'id,name,city,state,address,phone,genres\n'
+
+
+@pytest.fixture
+def app(make_app):
+  app = make_app()
+  with app.app_context():
+    yield app
+
+
+def csv_rows(text):
+  return bulk.read_rows(io.StringIO(text), 'csv')
+
+
+def venue_ids():
+  return sorted(id for id, in db.session.query(Venue.id))
+
+
+def test_valid_rows_are_inserted_and_invalid_ones_reported_by_line(app):
+  report = bulk.import_rows('venues', csv_rows(
+    HEADER +
+    ',The Musical Hop,San Francisco,CA,1015 Folsom Street,123-123-1234,"Jazz,Reggae"\n'
+    ',,San Francisco,CA,1 Nowhere,123-123-1234,Jazz\n'
+    ',Park Square,San Francisco,CA,34 Whiskey Moore Ave,415-000-1234,Rock n Roll\n'))
+  assert (report.rows, report.inserted, report.failed) == (3, 2, 1)
+  assert report.errors[0]['line'] == 3
+  assert 'name' in report.errors[0]['errors']
+  names = dict(db.session.query(Venue.name, Venue.id))
+  assert sorted(genre.name for genre in Venue.query.get(names['The Musical Hop']).genres) \
+    == ['Jazz', 'Reggae']
+
+
+def test_a_row_the_database_rejects_does_not_lose_its_chunk(app):
+  # Both rows pass the checks against the database, but the second id
+  # clashes with the first within the chunk's executemany.
+  report = bulk.import_rows('venues', csv_rows(
+    HEADER +
+    '7,First,Austin,TX,1 Main St,512-000-0001,Jazz\n'
+    '7,Second,Austin,TX,2 Main St,512-000-0002,Jazz\n'
+    '8,Third,Austin,TX,3 Main St,512-000-0003,Jazz\n'))
+  assert (report.inserted, report.failed) == (2, 1)
+  assert report.errors == [{'line': 3, 'errors': {'row': ['Rejected by the database.']}}]
+  assert venue_ids() == [7, 8]
+
+
+def test_existing_ids_are_reported(app):
+  bulk.import_rows('venues', csv_rows(HEADER + '7,First,Austin,TX,1 Main St,512-000-0001,Jazz\n'))
+  report = bulk.import_rows('venues', csv_rows(
+    HEADER + '7,Again,Austin,TX,1 Main St,512-000-0001,Jazz\n'))
+  assert report.errors == [{'line': 2, 'errors': {'id': ['Venue 7 already exists.']}}]
+
+
+def test_chunks_commit_on_their_own(app):
+  rows = ''.join(',Venue %d,Austin,TX,%d Main St,512-000-0001,Jazz\n' % (i, i) for i in range(5))
+  report = bulk.import_rows('venues', csv_rows(HEADER + rows), chunk_size=2)
+  assert report.inserted == 5
+  db.session.rollback()
+  assert len(venue_ids()) == 5
+
+
+def test_shows_are_checked_for_owners_and_double_bookings(app):
+  db.session.add(Venue(id=1, name='Venue', city='Austin', state='TX', address='1 Main St',
+                       phone='512-000-0001'))
+  db.session.add(Artist(id=1, name='Artist', city='Austin', state='TX', phone='512-000-0001'))
+  db.session.commit()
+  rows = [{'venue_id': 1, 'artist_id': 1, 'start_time': str(START)},
+          {'venue_id': 1, 'artist_id': 1, 'start_time': str(START + timedelta(hours=1))},
+          {'venue_id': 2, 'artist_id': 1, 'start_time': str(START + timedelta(days=1))}]
+  stream = io.StringIO(''.join(json.dumps(row) + '\n' for row in rows) + '[1, 2]\n')
+  report = bulk.import_rows('shows', bulk.read_rows(stream, 'ndjson'))
+  assert (report.inserted, report.failed) == (1, 3)
+  errors = dict((error['line'], error['errors']) for error in report.errors)
+  assert set(errors[2]) == {'venue_id', 'artist_id'}
+  assert errors[3] == {'venue_id': ['No venue with id 2.']}
+  assert errors[4] == {'row': ['Not a JSON object.']}
+  assert Show.query.count() == 1
+  assert Venue.query.get(1).upcoming_shows_count == 1
+
+
+def test_export_writes_what_import_reads(app):
+  bulk.import_rows('venues', csv_rows(HEADER + '7,First,Austin,TX,1 Main St,512-000-0001,Jazz\n'))
+  exported = list(bulk.export_rows('venues'))
+  assert [(row['id'], row['name'], row['genres']) for row in exported] == [(7, 'First', ['Jazz'])]
+
+
+def upload(app, data, filename='venues.csv', **form):
+  form['file'] = (io.BytesIO(data), filename)
+  return app.test_client().post('/import/venues', data=form)
+
+
+def test_the_upload_reports_the_import(app):
+  response = upload(app, (HEADER + ',First,Austin,TX,1 Main St,512-000-0001,Jazz\n').encode())
+  assert response.status_code == 200
+  assert response.get_json()['inserted'] == 1
+
+
+def test_uploads_in_unknown_formats_or_encodings_are_refused(app):
+  assert upload(app, b'x', format='xml').status_code == 400
+  response = upload(app, HEADER.encode() + b',\xff\xfe,Austin,TX,1 Main St,1,Jazz\n')
+  assert response.status_code == 400
+  assert response.get_json()['error'] == 'The file is not UTF-8 text.'
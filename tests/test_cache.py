@@ -0,0 +1,82 @@
+import pytest
+
+from cache import RedisBackend
+from extensions import db, cache
+
+
+class FakeRedis(object):
+  """The part of the redis-py client RedisBackend uses, over a dict."""
+
+  def __init__(self):
+    self.data = {}
+
+  def mget(self, keys):
+    return [self.data.get(key) for key in keys]
+
+  def set(self, key, value, ex=None):
+    self.data[key] = value
+
+  def delete(self, *keys):
+    for key in keys:
+      self.data.pop(key, None)
+
+
+@pytest.fixture
+def app(make_app):
+  app = make_app()
+  cache.backend = RedisBackend(FakeRedis())
+  calls = []
+
+  @cache.cached('venues')
+  def counted():
+    calls.append(1)
+    return str(len(calls))
+
+  app.add_url_rule('/_counted', 'counted', counted)
+  return app
+
+
+def test_invalidate_replaces_only_its_tag(app):
+  venues, shows = cache.tag_versions(['venues', 'shows'])
+  assert cache.tag_versions(['venues', 'shows']) == [venues, shows]
+  cache.invalidate('venues')
+  new_venues, new_shows = cache.tag_versions(['venues', 'shows'])
+  assert new_venues != venues
+  assert new_shows == shows
+
+
+def test_cached_view_is_served_until_its_tag_is_invalidated(app):
+  client = app.test_client()
+  assert client.get('/_counted').data == b'1'
+  assert client.get('/_counted').data == b'1'
+  cache.invalidate('artists')
+  assert client.get('/_counted').data == b'1'
+  cache.invalidate('venues')
+  assert client.get('/_counted').data == b'2'
+
+
+def test_invalidate_after_commit(app):
+  with app.app_context():
+    before = cache.tag_versions(['venues'])
+    cache.invalidate_after_commit('venues')
+    assert cache.tag_versions(['venues']) == before
+    db.session.commit()
+    assert cache.tag_versions(['venues']) != before
+
+
+def test_rollback_drops_pending_invalidations(app):
+  with app.app_context():
+    before = cache.tag_versions(['venues'])
+    cache.invalidate_after_commit('venues')
+    db.session.rollback()
+    db.session.commit()
+    assert cache.tag_versions(['venues']) == before
+
+
+def test_listing_shows_a_new_venue_right_after_it_is_created(app):
+  client = app.test_client()
+  assert b'Test Hall' not in client.get('/venues').data
+  client.post('/venues/create', data={'name': 'Test Hall', 'city': 'Austin', 'state': 'TX',
+                                      'address': '1 Main St', 'phone': '555-0100',
+                                      'genres': ['Jazz']})
+  assert b'Test Hall' in client.get('/venues').data
@@ -0,0 +1,79 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from extensions import db
+from models import Venue, Genre
+import deletion
+import editing
+
+
+@pytest.fixture
+def app(make_app):
+  app = make_app()
+  with app.app_context():
+    db.session.add(Venue(id=1, name='The Musical Hop', city='San Francisco', state='CA',
+                         address='1015 Folsom Street', phone='123-123-1234',
+                         genres=Genre.named(['Jazz', 'Reggae'])))
+    db.session.commit()
+  return app
+
+
+def venue(app):
+  with app.app_context():
+    row = Venue.query.get(1)
+    return row.name, row.version, sorted(genre.name for genre in row.genres)
+
+
+@pytest.mark.parametrize('form, genres', [
+  (MultiDict([('name', 'x')]), None),
+  (MultiDict([('genres', '')]), []),
+  (MultiDict([('genres', ''), ('genres', 'Jazz')]), ['Jazz']),
+])
+def test_changes_reads_submitted_genres(form, genres):
+  assert editing.changes('venue', form)[1] == genres
+
+
+def test_update_saves_the_submitted_columns(app):
+  _, version, _ = venue(app)
+  with app.app_context():
+    assert editing.update('venue', 1, version, {'name': 'The Hop'}, ['Blues']) == version + 1
+    db.session.commit()
+  assert venue(app) == ('The Hop', version + 1, ['Blues'])
+
+
+def test_update_from_a_stale_version_conflicts(app):
+  _, version, _ = venue(app)
+  with app.app_context():
+    editing.update('venue', 1, version, {'name': 'First'})
+    db.session.commit()
+    with pytest.raises(editing.Conflict):
+      editing.update('venue', 1, version, {'name': 'Second'})
+    with pytest.raises(editing.Conflict):
+      editing.update('venue', 1, version, {})
+    assert editing.update('venue', 1, version + 1, {}) == version + 1
+
+
+def test_update_of_a_deleted_row_conflicts(app):
+  _, version, _ = venue(app)
+  with app.app_context():
+    assert deletion.delete('venue', 1)
+    db.session.commit()
+    with pytest.raises(editing.Conflict):
+      editing.update('venue', 1, version, {'name': 'Too late'})
+
+
+def test_a_stale_edit_form_is_answered_409(app):
+  client = app.test_client()
+  _, version, _ = venue(app)
+  assert client.post('/venues/1/edit', data={'version': version, 'name': 'First'}).status_code == 302
+  response = client.post('/venues/1/edit', data={'version': version, 'name': 'Second'})
+  assert response.status_code == 409
+  assert b'changed by someone else' in response.data
+  assert venue(app)[0] == 'First'
+
+
+def test_an_edit_form_can_clear_every_genre(app):
+  _, version, _ = venue(app)
+  response = app.test_client().post('/venues/1/edit', data={'version': version, 'genres': ''})
+  assert response.status_code == 302
+  assert venue(app)[2] == []
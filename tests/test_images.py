@@ -0,0 +1,94 @@
+import http.server
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+import images
+
+
+@pytest.fixture
+def source():
+  """A local HTTP server serving one 400x200 PNG, counting its requests."""
+  out = io.BytesIO()
+  Image.new('RGB', (400, 200), 'red').save(out, 'PNG')
+  hits = []
+
+  class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+      hits.append(self.path)
+      self.send_response(200)
+      self.send_header('Content-Type', 'image/png')
+      self.end_headers()
+      self.wfile.write(out.getvalue())
+
+    def log_message(self, *args):
+      pass
+
+  server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+  threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+  yield 'http://localhost:%d/image.png' % server.server_port, hits
+  server.shutdown()
+  server.server_close()
+
+
+def thumbnail(app, src, size='sm', format='jpeg'):
+  with app.test_request_context():
+    url = images.thumbnail_url(src, size, format)
+  return app.test_client().get(url)
+
+
+def test_private_hosts_are_not_fetched(make_app, source):
+  src, hits = source
+  response = thumbnail(make_app(), src)
+  assert response.status_code == 302
+  assert response.headers['Location'] == src
+  assert hits == []
+
+
+def test_thumbnails_are_resized_and_fetched_once(make_app, source):
+  src, hits = source
+  app = make_app(IMAGE_ALLOW_PRIVATE_HOSTS=True)
+  response = thumbnail(app, src)
+  assert response.status_code == 200
+  assert response.mimetype == 'image/jpeg'
+  assert 'immutable' in response.headers['Cache-Control']
+  assert Image.open(io.BytesIO(response.data)).size == (160, 80)
+
+  assert thumbnail(app, src).data == response.data
+  assert thumbnail(app, src, 'md', 'webp').status_code == 200
+  assert len(hits) == 1
+
+
+def test_unsigned_urls_are_refused(make_app, source):
+  src, hits = source
+  app = make_app(IMAGE_ALLOW_PRIVATE_HOSTS=True)
+  response = app.test_client().get('/images/sm.jpeg', query_string={'src': src, 'sig': 'x'})
+  assert response.status_code == 403
+  assert hits == []
+
+
+def test_links_are_left_alone_without_pillow(make_app, monkeypatch):
+  monkeypatch.setattr(images, 'have_pillow', lambda: False)
+  with make_app().test_request_context():
+    assert images.thumbnail_url('https://example.com/a.jpg') == 'https://example.com/a.jpg'
+
+
+def picture(app, src):
+  with app.test_request_context():
+    return app.jinja_env.get_template('pages/picture.html').module.picture(src, 'md', 'Venue')
+
+
+def test_the_webp_source_is_offered_only_for_proxied_links(make_app, monkeypatch):
+  app = make_app()
+  html = picture(app, 'https://example.com/a.png')
+  assert 'type="image/webp"' in html
+  assert '/images/md.webp' in html
+
+  assert 'image/webp' not in picture(app, '/static/img/a.png')
+  monkeypatch.setattr(images, 'have_pillow', lambda: False)
+  html = picture(app, 'https://example.com/a.png')
+  assert 'image/webp' not in html
+  assert 'src="https://example.com/a.png"' in html
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from extensions import db
+from models import Venue, Artist, Show
+import queries
+
+START = datetime(2030, 5, 1, 20, 0)
+# Three shows share each start time, so pages must break ties on id.
+TIMES = [START + timedelta(days=i // 3) for i in range(8)]
+
+
+@pytest.fixture
+def app(make_app):
+  app = make_app(PAGE_SIZE=3)
+  with app.app_context():
+    for i, time in enumerate(TIMES, 1):
+      db.session.add(Venue(id=i, name='Venue %d' % i, city=[None, 'Austin', 'Boston'][i % 3],
+                           state=None if i == 4 else 'TX', address='1 Main St', phone='555-0100'))
+      db.session.add(Artist(id=i, name='Artist %d' % i, city='Austin', state='TX',
+                            phone='555-0100'))
+      db.session.flush()
+      db.session.add(Show(id=i, venue_id=i, artist_id=i, time=time,
+                          end_time=time + timedelta(hours=2)))
+    db.session.commit()
+  with app.app_context():
+    yield app
+
+
+def walk(page_of, per_page):
+  """Every page, following next cursors, then back again by prev cursors."""
+  forward = [page_of(per_page=per_page)]
+  while forward[-1].next_cursor:
+    forward.append(page_of(after=forward[-1].next_cursor, per_page=per_page))
+  backward = [forward[-1]]
+  while backward[-1].prev_cursor:
+    backward.append(page_of(before=backward[-1].prev_cursor, per_page=per_page))
+  return forward, backward[::-1]
+
+
+def ids(pages):
+  return [[row.id for row in page.items] for page in pages]
+
+
+def test_cursors_round_trip(app):
+  keys = [Show.time, Show.id]
+  cursor = queries.encode_cursor([START, 7])
+  assert queries.decode_cursor(cursor, keys) == [START, 7]
+
+
+@pytest.mark.parametrize('cursor', ['!!!', 'bm90IGpzb24', queries.encode_cursor([1, 2, 3]),
+                                    queries.encode_cursor(['not a time', 1])])
+def test_invalid_cursors_are_a_bad_request(app, cursor):
+  with pytest.raises(BadRequest):
+    queries.decode_cursor(cursor, [Show.time, Show.id])
+
+
+def test_listing_with_an_invalid_cursor_is_answered_400(app):
+  assert app.test_client().get('/shows?after=garbage').status_code == 400
+
+
+def test_pages_break_ties_on_id_forward_and_backward(app):
+  forward, backward = walk(queries.show_page, 2)
+  assert ids(forward) == [[1, 2], [3, 4], [5, 6], [7, 8]]
+  assert ids(backward) == ids(forward)
+  assert forward[0].prev_cursor is None
+  assert forward[-1].next_cursor is None
+
+
+def test_a_page_boundary_between_equal_keys_loses_nothing(app):
+  first = queries.show_page(per_page=1)
+  rest = queries.show_page(after=first.next_cursor, per_page=10)
+  assert [row.id for row in first.items + rest.items] == list(range(1, 9))
+
+
+def test_venue_areas_page_through_missing_cities_and_states(app):
+  with app.test_request_context():
+    seen, after = [], None
+    while True:
+      page, areas = queries.venue_areas(after=after)
+      seen += [venue['id'] for area in areas for venue in area['venues']]
+      if not page.next_cursor:
+        break
+      after = page.next_cursor
+  assert sorted(seen) == list(range(1, 9))
+  assert len(seen) == 8
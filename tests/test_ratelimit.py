@@ -0,0 +1,84 @@
+import pytest
+
+from ratelimit import MemoryBackend, refill
+
+
+def test_refill_adds_tokens_up_to_capacity():
+  assert refill(0, 0, 2, 1.0, 1, 0.5) == (0.5, 0.5)
+  assert refill(0, 0, 2, 1.0, 1, 1.5) == (0.5, 0.0)
+  assert refill(0, 0, 2, 1.0, 1, 60) == (1.0, 0.0)
+
+
+def test_memory_backend_refills_over_time():
+  backend = MemoryBackend()
+  assert backend.take('key', 2, 1.0, now=0) == (True, 0)
+  assert backend.take('key', 2, 1.0, now=0) == (True, 0)
+  assert backend.take('key', 2, 1.0, now=0) == (False, 1.0)
+  assert backend.take('key', 2, 1.0, now=0.5) == (False, 0.5)
+  assert backend.take('key', 2, 1.0, now=1.0) == (True, 0)
+  assert backend.take('other', 2, 1.0, now=1.0) == (True, 0)
+
+
+def test_memory_backend_forgets_the_least_recently_used_bucket():
+  backend = MemoryBackend(max_keys=1)
+  backend.take('a', 1, 1.0, now=0)
+  backend.take('b', 1, 1.0, now=0)
+  assert backend.take('a', 1, 1.0, now=0) == (True, 0)
+
+
+@pytest.fixture
+def app(make_app):
+  return make_app(RATELIMIT_ENABLED=True, RATELIMIT_CONCURRENCY={},
+                  RATELIMIT_LIMITS={'search': {'ip': (1, 60, 2)}})
+
+
+def test_an_empty_bucket_is_answered_429_with_retry_after(app):
+  client = app.test_client()
+  for _ in range(2):
+    assert client.post('/venues/search', data={'search_term': 'x'}).status_code == 200
+  response = client.post('/venues/search', data={'search_term': 'x'})
+  assert response.status_code == 429
+  assert response.headers['Retry-After'] == '60'
+
+  response = client.post('/venues/search', data={'search_term': 'x'},
+                         headers={'Accept': 'application/json'})
+  assert response.status_code == 429
+  assert response.get_json()['error']
+
+
+def test_buckets_are_per_client(app):
+  client = app.test_client()
+  for _ in range(3):
+    client.post('/venues/search', data={'search_term': 'x'})
+  response = app.test_client().post('/venues/search', data={'search_term': 'x'},
+                                    environ_base={'REMOTE_ADDR': '10.0.0.2'})
+  assert response.status_code == 200
+
+
+def test_a_refused_request_takes_no_tokens():
+  backend = MemoryBackend()
+  wide, narrow = ('wide', 5, 1.0), ('narrow', 1, 1.0)
+  assert backend.take_all([wide, narrow], now=0) == (True, 0)
+  for _ in range(3):
+    assert backend.take_all([wide, narrow], now=0) == (False, 1.0)
+  for _ in range(4):
+    assert backend.take('wide', 5, 1.0, now=0) == (True, 0)
+  assert backend.take('wide', 5, 1.0, now=0) == (False, 1.0)
+
+
+def test_session_limits_need_an_ip_limit(make_app):
+  with pytest.raises(ValueError):
+    make_app(RATELIMIT_LIMITS={'create': {'session': (10, 60, 5)}})
+
+
+def test_a_session_refusal_leaves_the_ip_bucket_alone(make_app):
+  app = make_app(RATELIMIT_ENABLED=True, RATELIMIT_CONCURRENCY={},
+                 RATELIMIT_LIMITS={'search': {'ip': (1, 60, 3), 'session': (1, 60, 1)}})
+  client = app.test_client()
+  assert client.post('/venues/search', data={'search_term': 'x'}).status_code == 200
+  for _ in range(3):
+    assert client.post('/venues/search', data={'search_term': 'x'}).status_code == 429
+  # Without the session cookie the same IP still has two of its three tokens.
+  for _ in range(2):
+    assert app.test_client().post('/venues/search', data={'search_term': 'x'}).status_code == 200
+  assert app.test_client().post('/venues/search', data={'search_term': 'x'}).status_code == 429
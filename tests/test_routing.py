@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from extensions import db
+from models import Artist
+
+VENUE = {'name': 'Test Hall', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+         'phone': '555-0100', 'genres': ['Jazz']}
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+  """A primary and a replica SQLite file that disagree on artist 1's name."""
+  app = make_app(SQLALCHEMY_REPLICA_URIS=['sqlite:///%s' % (tmp_path / 'replica.db')],
+                 REPLICA_PIN_SECONDS=5)
+  with app.app_context():
+    replica = db.get_engine(app, bind='replica_0')
+    db.Model.metadata.create_all(replica)
+    for engine, name in [(db.engine, 'On the primary'), (replica, 'On the replica')]:
+      engine.execute(Artist.__table__.insert(), {'id': 1, 'name': name, 'city': 'Austin',
+                                                 'state': 'TX', 'phone': '555-0100'})
+  return app
+
+
+def test_reads_go_to_the_replica(app):
+  client = app.test_client()
+  assert b'On the replica' in client.get('/artists/1').data
+  assert b'On the replica' in client.get('/artists/1').data
+
+
+def test_a_write_pins_the_client_to_the_primary(app, monkeypatch):
+  client = app.test_client()
+  client.post('/venues/create', data=VENUE)
+  assert b'On the primary' in client.get('/artists/1').data
+  # Other clients still read from the replica.
+  assert b'On the replica' in app.test_client().get('/artists/1').data
+
+  later = time.time() + 6
+  monkeypatch.setattr(time, 'time', lambda: later)
+  assert b'On the replica' in client.get('/artists/1').data
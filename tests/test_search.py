@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import pytest
+
+from extensions import db
+from models import Venue
+import queries
+
+NAMES = ['The Musical Hop', 'Park Square Live Music & Coffee', 'The Dueling Pianos Bar',
+         '100% Jazz', 'Jazz_Club', 'Jazz Bar', 'Jazz Jazz', 'Smooth Jazz and Blues Lounge Downtown']
+
+
+@pytest.fixture(autouse=True)
+def app(make_app):
+  app = make_app(SEARCH_PAGE_SIZE=20, SEARCH_MAX_LIMIT=50, SEARCH_MAX_TERM_LENGTH=10,
+                 SEARCH_MAX_OFFSET=100)
+  with app.app_context():
+    db.session.add_all([Venue(name=name, city='Austin', state='TX', address='1 Main St',
+                              phone='555-0100') for name in NAMES])
+    db.session.add(Venue(name='Gone Music Hall', city='Austin', state='TX', address='2 Main St',
+                         phone='555-0101', deleted_at=datetime.now()))
+    db.session.commit()
+  with app.app_context():
+    yield app
+
+
+def names(result):
+  return [row['name'] for row in result['data']]
+
+
+def test_terms_of_three_or_more_characters_match_in_the_fts_table():
+  result = queries.find_venues('MUSIC')
+  assert sorted(names(result)) == ['Park Square Live Music & Coffee', 'The Musical Hop']
+  assert result['count'] == 2
+
+
+def test_the_count_covers_every_match_not_just_the_page():
+  result = queries.find_venues('jazz', limit=2)
+  assert len(result['data']) == 2
+  assert result['count'] == 5
+
+
+def test_fts_results_are_ranked():
+  assert names(queries.find_venues('jazz'))[0] == 'Jazz Jazz'
+
+
+def test_short_terms_fall_back_to_a_substring_match():
+  assert names(queries.find_venues('hO')) == ['The Musical Hop']
+
+
+@pytest.mark.parametrize('term, expected', [('%', ['100% Jazz']), ('_', ['Jazz_Club'])])
+def test_short_term_wildcards_match_literally(term, expected):
+  assert names(queries.find_venues(term)) == expected
+
+
+def test_an_empty_term_lists_every_live_venue_by_name():
+  assert names(queries.find_venues('')) == sorted(NAMES)
+
+
+@pytest.mark.parametrize('limit, expected', [(None, 20), (0, 20), (-5, 1), (10, 10), (10 ** 6, 50)])
+def test_limits_are_clamped(limit, expected):
+  assert queries._search_limit(limit) == expected
+
+
+@pytest.mark.parametrize('offset, expected', [(-3, 0), (7, 7), (10 ** 6, 100)])
+def test_offsets_are_clamped(offset, expected):
+  assert queries._search_bounds('jazz', offset) == ('jazz', expected)
+
+
+def test_long_terms_are_cut_short():
+  assert queries._search_bounds('x' * 50, 0) == ('x' * 10, 0)
+
+
+def test_offset_pages_through_the_ranked_matches():
+  everything = names(queries.find_venues('jazz'))
+  assert names(queries.find_venues('jazz', limit=2, offset=2)) == everything[2:4]
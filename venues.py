@@ -0,0 +1,139 @@
+#----------------------------------------------------------------------------#
+# Venue pages.
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, abort, render_template, request, flash, redirect, url_for
+from extensions import db, cache, limiter
+import deletion
+import editing
+from models import Venue, Genre
+from routing import replica_reads
+from bookings import availability_view
+from geo import near_view
+from queries import venue_areas, venue_detail, find_venues
+
+venue_pages = Blueprint('venues', __name__)
+
+
+@venue_pages.route('/venues')
+@replica_reads
+@cache.cached('venues', 'shows')
+def venues():
+  page, areas = venue_areas(after=request.args.get('after'), before=request.args.get('before'))
+  return render_template('pages/venues.html', areas=areas, page=page)
+
+@venue_pages.route('/venues/search', methods=['POST'])
+@limiter.limit('search')
+@replica_reads
+def search_venues():
+  term = request.form.get('search_term', '')
+  response = find_venues(term,
+                         limit=request.form.get('limit', type=int),
+                         offset=request.form.get('offset', 0, type=int))
+  return render_template('pages/search_venues.html', results=response, search_term=term,
+                         offset=request.form.get('offset', 0, type=int))
+
+@venue_pages.route('/venues/near')
+@replica_reads
+def venues_near():
+  return near_view('venue')
+
+@venue_pages.route('/venues/<int:venue_id>')
+@replica_reads
+def show_venue(venue_id):
+  return render_template('pages/show_venue.html', venue=venue_detail(venue_id))
+
+@venue_pages.route('/venues/<int:venue_id>/availability')
+@replica_reads
+def venue_availability(venue_id):
+  return availability_view('venue', venue_id)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@venue_pages.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  from forms import VenueForm
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@venue_pages.route('/venues/create', methods=['POST'])
+@limiter.limit('create')
+def create_venue_submission():
+  name = request.form.get("name", "")
+  city = request.form.get("city", "")
+  state = request.form.get("state", "")
+  address = request.form.get("address", "")
+  phone = request.form.get("phone", "")
+  genres = request.form.getlist("genres")
+  facebook_link = request.form.get("facebook_link", "")
+  venue = Venue(
+            name =  name,
+            city =  city,
+            state = state,
+            address= address,
+            phone = phone,
+            genres = Genre.named(genres),
+            facebook_link = facebook_link,
+            )
+  try:
+    db.session.add(venue)
+    cache.invalidate_after_commit('venues')
+    db.session.commit()
+    flash('Venue ' + request.form['name'] + ' was successfully listed!')
+  except:
+    flash('Venue ' + request.form['name'] + ' could not be listed.')
+  return render_template('pages/home.html')
+
+@venue_pages.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # Hides the venue at once; its shows follow in a background job.
+  if not deletion.delete('venue', venue_id):
+    abort(404)
+  db.session.commit()
+  return redirect(url_for("venues.venues"))
+
+#  Update
+#  ----------------------------------------------------------------
+
+@venue_pages.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  return _edit_page(venue_id)
+
+def _edit_page(venue_id, status=200):
+  """The edit form filled in with the venue as it is now."""
+  from forms import VenueForm
+  targeted_venue = Venue.query.filter_by(id=venue_id, deleted_at=None).first_or_404()
+  venue={
+    "id": venue_id,
+    "version": targeted_venue.version,
+    "name": targeted_venue.name,
+    "genres": [genre.name for genre in targeted_venue.genres],
+    "address": targeted_venue.address,
+    "city": targeted_venue.city,
+    "state": targeted_venue.state,
+    "phone": targeted_venue.phone,
+    "website": targeted_venue.website,
+    "facebook_link": targeted_venue.facebook_link,
+    "seeking_talent": targeted_venue.seeking_talent,
+    "seeking_description": targeted_venue.seeking_description,
+    "image_link": targeted_venue.image_link,
+  }
+  form = VenueForm(formdata=None, data=venue)
+  return render_template('forms/edit_venue.html', form=form, venue=venue), status
+
+@venue_pages.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  version = request.form.get("version", type=int)
+  if version is None:
+    abort(400)
+  values, genres = editing.changes('venue', request.form)
+  try:
+    editing.update('venue', venue_id, version, values, genres)
+  except editing.Conflict:
+    db.session.rollback()
+    flash('This venue was changed by someone else while you were editing it. '
+          'Their changes are shown below; make yours again to save them.')
+    return _edit_page(venue_id, 409)
+  db.session.commit()
+  return redirect(url_for('venues.show_venue', venue_id=venue_id))